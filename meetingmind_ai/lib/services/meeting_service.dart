@@ -99,6 +99,19 @@ class MeetingService {
       }
     });
 
+    // Server gom các câu final cùng lúc thành 1 event (bật bằng batch_finals)
+    _socket!.on('transcript_batch', (data) {
+      final finals = data is Map ? data['finals'] : null;
+      if (finals is! List) return;
+      for (final item in finals) {
+        if (item is Map) {
+          _transcriptController.add(TranscriptMessage.fromJson(
+            item.map((key, value) => MapEntry(key.toString(), value)),
+          ));
+        }
+      }
+    });
+
     _socket!.on('error', (error) {
       print('Socket Error: $error');
       if (!completer.isCompleted) {
@@ -126,7 +139,10 @@ class MeetingService {
   }
 
   void startStreaming({String? title}) {
-    final payload = <String, dynamic>{'user_id': userId};
+    final payload = <String, dynamic>{
+      'user_id': userId,
+      'batch_finals': true,
+    };
     final payloadTitle = (title ?? meetingTitle)?.trim();
     if (payloadTitle != null && payloadTitle.isNotEmpty) {
       meetingTitle = payloadTitle;
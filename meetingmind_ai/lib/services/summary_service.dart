@@ -7,21 +7,26 @@ import 'api_auth_headers.dart';
 class SummaryService {
   static String get _baseUrl => apiBaseUrl;
 
+  static const Duration _pollInterval = Duration(seconds: 2);
+  static const Duration _jobTimeout = Duration(minutes: 5);
+
   static Future<MeetingSummary> summarize(
     String sid, {
     required String userId,
   }) async {
     final uri = Uri.parse('$_baseUrl/summarize/$sid?user_id=$userId');
 
-    final response = await http
-        .get(
-          uri,
-          headers: await ApiAuthHeaders.build(),
-        )
-        .timeout(const Duration(seconds: 30));
+    var response = await _get(uri);
 
     print("📦 RAW API RESPONSE = ${response.body}");
 
+    // 202: backend đang tóm tắt trong job nền -> chờ job xong rồi lấy lại summary
+    if (response.statusCode == 202) {
+      final job = jsonDecode(response.body);
+      await _waitForJob(job['job_id']);
+      response = await _get(uri);
+    }
+
     if (response.statusCode != 200) {
       throw Exception(
           'Summarize failed: ${response.statusCode} ${response.body}');
@@ -30,4 +35,33 @@ class SummaryService {
     final json = jsonDecode(response.body);
     return MeetingSummary.fromJson(json);
   }
+
+  static Future<http.Response> _get(Uri uri) async {
+    return http
+        .get(
+          uri,
+          headers: await ApiAuthHeaders.build(),
+        )
+        .timeout(const Duration(seconds: 30));
+  }
+
+  static Future<void> _waitForJob(String jobId) async {
+    final uri = Uri.parse('$_baseUrl/summarize/jobs/$jobId');
+    final deadline = DateTime.now().add(_jobTimeout);
+
+    while (DateTime.now().isBefore(deadline)) {
+      await Future.delayed(_pollInterval);
+      final response = await _get(uri);
+      if (response.statusCode != 200) {
+        throw Exception(
+            'Summarize job failed: ${response.statusCode} ${response.body}');
+      }
+      final job = jsonDecode(response.body);
+      if (job['status'] == 'completed') return;
+      if (job['status'] == 'failed') {
+        throw Exception('Summarize failed: ${job['error'] ?? 'unknown error'}');
+      }
+    }
+    throw Exception('Summarize timed out');
+  }
 }
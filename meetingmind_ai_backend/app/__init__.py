@@ -29,6 +29,13 @@ from .services.plan_service import ensure_default_upgrade_codes
 from .routes.tts_studio_router import tts_studio_bp
 from .routes.studio_result_router import studio_result_bp
 from .routes.grap_visual_route import grap_visual_bp
+from .cli import (
+    migrate_embeddings_command,
+    migrate_transcripts_command,
+    resample_benchmark_command,
+    vad_analyze_command,
+)
+import app.sockets.lifecycle_socket
 import app.sockets.meeting_socket
 import app.sockets.notification_socket
 
@@ -71,6 +78,10 @@ def create_app():
     app.register_blueprint(tts_studio_bp)
     app.register_blueprint(studio_result_bp)
     app.register_blueprint(grap_visual_bp)
+    app.cli.add_command(migrate_embeddings_command)
+    app.cli.add_command(migrate_transcripts_command)
+    app.cli.add_command(vad_analyze_command)
+    app.cli.add_command(resample_benchmark_command)
     # Seed default upgrade codes (admin will distribute these)
     try:
         ensure_default_upgrade_codes(plus_count=10, premium_count=10)
@@ -0,0 +1,69 @@
+import click
+from flask.cli import with_appcontext
+
+from .services.chunk_service import migrate_chunk_embeddings
+from .services.resample_service import SAMPLE_DTYPES, SUPPORTED_RATES, benchmark_resampler
+from .services.transcript_service import migrate_legacy_transcripts
+from .services.vad_service import VAD_KEEPALIVE, VAD_OFF, VAD_PAUSE, analyze_wav
+
+
+@click.command("migrate-embeddings")
+@click.option("--batch-size", default=500, show_default=True, help="Số chunk mỗi batch.")
+@click.option(
+    "--dtype",
+    type=click.Choice(["float32", "float16"]),
+    default=None,
+    help="Mặc định theo EMBEDDING_STORAGE_DTYPE.",
+)
+@click.option("--keep-list", is_flag=True, help="Giữ lại ListField embedding cũ (để rollback).")
+@with_appcontext
+def migrate_embeddings_command(batch_size, dtype, keep_list):
+    """Chuyển Chunk.embedding sang định dạng nhị phân embedding_bin."""
+    migrated = migrate_chunk_embeddings(
+        batch_size=batch_size,
+        dtype=dtype,
+        keep_list=keep_list,
+    )
+    click.echo(f"Migrated {migrated} chunks")
+
+
+@click.command("vad-analyze")
+@click.argument("wav_paths", nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--mode",
+    type=click.Choice(["off", "keepalive", "pause"]),
+    default="keepalive",
+    show_default=True,
+)
+@click.option("--threshold-db", type=float, default=None, help="Mặc định theo VAD_THRESHOLD_DB.")
+def vad_analyze_command(wav_paths, mode, threshold_db):
+    """Chạy VAD offline trên file WAV 16-bit mono và in tỉ lệ im lặng / audio được gửi."""
+    modes = {"off": VAD_OFF, "keepalive": VAD_KEEPALIVE, "pause": VAD_PAUSE}
+    for path in wav_paths:
+        stats = analyze_wav(path, mode=modes[mode], threshold_db=threshold_db)
+        click.echo(
+            f"{path}: silence_ratio={stats['silence_ratio']} "
+            f"sent={stats['sent_seconds']}s / input={stats['input_seconds']}s "
+            f"speech_segments={stats['speech_segments']}"
+        )
+
+
+@click.command("resample-benchmark")
+@click.option("--rate", type=click.Choice([str(r) for r in SUPPORTED_RATES]), default="48000", show_default=True)
+@click.option("--channels", type=click.Choice(["1", "2"]), default="2", show_default=True)
+@click.option("--encoding", type=click.Choice(list(SAMPLE_DTYPES)), default="pcm_f32le", show_default=True)
+@click.option("--seconds", default=60, show_default=True, help="Độ dài audio giả lập.")
+def resample_benchmark_command(rate, channels, encoding, seconds):
+    """Đo số luồng audio 1 core resample kịp thời gian thực."""
+    stats = benchmark_resampler(int(rate), int(channels), encoding, seconds=seconds)
+    for key, value in stats.items():
+        click.echo(f"{key}: {value}")
+
+
+@click.command("migrate-transcripts")
+@click.option("--batch-size", default=200, show_default=True, help="Số meeting mỗi batch.")
+@with_appcontext
+def migrate_transcripts_command(batch_size):
+    """Tách full_transcript cũ thành TranscriptSegment với speaker id thô."""
+    migrated = migrate_legacy_transcripts(batch_size=batch_size)
+    click.echo(f"Migrated {migrated} meetings")
@@ -15,6 +15,109 @@ class Config:
     SM_URL = "wss://eu.rt.speechmatics.com/v2"
     HEADER_LEN = 5
 
+    # Embedding pipeline: kích thước batch (token ước lượng / số input), số batch song song
+    EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS") or 20000)
+    EMBEDDING_BATCH_MAX_ITEMS = int(os.getenv("EMBEDDING_BATCH_MAX_ITEMS") or 256)
+    EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY") or 4)
+    EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES") or 5)
+    # Số embedding giữ trong LRU trước collection EmbeddingCache
+    EMBEDDING_STORE_LRU_SIZE = int(os.getenv("EMBEDDING_STORE_LRU_SIZE") or 20000)
+
+    # Cache embedding câu hỏi chat (LRU + TTL), tầng lưu bền qua EmbeddingCache
+    QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE") or 5000)
+    QUERY_CACHE_TTL_SECONDS = int(os.getenv("QUERY_CACHE_TTL_SECONDS") or 24 * 3600)
+    QUERY_CACHE_PERSIST = (os.getenv("QUERY_CACHE_PERSIST") or "true").lower() == "true"
+
+    # Định dạng lưu Chunk.embedding_bin: float32 hoặc float16
+    EMBEDDING_STORAGE_DTYPE = os.getenv("EMBEDDING_STORAGE_DTYPE") or "float32"
+
+    # RAG: giới hạn bộ nhớ cho cache ma trận embedding theo scope (MB)
+    MATRIX_CACHE_MAX_MB = int(os.getenv("MATRIX_CACHE_MAX_MB") or 256)
+
+    # RAG: bỏ các chunk có cosine thấp hơn ngưỡng (-1 = không lọc)
+    RETRIEVAL_MIN_SCORE = float(os.getenv("RETRIEVAL_MIN_SCORE") or -1.0)
+
+    # RAG: hybrid BM25 + vector (reciprocal rank fusion)
+    LEXICAL_MAX_USERS = int(os.getenv("LEXICAL_MAX_USERS") or 200)
+    HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES") or 20)
+    HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K") or 60)
+    # Fast path bỏ qua embedding khi top-1 BM25 khớp mọi âm tiết của câu hỏi
+    # và điểm >= HYBRID_DECISIVE_RATIO lần top-2
+    HYBRID_DECISIVE_RATIO = float(os.getenv("HYBRID_DECISIVE_RATIO") or 2.0)
+    # Hit BM25 chỉ được đưa vào kết quả hybrid khi khớp >= tỉ lệ này số âm tiết của câu hỏi
+    # (vector hit đã qua RETRIEVAL_MIN_SCORE; 0 = không lọc)
+    HYBRID_MIN_LEXICAL_COVERAGE = float(os.getenv("HYBRID_MIN_LEXICAL_COVERAGE") or 0.5)
+
+    # RAG: ANN index (IVF-flat) trên đĩa cho từng user
+    ANN_INDEX_DIR = os.getenv("ANN_INDEX_DIR") or os.path.join("instance", "ann_index")
+    ANN_NPROBE = int(os.getenv("ANN_NPROBE") or 8)
+    ANN_MAX_LISTS = int(os.getenv("ANN_MAX_LISTS") or 256)
+    ANN_MIN_ROWS_FOR_IVF = int(os.getenv("ANN_MIN_ROWS_FOR_IVF") or 2048)
+    ANN_BRUTE_FORCE_ROWS = int(os.getenv("ANN_BRUTE_FORCE_ROWS") or 2048)
+    ANN_MAX_DELTA_ROWS = int(os.getenv("ANN_MAX_DELTA_ROWS") or 1024)
+    ANN_MAX_LOADED = int(os.getenv("ANN_MAX_LOADED") or 64)
+    # Ingest RAG trong lúc họp: độ dài cửa sổ (ký tự) và chu kỳ flush (giây)
+    LIVE_INGEST_WINDOW_CHARS = int(os.getenv("LIVE_INGEST_WINDOW_CHARS") or 600)
+    LIVE_INGEST_INTERVAL_SECONDS = int(os.getenv("LIVE_INGEST_INTERVAL_SECONDS") or 15)
+    # Tóm tắt: transcript <= SUMMARY_SINGLE_CALL_MAX_TOKENS gọi 1 lần, dài hơn thì
+    # map-reduce theo cửa sổ SUMMARY_WINDOW_TOKENS, tối đa SUMMARY_MAP_CONCURRENCY lời gọi song song
+    SUMMARY_SINGLE_CALL_MAX_TOKENS = int(os.getenv("SUMMARY_SINGLE_CALL_MAX_TOKENS") or 12000)
+    SUMMARY_WINDOW_TOKENS = int(os.getenv("SUMMARY_WINDOW_TOKENS") or 6000)
+    SUMMARY_MAP_CONCURRENCY = int(os.getenv("SUMMARY_MAP_CONCURRENCY") or 4)
+    # Tóm tắt cuốn chiếu trong lúc họp (plan in_meeting_ai): cập nhật sau mỗi N câu mới
+    ROLLING_SUMMARY_EVERY_SEGMENTS = int(os.getenv("ROLLING_SUMMARY_EVERY_SEGMENTS") or 30)
+    # Job tóm tắt chạy nền: số worker, và job queued/running không cập nhật quá
+    # SUMMARY_JOB_STALE_SECONDS (server restart) được chạy lại khi có request
+    SUMMARY_JOB_WORKERS = int(os.getenv("SUMMARY_JOB_WORKERS") or 4)
+    SUMMARY_JOB_STALE_SECONDS = int(os.getenv("SUMMARY_JOB_STALE_SECONDS") or 300)
+    # Job tóm tắt chờ sm_worker của meeting (vừa end) flush xong tối đa N giây trước khi đọc transcript
+    SUMMARY_LIVE_WAIT_SECONDS = int(os.getenv("SUMMARY_LIVE_WAIT_SECONDS") or 60)
+    # GET /summarize/<sid>?wait=1 (client cũ) chờ job xong tối đa N giây rồi trả summary
+    SUMMARY_JOB_WAIT_SECONDS = int(os.getenv("SUMMARY_JOB_WAIT_SECONDS") or 5)
+    # Cache kết quả tóm tắt theo hash transcript + model + phiên bản prompt
+    SUMMARY_CACHE_SIZE = int(os.getenv("SUMMARY_CACHE_SIZE") or 500)
+    SUMMARY_CACHE_TTL_SECONDS = int(os.getenv("SUMMARY_CACHE_TTL_SECONDS") or 24 * 3600)
+    # LLM gateway: số request OpenAI đồng thời (toàn process / mỗi user), thời gian chờ slot,
+    # số lần retry, timeout theo thao tác và circuit breaker (N lỗi liên tiếp -> ngắt T giây)
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY") or 16)
+    LLM_PER_USER_CONCURRENCY = int(os.getenv("LLM_PER_USER_CONCURRENCY") or 3)
+    LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS") or 10)
+    LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES") or 2)
+    LLM_TIMEOUT_CHAT_SECONDS = float(os.getenv("LLM_TIMEOUT_CHAT_SECONDS") or 60)
+    LLM_TIMEOUT_EMBEDDINGS_SECONDS = float(os.getenv("LLM_TIMEOUT_EMBEDDINGS_SECONDS") or 30)
+    LLM_TIMEOUT_SPEECH_SECONDS = float(os.getenv("LLM_TIMEOUT_SPEECH_SECONDS") or 120)
+    LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES") or 5)
+    LLM_BREAKER_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS") or 30)
+    # Write-behind transcript: flush khi đủ N câu hoặc sau T ms
+    TRANSCRIPT_FLUSH_LINES = int(os.getenv("TRANSCRIPT_FLUSH_LINES") or 20)
+    TRANSCRIPT_FLUSH_INTERVAL_MS = int(os.getenv("TRANSCRIPT_FLUSH_INTERVAL_MS") or 1000)
+    # Số event loop dùng chung cho mọi sm_worker (shard theo sid)
+    MEETING_RUNTIME_LOOPS = int(os.getenv("MEETING_RUNTIME_LOOPS") or 2)
+    # Audio gửi Speechmatics: PCM s16 mono, gom thành khối AUDIO_BLOCK_MS,
+    # đệm tối đa AUDIO_BUFFER_MAX_BYTES mỗi meeting (mặc định ~10 giây)
+    AUDIO_SAMPLE_RATE = int(os.getenv("AUDIO_SAMPLE_RATE") or 16000)
+    AUDIO_BLOCK_MS = int(os.getenv("AUDIO_BLOCK_MS") or 160)
+    AUDIO_BUFFER_MAX_BYTES = int(os.getenv("AUDIO_BUFFER_MAX_BYTES") or 320000)
+    # VAD năng lượng trước khi gửi Speechmatics (chế độ theo plan: PLAN_LIMITS["vad_mode"])
+    VAD_FRAME_MS = int(os.getenv("VAD_FRAME_MS") or 20)
+    VAD_THRESHOLD_DB = float(os.getenv("VAD_THRESHOLD_DB") or -45)
+    VAD_HANGOVER_MS = int(os.getenv("VAD_HANGOVER_MS") or 400)
+    VAD_PREROLL_MS = int(os.getenv("VAD_PREROLL_MS") or 200)
+    VAD_KEEPALIVE_MS = int(os.getenv("VAD_KEEPALIVE_MS") or 1000)
+    # Reconnect Speechmatics: backoff mũ (giây) và số giây audio gần nhất được phát lại
+    SM_RECONNECT_MAX_ATTEMPTS = int(os.getenv("SM_RECONNECT_MAX_ATTEMPTS") or 6)
+    SM_RECONNECT_BASE_DELAY = float(os.getenv("SM_RECONNECT_BASE_DELAY") or 0.5)
+    SM_RECONNECT_MAX_DELAY = float(os.getenv("SM_RECONNECT_MAX_DELAY") or 15)
+    SM_REPLAY_SECONDS = int(os.getenv("SM_REPLAY_SECONDS") or 10)
+    # Khoảng cách tối thiểu giữa 2 lần emit partial transcript của 1 meeting
+    PARTIAL_EMIT_INTERVAL_MS = int(os.getenv("PARTIAL_EMIT_INTERVAL_MS") or 250)
+    # Phiên live không nhận audio quá SESSION_IDLE_TIMEOUT_SECONDS sẽ bị kết thúc;
+    # reaper kiểm tra idle/thời lượng họp mỗi SESSION_REAPER_INTERVAL_SECONDS
+    SESSION_IDLE_TIMEOUT_SECONDS = int(os.getenv("SESSION_IDLE_TIMEOUT_SECONDS") or 120)
+    SESSION_REAPER_INTERVAL_SECONDS = int(os.getenv("SESSION_REAPER_INTERVAL_SECONDS") or 5)
+    # Sau khi socket rớt, worker được giữ SESSION_RESUME_GRACE_SECONDS chờ client resume (0 = tắt)
+    SESSION_RESUME_GRACE_SECONDS = int(os.getenv("SESSION_RESUME_GRACE_SECONDS") or 60)
+
     CLOUD_NAME = os.getenv("CLOUD_NAME")
     API_KEY = os.getenv("API_KEY")
     API_SECRET = os.getenv("API_SECRET")
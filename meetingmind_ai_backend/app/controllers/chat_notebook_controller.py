@@ -1,14 +1,6 @@
 import math
-from openai import OpenAI
-import os
-from dotenv import load_dotenv
 from ..models.chunk_model import Chunk
-
-load_dotenv()
-
-client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY")
-)
+from ..services.llm_gateway_service import llm_gateway
 
 def cosine_similarity(v1, v2):
     dot = sum(a * b for a, b in zip(v1, v2))
@@ -17,7 +9,8 @@ def cosine_similarity(v1, v2):
     return dot / (norm1 * norm2)
 
 def get_embedding(text):
-    res = client.embeddings.create(
+    res = llm_gateway.embeddings(
+        "notebook_embeddings",
         model="text-embedding-3-small",
         input=text
     )
@@ -40,7 +33,11 @@ class ChatNotebookController:
         # Tính similarity
         scored_chunks = []
         for chunk in chunks:
-            score = cosine_similarity(question_embedding, chunk.embedding)
+            # vector() đọc embedding_bin, fallback ListField cũ chưa migrate
+            vector = chunk.vector()
+            if vector is None:
+                continue
+            score = cosine_similarity(question_embedding, vector)
             scored_chunks.append((score, chunk.text))
         
         # Top K chunk
@@ -51,7 +48,9 @@ class ChatNotebookController:
         context = "\n\n".join([text for _, text in top_chunks])
 
         # chat với openai
-        completion = client.chat.completions.create(
+        completion = llm_gateway.chat(
+            "notebook_chat",
+            user_id=user_id,
             model="gpt-4.1-mini",
             messages=[
                 {
@@ -1,4 +1,6 @@
-from ..models.chunk_model import Chunk
+from ..config import Config
+from ..models.chunk_model import Chunk, pack_embedding
+from ..services.chunk_sync_service import on_chunks_inserted
 
 class ChunkController:
     @staticmethod
@@ -11,12 +13,17 @@ class ChunkController:
             file_id=file_id,
             chunk_index=chunk_index,
             text=text,
-            embedding=embedding
+            embedding_bin=pack_embedding(embedding, Config.EMBEDDING_STORAGE_DTYPE)
         )
         chunk.save()
+        on_chunks_inserted([chunk])
         return {"id": str(chunk.id), "chunk_index": chunk.chunk_index}, 201
     @staticmethod
     def get_chunks_by_folder(folder_id):
         chunks = Chunk.objects(folder_id=folder_id)
-        chunk_list = [{"id": str(chunk.id), "chunk_index": chunk.chunk_index, "text": chunk.text, "embedding": chunk.embedding, "created_at": chunk.created_at.isoformat()} for chunk in chunks]
+        chunk_list = []
+        for chunk in chunks:
+            # embedding list cũ rỗng với chunk đã migrate sang embedding_bin
+            vector = chunk.vector()
+            chunk_list.append({"id": str(chunk.id), "chunk_index": chunk.chunk_index, "text": chunk.text, "embedding": vector.tolist() if vector is not None else [], "created_at": chunk.created_at.isoformat()})
         return chunk_list, 200
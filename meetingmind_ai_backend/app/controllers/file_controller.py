@@ -2,15 +2,7 @@ from ..models.file_model import File
 from ..models.folder_model import Folder
 from ..models.chunk_model import Chunk
 
-from openai import OpenAI
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY")
-)
+from ..services.llm_gateway_service import llm_gateway
 
 class FileController:
 
@@ -36,7 +28,8 @@ class FileController:
         return chunks
 
     def get_embedding(text: str) -> list[float]:
-        response = client.embeddings.create(
+        response = llm_gateway.embeddings(
+            "file_embeddings",
             model="text-embedding-3-small",
             input=text
         )
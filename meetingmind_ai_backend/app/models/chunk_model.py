@@ -1,7 +1,49 @@
 from flask_mongoengine import MongoEngine
 from datetime import datetime
+import struct
+
+import numpy as np
+
 from ..extensions import db
 
+# Header của embedding_bin: magic "EM", version, mã dtype, số chiều (little-endian)
+EMBEDDING_HEADER = struct.Struct("<2sBBI")
+EMBEDDING_MAGIC = b"EM"
+EMBEDDING_VERSION = 1
+EMBEDDING_DTYPES = {1: np.dtype("<f4"), 2: np.dtype("<f2")}
+EMBEDDING_DTYPE_CODES = {"float32": 1, "float16": 2}
+
+
+def pack_embedding(vector, dtype="float32"):
+    """Đóng gói vector thành bytes: header + dữ liệu float32/float16 liên tục."""
+    code = EMBEDDING_DTYPE_CODES[dtype]
+    array = np.asarray(vector, dtype=EMBEDDING_DTYPES[code])
+    header = EMBEDDING_HEADER.pack(EMBEDDING_MAGIC, EMBEDDING_VERSION, code, array.shape[0])
+    return header + array.tobytes()
+
+
+def unpack_embedding(blob):
+    """Đọc embedding_bin bằng np.frombuffer (không copy với float32)."""
+    magic, version, code, dim = EMBEDDING_HEADER.unpack_from(blob)
+    if magic != EMBEDDING_MAGIC or version != EMBEDDING_VERSION:
+        raise ValueError("Unknown embedding format")
+    return np.frombuffer(blob, dtype=EMBEDDING_DTYPES[code], count=dim, offset=EMBEDDING_HEADER.size)
+
+
+def decode_embedding(raw):
+    """
+    Dual-read cho document thô (as_pymongo): ưu tiên embedding_bin,
+    fallback về ListField embedding cũ chưa được migrate.
+    """
+    blob = raw.get("embedding_bin")
+    if blob:
+        return unpack_embedding(blob)
+    embedding = raw.get("embedding")
+    if embedding:
+        return np.asarray(embedding, dtype=np.float32)
+    return None
+
+
 class Chunk(db.Document):
     user_id = db.StringField(required=True)
 
@@ -13,8 +55,19 @@ class Chunk(db.Document):
 
     text = db.StringField(required=True)
 
-    embedding = db.ListField(db.FloatField(), required=True)
+    # Định dạng cũ (1 double BSON / phần tử), chỉ còn để đọc dữ liệu chưa migrate
+    embedding = db.ListField(db.FloatField())
+
+    # Định dạng mới: pack_embedding() -> header + float32/float16
+    embedding_bin = db.BinaryField()
 
     created_at = db.DateTimeField(default=datetime.utcnow)
-    
+
     meta = {'collection': 'Chunks'}
+
+    def vector(self):
+        if self.embedding_bin:
+            return unpack_embedding(self.embedding_bin)
+        if self.embedding:
+            return np.asarray(self.embedding, dtype=np.float32)
+        return None
@@ -0,0 +1,16 @@
+from datetime import datetime
+
+from ..extensions import db
+
+
+class EmbeddingCache(db.Document):
+    """
+    Embedding đã tính, định danh theo nội dung: key = "<model>:<sha256 text chuẩn hoá>".
+    vector lưu theo định dạng pack_embedding() của chunk_model.
+    """
+    key = db.StringField(primary_key=True, required=True)
+    model = db.StringField(required=True)
+    vector = db.BinaryField(required=True)
+    created_at = db.DateTimeField(default=datetime.utcnow)
+
+    meta = {"collection": "EmbeddingCache"}
@@ -16,8 +16,11 @@ class Meeting(db.Document):
     ended_at = db.DateTimeField()
     
     # Nội dung
-    full_transcript = db.StringField() # Lưu toàn bộ văn bản
+    full_transcript = db.StringField() # Lưu toàn bộ văn bản (dựng lười từ TranscriptSegment)
+    segment_count = db.IntField(default=0)  # Số TranscriptSegment đã cấp seq
+    transcript_seq = db.IntField(default=0)  # Số segment đã được dựng vào full_transcript
     speaker_names = db.DictField(default=dict)  # Map speakerId -> display name
+    rag_indexed = db.BooleanField(default=False)  # Đã ingest đủ transcript vào Chunks trong lúc họp
 
     # Tags/labels
     tags = db.ListField(db.StringField(), default=list)
@@ -26,6 +29,9 @@ class Meeting(db.Document):
     summary = db.StringField()
     action_items = db.ListField(db.StringField())
     key_decisions = db.ListField(db.StringField())
+    # Tóm tắt cuốn chiếu trong lúc họp (rolling_summary_service)
+    live_summary = db.DictField()  # {summary, action_items, key_decisions}
+    live_summary_seq = db.IntField(default=0)  # Số segment đầu đã được gộp vào live_summary
 
     meta = {
         'collection': 'Meetings',
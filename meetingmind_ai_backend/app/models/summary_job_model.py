@@ -0,0 +1,50 @@
+from datetime import datetime
+from ..extensions import db
+
+
+class SummaryJob(db.Document):
+    """Job tóm tắt + lưu + ingest RAG của 1 meeting, chạy nền (summary_job_service)."""
+
+    job_id = db.StringField(required=True, unique=True)
+    sid = db.StringField(required=True)
+    user_id = db.StringField(required=True)
+    status = db.StringField(
+        default="queued",
+        choices=["queued", "running", "completed", "failed"],
+    )
+    stage = db.StringField(default="queued")
+    progress = db.IntField(default=0)  # 0-100
+    create_tasks = db.BooleanField(default=False)
+    result = db.DictField()  # {summary, action_items, key_decisions, timings}
+    error = db.StringField()
+    timings = db.DictField(default=dict)  # stage -> giây
+    created_at = db.DateTimeField(default=datetime.utcnow)
+    updated_at = db.DateTimeField(default=datetime.utcnow)
+    finished_at = db.DateTimeField()
+
+    meta = {
+        "collection": "SummaryJobs",
+        "indexes": [
+            "job_id",
+            ("sid", "status"),
+            "user_id",
+            "-created_at",
+        ],
+    }
+
+    def to_dict(self):
+        data = {
+            "job_id": self.job_id,
+            "sid": self.sid,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+            "timings": self.timings or {},
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+        if self.status == "completed":
+            data.update(self.result or {})
+        if self.error:
+            data["error"] = self.error
+        return data
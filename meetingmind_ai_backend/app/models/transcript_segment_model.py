@@ -0,0 +1,28 @@
+from datetime import datetime
+
+from ..extensions import db
+
+
+class TranscriptSegment(db.Document):
+    """
+    1 câu final từ Speechmatics. Chỉ insert (append-only), không sửa;
+    Meeting.full_transcript được dựng lại từ các segment theo seq.
+    """
+    sid = db.StringField(required=True)
+    seq = db.IntField(required=True)  # Thứ tự trong cuộc họp, cấp qua Meeting.segment_count
+
+    speaker_id = db.StringField(default="Unknown")  # Speaker id thô của Speechmatics (S1, S2...)
+    text = db.StringField(required=True)
+
+    # Mốc thời gian (giây) tính từ đầu phiên nhận dạng
+    start_time = db.FloatField()
+    end_time = db.FloatField()
+
+    created_at = db.DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'TranscriptSegments',
+        'indexes': [
+            {'fields': ['sid', 'seq'], 'unique': True},
+        ]
+    }
@@ -15,6 +15,15 @@ from app.services.admin_upgrade_service import (
     webhook_secret_matches,
 )
 from app.services.notification_center_service import broadcast_user_notification
+from app.services.embedding_store_service import embedding_store
+from app.services.llm_gateway_service import llm_gateway
+from app.services.matrix_cache_service import matrix_cache
+from app.services.meeting_runtime_service import meeting_runtime
+from app.services.query_cache_service import query_cache
+from app.services.session_registry_service import session_registry
+from app.services.summary_cache_service import summary_cache
+from app.services.summary_job_service import job_stats
+from app.services.transcript_emit_service import emit_stats
 
 
 admin_bp = Blueprint("admin", __name__, url_prefix="/admin")
@@ -350,3 +359,46 @@ def revoke_code(request_id):
     if error:
         return jsonify({"error": error}), 400
     return jsonify({"message": "Code revoked", "request": serialize_upgrade_request(doc)}), 200
+
+
+@admin_bp.route("/api/metrics", methods=["GET"])
+def runtime_metrics():
+    unauthorized = _require_admin()
+    if unauthorized:
+        return unauthorized
+
+    return jsonify({
+        "embedding_store": embedding_store.stats(),
+        "matrix_cache": matrix_cache.stats(),
+        "query_cache": query_cache.stats(),
+        "meeting_runtime": meeting_runtime.stats(),
+        "transcript_emits": emit_stats(),
+        "live_sessions": session_registry.stats(),
+        "summary_jobs": job_stats(),
+        "summary_cache": summary_cache.stats(),
+        "llm_gateway": llm_gateway.stats(),
+    }), 200
+
+
+@admin_bp.route("/api/live-sessions", methods=["GET"])
+def live_sessions():
+    unauthorized = _require_admin()
+    if unauthorized:
+        return unauthorized
+
+    return jsonify({
+        "sessions": session_registry.snapshot(),
+        "stats": session_registry.stats(),
+    }), 200
+
+
+@admin_bp.route("/api/live-sessions/<sid>/end", methods=["POST"])
+def end_live_session(sid):
+    unauthorized = _require_admin()
+    if unauthorized:
+        return unauthorized
+
+    if session_registry.get(sid) is None:
+        return jsonify({"error": "Session not found"}), 404
+    session_registry.end(sid, "admin")
+    return jsonify({"message": "Session ending", "sid": sid}), 200
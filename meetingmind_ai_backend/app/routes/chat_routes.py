@@ -1,12 +1,12 @@
 from flask import Blueprint, jsonify, request
-from openai import OpenAI
 
-from app.config import Config
 from app.services.authorization_service import require_meeting_owner, require_same_user
+from app.services.llm_gateway_service import LLMGatewayError, llm_gateway
+from app.services.meeting_service import apply_speaker_names
 from app.services.rag_service import retrieve_relevant_chunks
+from app.services.transcript_service import get_full_transcript
 
 bp = Blueprint("chatm", __name__, url_prefix="/chat")
-client = OpenAI(api_key=Config.OPENAI_API_KEY)
 
 
 @bp.route("/meeting", methods=["POST"])
@@ -33,8 +33,12 @@ def chat_with_meeting():
     source_type = "RAG"
 
     if not relevant_chunks:
-        if meeting and meeting.full_transcript:
-            raw_transcript = meeting.full_transcript
+        raw_transcript = (
+            apply_speaker_names(get_full_transcript(sid, meeting), meeting.speaker_names)
+            if meeting
+            else None
+        )
+        if raw_transcript:
             if len(raw_transcript) > 4000:
                 raw_transcript = raw_transcript[:4000] + "..."
 
@@ -47,10 +51,16 @@ def chat_with_meeting():
             context_text = "Khong tim thay thong tin ve cuoc hop nay."
             source_type = "NONE"
     else:
-        context_text = "\n".join([chunk.text for chunk in relevant_chunks])
+        # Chunk lưu nhãn người nói thô: thay tên hiển thị lúc dựng context
+        context_text = apply_speaker_names(
+            "\n".join([chunk.text for chunk in relevant_chunks]),
+            meeting.speaker_names if meeting else None,
+        )
 
     try:
-        response = client.chat.completions.create(
+        response = llm_gateway.chat(
+            "meeting_chat",
+            user_id=user_id,
             model="gpt-4o-mini",
             messages=[
                 {
@@ -77,6 +87,8 @@ def chat_with_meeting():
         )
         answer = response.choices[0].message.content.strip()
         return jsonify({"answer": answer, "source": source_type})
+    except LLMGatewayError as e:
+        return jsonify({"error": str(e), "code": "ai_unavailable"}), 503
     except Exception as e:
         print(f"Chat error: {e}")
         return jsonify({"error": str(e)}), 500
@@ -5,7 +5,9 @@ from flask import Blueprint, jsonify, request
 from app.models.chunk_model import Chunk
 from app.services.agenda_service import generate_next_meeting_agenda
 from app.services.authorization_service import require_meeting_owner, require_same_user
+from app.services.chunk_sync_service import on_chunks_deleted
 from app.services.meeting_service import get_user_meetings, update_meeting_meta
+from app.services.transcript_service import delete_segments, normalize_speaker_id
 from app.services.reminder_service import ReminderController
 
 meeting_bp = Blueprint("meetings", __name__, url_prefix="/meetings")
@@ -40,7 +42,9 @@ def delete_meeting(sid):
             return auth_error
 
         meeting.delete()
+        delete_segments(sid)
         deleted_chunks = Chunk.objects(folder_id=sid).delete()
+        on_chunks_deleted(meeting.user_id, folder_id=sid)
         print(f"Deleted {deleted_chunks} chunks for meeting {sid}")
         return jsonify({"message": "Meeting deleted successfully"}), 200
     except Exception as e:
@@ -113,7 +117,7 @@ def update_speaker_mapping(sid):
         for key, value in speaker_names.items():
             if not key or not value:
                 continue
-            meeting.speaker_names[str(key)] = str(value)
+            meeting.speaker_names[normalize_speaker_id(key)] = str(value)
 
         meeting.save()
         return jsonify({"id": meeting.sid, "speaker_names": meeting.speaker_names}), 200
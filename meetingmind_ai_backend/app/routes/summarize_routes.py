@@ -1,9 +1,10 @@
 from flask import Blueprint, jsonify, request
-from app.services.openai_service import summarize_transcript
-from app.services.meeting_service import get_or_create_meeting, save_summary, apply_speaker_names
+from app.config import Config
+from app.services.meeting_service import get_or_create_meeting, apply_speaker_names
 from app.models.meeting_model import Meeting
-from app.services.rag_service import ingest_meeting_transcript
-from app.services.reminder_service import ReminderController
+from app.services.summary_cache_service import cached_summary
+from app.services.summary_job_service import get_summary_job, start_summary_job, wait_summary_job
+from app.services.transcript_service import get_full_transcript
 from app.services.authorization_service import (
     get_authenticated_user_id,
     require_meeting_owner,
@@ -14,6 +15,14 @@ bp = Blueprint("summarize", __name__)
 
 @bp.route("/summarize/<sid>", methods=["GET"])
 def summarize_sid(sid):
+    """
+    Meeting đã có summary: 200 + summary như trước.
+    Chưa có: tạo (hoặc gắn vào) job tóm tắt nền và trả 202 + job ngay, không giữ web worker.
+    Chuyển đổi client: nhận 202 -> theo dõi "summary_job" (room user_id) hoặc
+    GET /summarize/jobs/<job_id> tới khi completed, rồi gọi lại GET /summarize/<sid> (200).
+    Client cũ chỉ hiểu 200: thêm ?wait=1 để chờ tối đa SUMMARY_JOB_WAIT_SECONDS giây,
+    job chưa xong thì vẫn trả 202.
+    """
     # Lấy user_id từ query params, ưu tiên user_id của meeting nếu có
     user_id = request.args.get('user_id')
 
@@ -35,7 +44,8 @@ def summarize_sid(sid):
         return meeting_error
     
     # Kiểm tra xem đã có transcript trong DB chưa
-    if not meeting.full_transcript:
+    full_transcript = get_full_transcript(sid, meeting)
+    if not full_transcript:
         return jsonify({
             "error": "No transcript found in database",
             "code": "no_transcript",
@@ -43,7 +53,7 @@ def summarize_sid(sid):
         }), 400
 
     # Áp dụng mapping tên người nói (nếu có)
-    updated_transcript = apply_speaker_names(meeting.full_transcript, meeting.speaker_names)
+    updated_transcript = apply_speaker_names(full_transcript, meeting.speaker_names)
 
     # Nếu đã có summary rồi thì trả về luôn (tránh tính phí OpenAI lại)
     if meeting.summary:
@@ -54,35 +64,43 @@ def summarize_sid(sid):
             "full_transcript": updated_transcript
         })
 
-    # 2. Gọi OpenAI để tóm tắt
-    try:
-        data = summarize_transcript(updated_transcript)
-        
-        # 3. Lưu kết quả vào Meeting DB
-        save_summary(sid, data)
-        
-        # 4. BẮT ĐẦU RAG: Ingest dữ liệu vào bảng Chunks để dùng cho Chat sau này
-        # Chạy ngầm hoặc trực tiếp tùy độ dài transcript
-        ingest_meeting_transcript(sid, user_id, updated_transcript)
-        
-        # 5. Optionally create tasks from action items
-        create_tasks = request.args.get("create_tasks", "false").lower() == "true"
-        if create_tasks and data.get("action_items"):
-            items = [{"title": x} for x in data.get("action_items")]
-            ReminderController.create_reminders_from_action_items(
-                user_id=user_id,
-                items=items,
-            )
+    # 2. Tóm tắt + lưu + ingest RAG (+ reminders) chạy trong job nền; tiến độ emit
+    # "summary_job" tới room user_id. Gọi lại khi job chưa xong sẽ gắn vào job đang chạy.
+    create_tasks = request.args.get("create_tasks", "false").lower() == "true"
+    job = start_summary_job(sid, user_id, create_tasks=create_tasks)
 
-        return jsonify({
-            "summary": data.get("summary", ""),
-            "action_items": data.get("action_items", []),
-            "key_decisions": data.get("key_decisions", []),
-            "full_transcript": updated_transcript
-        })
-    except Exception as e:
-        print(f"Error summarizing: {e}")
-        return jsonify({"error": str(e)}), 500
+    # Mặc định trả job id ngay; ?wait=1 (legacy) chờ ngắn rồi trả summary nếu kịp
+    if request.args.get("wait", "").lower() not in ("1", "true"):
+        return jsonify(job.to_dict()), 202
+
+    job = wait_summary_job(job, Config.SUMMARY_JOB_WAIT_SECONDS)
+    if job.status == "failed":
+        return jsonify({"error": job.error or "Summarize failed", "job_id": job.job_id}), 500
+    if job.status != "completed":
+        return jsonify(job.to_dict()), 202
+
+    result = job.result or {}
+    return jsonify({
+        "summary": result.get("summary", ""),
+        "action_items": result.get("action_items", []),
+        "key_decisions": result.get("key_decisions", []),
+        "full_transcript": updated_transcript,
+        "timings": result.get("summary_timings"),
+        "job_id": job.job_id,
+    })
+
+
+@bp.route("/summarize/jobs/<job_id>", methods=["GET"])
+def summarize_job_status(job_id):
+    job = get_summary_job(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+
+    _, auth_error = require_same_user(request, job.user_id)
+    if auth_error:
+        return auth_error
+
+    return jsonify(job.to_dict())
 
 @bp.route("/summarize", methods=["POST"])
 def summarize_post():
@@ -95,10 +113,12 @@ def summarize_post():
     if not transcript:
         return jsonify({"error": "No transcript"}), 400
 
-    data = summarize_transcript(transcript)
+    # Client retry gửi lại đúng transcript cũ: trả kết quả cache, request trùng đồng thời gộp 1 lần gọi
+    data = cached_summary(transcript)
     return jsonify({
         "summary": data.get("summary", ""),
         "action_items": data.get("action_items", []),
         "key_decisions": data.get("key_decisions", []),
-        "full_transcript": transcript
+        "full_transcript": transcript,
+        "timings": data.get("timings"),
     })
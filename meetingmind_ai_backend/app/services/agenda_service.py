@@ -1,9 +1,6 @@
 import json
-from openai import OpenAI
-from app.config import Config
 from app.models.meeting_model import Meeting
-
-client = OpenAI(api_key=Config.OPENAI_API_KEY)
+from app.services.llm_gateway_service import llm_gateway
 
 
 def generate_next_meeting_agenda(user_id: str, limit: int = 5):
@@ -40,7 +37,9 @@ Lịch sử:
 {context}
 """
 
-    res = client.chat.completions.create(
+    res = llm_gateway.chat(
+        "agenda",
+        user_id=user_id,
         model="gpt-4o-mini",
         messages=[{"role": "user", "content": prompt}],
         temperature=0.2,
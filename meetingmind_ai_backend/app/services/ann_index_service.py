@@ -0,0 +1,587 @@
+"""
+ANN index (IVF-flat) cho chunks, mỗi user một thư mục trên đĩa:
+
+    <ANN_INDEX_DIR>/<user_id>/
+        centroids.npy   float32 (nlist, dim)    tâm cụm đã chuẩn hoá
+        vectors.npy     float32 (n, dim)        vectors chuẩn hoá, xếp theo cụm (mmap khi query)
+        offsets.npy     int64   (nlist + 1)     dòng bắt đầu của từng cụm
+        folders.npy     int32   (n,)            mã folder_id/sid của từng dòng
+        files.npy       int32   (n,)            mã file_id của từng dòng
+        alive.npy       bool    (n,)            False = tombstone (đã xoá)
+        delta.npy       float32 (m, dim)        chunks thêm sau lần build gần nhất
+        delta.json      ids/folders/files của delta
+        meta.json       dim, chunk_ids, vocab folder/file, n (ghi sau cùng)
+
+Ingest/xoá chunk phải đi qua chunk_sync_service để index được cập nhật.
+Nhiều worker dùng chung ANN_INDEX_DIR: mỗi process ghi nhận mtime của
+meta/alive/delta lúc load và load lại khi file bị process khác thay đổi
+(trước khi query hoặc sửa). Hai process sửa cùng lúc vẫn có thể ghi đè delta
+của nhau; lần rebuild kế tiếp đọc lại từ Mongo nên index tự hội tụ.
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from ..config import Config
+from ..models.chunk_model import Chunk, decode_embedding
+
+_ASSIGN_BATCH = 4096
+_KMEANS_ITERATIONS = 10
+_TRAIN_POINTS_PER_LIST = 64
+_STAMP_FILES = ("meta.json", "alive.npy", "delta.json")
+
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1)
+    norms[norms == 0] = 1.0
+    return matrix / norms[:, None]
+
+
+def _atomic_save_npy(path, array):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp, path)
+
+
+def _atomic_save_json(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _top_k(scores, k):
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def _train_centroids(sample, nlist, seed=0):
+    """Spherical k-means trên tập mẫu; cụm rỗng được khởi tạo lại ngẫu nhiên."""
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    rows = np.arange(len(sample))
+    for _ in range(_KMEANS_ITERATIONS):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        onehot = np.zeros((nlist, len(sample)), dtype=np.float32)
+        onehot[assign, rows] = 1.0
+        sums = onehot @ sample
+        empty = onehot.sum(axis=1) == 0
+        if empty.any():
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        centroids = _normalize_rows(sums).astype(np.float32)
+    return centroids
+
+
+def _assign_lists(matrix, centroids):
+    assign = np.empty(len(matrix), dtype=np.int64)
+    for start in range(0, len(matrix), _ASSIGN_BATCH):
+        block = matrix[start:start + _ASSIGN_BATCH]
+        assign[start:start + _ASSIGN_BATCH] = np.argmax(block @ centroids.T, axis=1)
+    return assign
+
+
+def _read_user_chunks(user_id):
+    ids, folders, files, vectors = [], [], [], []
+    dim = None
+    query_set = Chunk.objects(user_id=user_id).only(
+        "id", "folder_id", "file_id", "embedding", "embedding_bin"
+    )
+    for doc in query_set.as_pymongo():
+        embedding = decode_embedding(doc)
+        if embedding is None:
+            continue
+        if dim is None:
+            dim = len(embedding)
+        if len(embedding) != dim:
+            continue
+        ids.append(str(doc["_id"]))
+        folders.append(doc.get("folder_id") or "")
+        files.append(doc.get("file_id") or "")
+        vectors.append(embedding)
+    if not vectors:
+        return ids, folders, files, np.zeros((0, 0), dtype=np.float32)
+    return ids, folders, files, _normalize_rows(np.asarray(vectors, dtype=np.float32))
+
+
+class UserAnnIndex:
+    """Index IVF-flat của một user: phần base (mmap) + delta (RAM) + tombstones."""
+
+    def __init__(self, user_id, root):
+        self.user_id = str(user_id)
+        self.path = os.path.join(root, self.user_id)
+        self.lock = threading.RLock()
+        self.dim = 0
+        self.centroids = np.zeros((0, 0), dtype=np.float32)
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.chunk_ids = []
+        self.folder_codes = np.zeros(0, dtype=np.int32)
+        self.file_codes = np.zeros(0, dtype=np.int32)
+        self.folder_vocab = {}
+        self.file_vocab = {}
+        self.alive = np.zeros(0, dtype=bool)
+        self.delta_ids = []
+        self.delta_folders = []
+        self.delta_files = []
+        self.delta_vectors = np.zeros((0, 0), dtype=np.float32)
+        self._known_ids = set()
+        # True khi đã bị index build mới thay thế: không được ghi gì vào self.path nữa
+        self.retired = False
+        self._stamp = None
+
+    # ------------------------------------------------------------------
+    # Build / load / persist
+    # ------------------------------------------------------------------
+    @classmethod
+    def build(cls, user_id, root):
+        """Ghi index mới vào thư mục tạm <path>.build, trả về đường dẫn đó (chưa dùng)."""
+        ids, folders, files, matrix = _read_user_chunks(user_id)
+        index = cls(user_id, root)
+        n = len(ids)
+
+        if n:
+            nlist = max(1, min(Config.ANN_MAX_LISTS, int(np.sqrt(n))))
+            if n < Config.ANN_MIN_ROWS_FOR_IVF:
+                nlist = 1
+            if nlist == 1:
+                centroids = _normalize_rows(matrix.mean(axis=0, keepdims=True))
+            else:
+                rng = np.random.default_rng(0)
+                sample_size = min(n, nlist * _TRAIN_POINTS_PER_LIST)
+                sample = matrix[rng.choice(n, sample_size, replace=False)]
+                centroids = _train_centroids(sample, nlist)
+            assign = _assign_lists(matrix, centroids)
+            order = np.argsort(assign, kind="stable")
+            counts = np.bincount(assign, minlength=len(centroids))
+            offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+            np.cumsum(counts, out=offsets[1:])
+        else:
+            centroids = np.zeros((0, 0), dtype=np.float32)
+            order = np.zeros(0, dtype=np.int64)
+            offsets = np.zeros(1, dtype=np.int64)
+
+        folder_vocab, file_vocab = {}, {}
+        folder_codes = np.array(
+            [folder_vocab.setdefault(folders[i], len(folder_vocab)) for i in order],
+            dtype=np.int32,
+        )
+        file_codes = np.array(
+            [file_vocab.setdefault(files[i], len(file_vocab)) for i in order],
+            dtype=np.int32,
+        )
+
+        tmp_path = index.path + ".build"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path, exist_ok=True)
+        np.save(os.path.join(tmp_path, "centroids.npy"), centroids.astype(np.float32))
+        np.save(os.path.join(tmp_path, "vectors.npy"), matrix[order].astype(np.float32))
+        np.save(os.path.join(tmp_path, "offsets.npy"), offsets)
+        np.save(os.path.join(tmp_path, "folders.npy"), folder_codes)
+        np.save(os.path.join(tmp_path, "files.npy"), file_codes)
+        np.save(os.path.join(tmp_path, "alive.npy"), np.ones(n, dtype=bool))
+        with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "n": n,
+                    "dim": int(matrix.shape[1]) if n else 0,
+                    "chunk_ids": [ids[i] for i in order],
+                    "folders": list(folder_vocab.keys()),
+                    "files": list(file_vocab.keys()),
+                    "built_at": time.time(),
+                },
+                f,
+            )
+        return tmp_path
+
+    @classmethod
+    def install(cls, user_id, root, tmp_path):
+        """
+        Thay thư mục index bằng bản build ở tmp_path rồi load. Caller phải retire
+        index cũ trước (AnnIndexManager làm việc này dưới lock của manager).
+        """
+        index = cls(user_id, root)
+        old_path = index.path + ".old"
+        shutil.rmtree(old_path, ignore_errors=True)
+        if os.path.isdir(index.path):
+            os.replace(index.path, old_path)
+        os.replace(tmp_path, index.path)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+        index.load()
+        return index
+
+    def _read_stamp(self):
+        stamp = []
+        for name in _STAMP_FILES:
+            try:
+                stamp.append(os.stat(os.path.join(self.path, name)).st_mtime_ns)
+            except OSError:
+                stamp.append(0)
+        return tuple(stamp)
+
+    def is_stale(self):
+        """Thư mục index đã bị process khác (hoặc 1 lần build) thay đổi sau lần load."""
+        return self._stamp is not None and self._read_stamp() != self._stamp
+
+    def retire(self):
+        with self.lock:
+            self.retired = True
+
+    def load(self):
+        meta_path = os.path.join(self.path, "meta.json")
+        if not os.path.exists(meta_path):
+            return False
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+
+        n = meta["n"]
+        self.dim = meta["dim"]
+        self.chunk_ids = meta["chunk_ids"]
+        self.folder_vocab = {v: i for i, v in enumerate(meta["folders"])}
+        self.file_vocab = {v: i for i, v in enumerate(meta["files"])}
+        self.centroids = np.load(os.path.join(self.path, "centroids.npy"))
+        self.offsets = np.load(os.path.join(self.path, "offsets.npy"))
+        self.folder_codes = np.load(os.path.join(self.path, "folders.npy"))
+        self.file_codes = np.load(os.path.join(self.path, "files.npy"))
+        self.alive = np.load(os.path.join(self.path, "alive.npy"))
+        if n:
+            self.vectors = np.load(os.path.join(self.path, "vectors.npy"), mmap_mode="r")
+        else:
+            self.vectors = np.zeros((0, self.dim), dtype=np.float32)
+
+        if len(self.chunk_ids) != n or len(self.alive) != n or self.vectors.shape[0] != n:
+            raise ValueError(f"ANN index for user {self.user_id} is inconsistent")
+
+        delta_meta_path = os.path.join(self.path, "delta.json")
+        if os.path.exists(delta_meta_path):
+            with open(delta_meta_path, encoding="utf-8") as f:
+                delta_meta = json.load(f)
+            self.delta_ids = delta_meta["ids"]
+            self.delta_folders = delta_meta["folders"]
+            self.delta_files = delta_meta["files"]
+            self.delta_vectors = np.load(os.path.join(self.path, "delta.npy"))
+            if not self.dim and len(self.delta_ids):
+                self.dim = int(self.delta_vectors.shape[1])
+
+        self._known_ids = set(self.chunk_ids) | set(self.delta_ids)
+        self._stamp = self._read_stamp()
+        return True
+
+    def _persist_delta(self):
+        _atomic_save_npy(os.path.join(self.path, "delta.npy"), self.delta_vectors)
+        _atomic_save_json(
+            os.path.join(self.path, "delta.json"),
+            {
+                "ids": self.delta_ids,
+                "folders": self.delta_folders,
+                "files": self.delta_files,
+            },
+        )
+        self._stamp = self._read_stamp()
+
+    # ------------------------------------------------------------------
+    # Incremental updates
+    # ------------------------------------------------------------------
+    def add(self, ids, folders, files, vectors):
+        vectors = _normalize_rows(np.asarray(vectors, dtype=np.float32))
+        with self.lock:
+            if self.retired:
+                return 0
+            if not self.dim and len(vectors):
+                self.dim = int(vectors.shape[1])
+            keep = [
+                i for i, chunk_id in enumerate(ids)
+                if chunk_id not in self._known_ids and vectors.shape[1] == self.dim
+            ]
+            if not keep:
+                return 0
+            new_vectors = vectors[keep]
+            if len(self.delta_ids):
+                self.delta_vectors = np.vstack([self.delta_vectors, new_vectors])
+            else:
+                self.delta_vectors = new_vectors
+            for i in keep:
+                self.delta_ids.append(ids[i])
+                self.delta_folders.append(folders[i] or "")
+                self.delta_files.append(files[i] or "")
+                self._known_ids.add(ids[i])
+            self._persist_delta()
+            return len(keep)
+
+    def remove(self, folder_id=None, file_id=None, chunk_ids=None):
+        """Đánh tombstone trên base và loại bỏ hẳn khỏi delta."""
+        if not (folder_id or file_id or chunk_ids):
+            return
+        wanted = set(chunk_ids or [])
+        with self.lock:
+            if self.retired:
+                return
+            base_mask = self._filter_mask(folder_id, [file_id] if file_id else None)
+            if chunk_ids:
+                base_mask &= np.array([c in wanted for c in self.chunk_ids], dtype=bool)
+            if base_mask.any():
+                self.alive = self.alive & ~base_mask
+                _atomic_save_npy(os.path.join(self.path, "alive.npy"), self.alive)
+                self._stamp = self._read_stamp()
+
+            if self.delta_ids:
+                drop = np.ones(len(self.delta_ids), dtype=bool)
+                if folder_id:
+                    drop &= np.array([f == folder_id for f in self.delta_folders], dtype=bool)
+                if file_id:
+                    drop &= np.array([f == file_id for f in self.delta_files], dtype=bool)
+                if chunk_ids:
+                    drop &= np.array([c in wanted for c in self.delta_ids], dtype=bool)
+                if drop.any():
+                    keep = np.flatnonzero(~drop)
+                    for i in np.flatnonzero(drop):
+                        self._known_ids.discard(self.delta_ids[i])
+                    self.delta_ids = [self.delta_ids[i] for i in keep]
+                    self.delta_folders = [self.delta_folders[i] for i in keep]
+                    self.delta_files = [self.delta_files[i] for i in keep]
+                    self.delta_vectors = self.delta_vectors[keep]
+                    self._persist_delta()
+
+    def needs_rebuild(self):
+        n = len(self.chunk_ids)
+        dead = n - int(self.alive.sum())
+        return (
+            len(self.delta_ids) > max(Config.ANN_MAX_DELTA_ROWS, n // 5)
+            or (n and dead > n * 0.3)
+        )
+
+    # ------------------------------------------------------------------
+    # Query
+    # ------------------------------------------------------------------
+    def _filter_mask(self, folder_id=None, file_ids=None):
+        mask = self.alive.copy()
+        if folder_id:
+            code = self.folder_vocab.get(folder_id)
+            if code is None:
+                return np.zeros_like(mask)
+            mask &= self.folder_codes == code
+        if file_ids:
+            codes = [self.file_vocab[f] for f in file_ids if f in self.file_vocab]
+            if not codes:
+                return np.zeros_like(mask)
+            mask &= np.isin(self.file_codes, codes)
+        return mask
+
+    def _search_base(self, query, top_k, folder_id, file_ids):
+        if not len(self.chunk_ids):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        filtered = bool(folder_id or file_ids)
+        mask = self._filter_mask(folder_id, file_ids) if filtered else self.alive
+
+        # Filter hẹp (vd. 1 cuộc họp): quét chính xác các dòng khớp
+        if filtered:
+            rows = np.flatnonzero(mask)
+            if len(rows) <= Config.ANN_BRUTE_FORCE_ROWS:
+                return rows, np.asarray(self.vectors[rows] @ query)
+
+        order = np.argsort(-(self.centroids @ query))
+        nprobe = min(Config.ANN_NPROBE, len(order))
+        probed, found = 0, 0
+        row_parts, score_parts = [], []
+        while probed < len(order):
+            for list_id in order[probed:probed + nprobe]:
+                start, end = self.offsets[list_id], self.offsets[list_id + 1]
+                if start == end:
+                    continue
+                segment = mask[start:end]
+                if segment.all():
+                    rows = np.arange(start, end)
+                    scores = self.vectors[start:end] @ query
+                else:
+                    rows = np.flatnonzero(segment) + start
+                    if not len(rows):
+                        continue
+                    scores = self.vectors[rows] @ query
+                row_parts.append(rows)
+                score_parts.append(np.asarray(scores))
+                found += len(rows)
+            probed += nprobe
+            # Không đủ ứng viên sau filter: mở rộng số cụm cần dò
+            if found >= top_k:
+                break
+            nprobe *= 2
+
+        if not row_parts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        return np.concatenate(row_parts), np.concatenate(score_parts)
+
+    def search(self, query, top_k, folder_id=None, file_ids=None):
+        """Trả về list (chunk_id, score) giảm dần theo cosine."""
+        with self.lock:
+            if not self.dim or query.shape[0] != self.dim:
+                return []
+            rows, scores = self._search_base(query, top_k, folder_id, file_ids)
+            candidates = [
+                (self.chunk_ids[rows[i]], float(scores[i]))
+                for i in _top_k(scores, top_k)
+            ]
+
+            if self.delta_ids:
+                delta_mask = np.ones(len(self.delta_ids), dtype=bool)
+                if folder_id:
+                    delta_mask &= np.array([f == folder_id for f in self.delta_folders], dtype=bool)
+                if file_ids:
+                    wanted = set(file_ids)
+                    delta_mask &= np.array([f in wanted for f in self.delta_files], dtype=bool)
+                delta_rows = np.flatnonzero(delta_mask)
+                if len(delta_rows):
+                    delta_scores = self.delta_vectors[delta_rows] @ query
+                    for i in _top_k(delta_scores, top_k):
+                        candidates.append(
+                            (self.delta_ids[delta_rows[i]], float(delta_scores[i]))
+                        )
+
+        candidates.sort(key=lambda item: item[1], reverse=True)
+        return candidates[:top_k]
+
+
+class AnnIndexManager:
+    """
+    Quản lý index của các user: LRU các index đã load, build ngầm bằng thread.
+    Trong lúc build, các thao tác add/remove được ghi lại và áp dụng lại
+    lên index mới trước khi đưa vào sử dụng.
+    """
+
+    def __init__(self, root, max_loaded):
+        self.root = root
+        self.max_loaded = max_loaded
+        self._indexes = OrderedDict()
+        self._building = {}
+        self._lock = threading.Lock()
+
+    def _remember(self, user_id, index):
+        self._indexes[user_id] = index
+        self._indexes.move_to_end(user_id)
+        while len(self._indexes) > self.max_loaded:
+            self._indexes.popitem(last=False)
+
+    def _load_locked(self, user_id):
+        """Load index từ đĩa và đăng ký thay bản cũ (gọi khi đang giữ self._lock)."""
+        index = UserAnnIndex(user_id, self.root)
+        try:
+            loaded = index.load()
+        except Exception as e:
+            print(f"[ANN] Failed to load index for {user_id}: {e}")
+            loaded = False
+        old = self._indexes.pop(user_id, None)
+        if old is not None:
+            old.retire()
+        if not loaded:
+            return None
+        self._remember(user_id, index)
+        return index
+
+    def get(self, user_id, build_if_missing=True):
+        """Trả về index đã sẵn sàng, hoặc None (và build ngầm nếu chưa có)."""
+        user_id = str(user_id)
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is not None and not index.is_stale():
+                self._indexes.move_to_end(user_id)
+                return index
+            # Chưa load, hoặc process khác đã sửa/build lại thư mục: đọc lại từ đĩa
+            index = self._load_locked(user_id)
+
+        if index is not None:
+            return index
+
+        if build_if_missing:
+            self.schedule_build(user_id)
+        return None
+
+    def schedule_build(self, user_id):
+        user_id = str(user_id)
+        with self._lock:
+            if user_id in self._building:
+                return
+            self._building[user_id] = []
+
+        def runner():
+            started = time.time()
+            try:
+                tmp_path = UserAnnIndex.build(user_id, self.root)
+                # Đổi thư mục + retire index cũ dưới lock: _apply không thể ghi
+                # alive/delta của bản cũ vào thư mục của bản mới
+                with self._lock:
+                    old = self._indexes.pop(user_id, None)
+                    if old is not None:
+                        old.retire()
+                    index = UserAnnIndex.install(user_id, self.root, tmp_path)
+                    pending = self._building.pop(user_id, [])
+                    for op, kwargs in pending:
+                        getattr(index, op)(**kwargs)
+                    self._remember(user_id, index)
+            except Exception as e:
+                print(f"[ANN] Build failed for {user_id}: {e}")
+                with self._lock:
+                    self._building.pop(user_id, None)
+                return
+
+            print(
+                f"[ANN] Built index for {user_id}: {len(index.chunk_ids)} chunks "
+                f"in {time.time() - started:.2f}s"
+            )
+
+        threading.Thread(target=runner, daemon=True).start()
+
+    def _apply(self, user_id, op, **kwargs):
+        user_id = str(user_id)
+        # Sửa đúng index đang đăng ký, dưới lock của manager: không đan xen với
+        # việc build mới thay thư mục index
+        with self._lock:
+            if user_id in self._building:
+                self._building[user_id].append((op, kwargs))
+            index = self._indexes.get(user_id)
+            if index is None or index.is_stale():
+                index = self._load_locked(user_id)
+            if index is None:
+                # Chưa có index trên đĩa: lần build sau sẽ đọc thẳng từ Mongo
+                return
+            getattr(index, op)(**kwargs)
+            rebuild = index.needs_rebuild()
+        if rebuild:
+            self.schedule_build(user_id)
+
+    def add(self, user_id, ids, folders, files, vectors):
+        if not ids:
+            return
+        self._apply(user_id, "add", ids=ids, folders=folders, files=files, vectors=vectors)
+
+    def remove(self, user_id, folder_id=None, file_id=None, chunk_ids=None):
+        self._apply(
+            user_id, "remove", folder_id=folder_id, file_id=file_id, chunk_ids=chunk_ids
+        )
+
+
+ann_index = AnnIndexManager(Config.ANN_INDEX_DIR, max_loaded=Config.ANN_MAX_LOADED)
+
+
+def search_chunks(user_id, query_vector, top_k, folder_id=None, file_ids=None):
+    """
+    Tìm top_k chunk_id gần nhất với query_vector trong index của user.
+    Trả về None nếu index chưa sẵn sàng (đang build lần đầu) để caller fallback.
+    """
+    index = ann_index.get(user_id)
+    if index is None:
+        return None
+    query = np.asarray(query_vector, dtype=np.float32)
+    norm = np.linalg.norm(query)
+    if norm == 0:
+        return []
+    return index.search(query / norm, top_k, folder_id=folder_id, file_ids=file_ids)
@@ -0,0 +1,211 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+from ..config import Config
+from ..extensions import socketio
+
+# Cảnh báo client khi bỏ audio, tối đa 1 lần / khoảng này (giây)
+DROP_WARNING_INTERVAL = 5.0
+
+_totals = {
+    "received_bytes": 0,
+    "sent_bytes": 0,
+    "dropped_bytes": 0,
+    "dropped_frames": 0,
+    "blocks": 0,
+    "latency_ms_total": 0.0,
+    "latency_ms_max": 0.0,
+}
+_totals_lock = threading.Lock()
+
+
+class AudioBuffer:
+    """
+    Hàng đợi audio có giới hạn của 1 meeting, thay cho asyncio.Queue trong
+    meeting_runtime_service. Chỉ được dùng trên thread của event loop.
+    - put_nowait(frame): frame là memoryview/bytes PCM (không copy); None = kết thúc.
+      Vượt max_bytes thì bỏ frame cũ nhất (drop-oldest) và cảnh báo client.
+    - get(): gom frame thành khối ~block_ms (1 lần join) để gửi 1 message websocket;
+      khối chưa đủ vẫn được trả sau tối đa block_ms. Trả None khi đã kết thúc và hết dữ liệu.
+      Khối được chuyển về pcm_s16le 16 kHz mono (set_converter) rồi qua VAD (set_vad);
+      khối chỉ chứa im lặng không được trả về.
+    """
+
+    def __init__(self, sid, bytes_per_second=None, block_ms=None, max_bytes=None):
+        self.sid = sid
+        self.bytes_per_second = bytes_per_second or Config.AUDIO_SAMPLE_RATE * 2
+        self.block_ms = block_ms or Config.AUDIO_BLOCK_MS
+        self.max_bytes = max_bytes or Config.AUDIO_BUFFER_MAX_BYTES
+        self._frames = deque()  # (memoryview, thời điểm nhận)
+        self._bytes = 0
+        self._closed = False
+        self._event = asyncio.Event()
+        self._last_warning = 0.0
+        self.vad = None
+        self.converter = None
+
+        self.received_bytes = 0
+        self.sent_bytes = 0
+        self.dropped_bytes = 0
+        self.dropped_frames = 0
+        self.blocks = 0
+        self.latency_ms_total = 0.0
+        self.latency_ms_max = 0.0
+
+    @property
+    def block_bytes(self):
+        # Làm tròn xuống bội số 2 byte để không cắt đôi sample s16
+        return max(2, int(self.bytes_per_second * self.block_ms / 1000) // 2 * 2)
+
+    def set_vad(self, vad):
+        """Gắn EnergyVAD: khối im lặng bị bỏ/nén trước khi trả về từ get()."""
+        self.vad = vad
+
+    def set_converter(self, converter, bytes_per_second):
+        """
+        Client gửi định dạng khác pcm_s16le 16 kHz mono: khối được resample
+        (resample_service) trước VAD. Giới hạn đệm giữ nguyên theo số giây audio.
+        """
+        native = Config.AUDIO_SAMPLE_RATE * 2
+        self.converter = converter
+        self.max_bytes = self.max_bytes * bytes_per_second // native
+        self.bytes_per_second = bytes_per_second
+
+    def qsize(self):
+        return len(self._frames)
+
+    def buffered_bytes(self):
+        return self._bytes
+
+    def put_nowait(self, frame):
+        if frame is None:
+            self._closed = True
+            self._event.set()
+            return
+        if self._closed:
+            return
+
+        frame = memoryview(frame)
+        size = frame.nbytes
+        if not size:
+            return
+        self._frames.append((frame, time.monotonic()))
+        self._bytes += size
+        self.received_bytes += size
+
+        dropped = dropped_frames = 0
+        while self._bytes > self.max_bytes and len(self._frames) > 1:
+            old, _ = self._frames.popleft()
+            self._bytes -= old.nbytes
+            dropped += old.nbytes
+            dropped_frames += 1
+        if dropped:
+            self._on_drop(dropped, dropped_frames)
+        self._event.set()
+
+    def _on_drop(self, dropped, dropped_frames):
+        self.dropped_bytes += dropped
+        self.dropped_frames += dropped_frames
+        with _totals_lock:
+            _totals["dropped_bytes"] += dropped
+            _totals["dropped_frames"] += dropped_frames
+        now = time.monotonic()
+        if now - self._last_warning >= DROP_WARNING_INTERVAL:
+            self._last_warning = now
+            socketio.emit(
+                "status",
+                {
+                    "msg": "Audio is arriving faster than it can be transcribed; oldest audio was dropped",
+                    "code": "audio_dropped",
+                    "dropped_bytes": self.dropped_bytes,
+                },
+                room=self.sid,
+            )
+
+    def _take(self):
+        block_bytes = self.block_bytes
+        parts = []
+        size = 0
+        oldest = self._frames[0][1]
+        while self._frames and size < block_bytes:
+            frame, _ = self._frames.popleft()
+            parts.append(frame)
+            size += frame.nbytes
+        self._bytes -= size
+
+        latency_ms = (time.monotonic() - oldest) * 1000
+        self.sent_bytes += size
+        self.blocks += 1
+        self.latency_ms_total += latency_ms
+        self.latency_ms_max = max(self.latency_ms_max, latency_ms)
+        return parts[0].tobytes() if len(parts) == 1 else b"".join(parts)
+
+    def _process(self, block):
+        if self.converter is not None:
+            block = self.converter.process(block)
+        if self.vad is None:
+            return block
+        return b"".join(self.vad.process(block))
+
+    async def get(self):
+        max_wait = self.block_ms / 1000
+        while True:
+            if self._frames and (self._bytes >= self.block_bytes or self._closed):
+                block = self._process(self._take())
+                if block:
+                    return block
+                continue
+            if self._closed:
+                return None
+
+            timeout = None
+            if self._frames:
+                timeout = max_wait - (time.monotonic() - self._frames[0][1])
+                if timeout <= 0:
+                    block = self._process(self._take())
+                    if block:
+                        return block
+                    continue
+
+            self._event.clear()
+            try:
+                await asyncio.wait_for(self._event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def close_stats(self):
+        """Cộng dồn counter của meeting vào tổng toàn process khi worker kết thúc."""
+        if self.vad is not None:
+            self.vad.close_stats()
+        with _totals_lock:
+            _totals["received_bytes"] += self.received_bytes
+            _totals["sent_bytes"] += self.sent_bytes
+            _totals["blocks"] += self.blocks
+            _totals["latency_ms_total"] += self.latency_ms_total
+            _totals["latency_ms_max"] = max(_totals["latency_ms_max"], self.latency_ms_max)
+
+    def stats(self):
+        return {
+            "buffered_bytes": self._bytes,
+            "received_bytes": self.received_bytes,
+            "sent_bytes": self.sent_bytes,
+            "dropped_bytes": self.dropped_bytes,
+            "dropped_frames": self.dropped_frames,
+            "blocks": self.blocks,
+            "latency_ms_avg": round(self.latency_ms_total / self.blocks, 1) if self.blocks else 0.0,
+            "latency_ms_max": round(self.latency_ms_max, 1),
+            "vad": self.vad.stats() if self.vad is not None else None,
+        }
+
+
+def audio_totals():
+    with _totals_lock:
+        totals = dict(_totals)
+    blocks = totals.pop("blocks")
+    latency_total = totals.pop("latency_ms_total")
+    totals["blocks"] = blocks
+    totals["latency_ms_avg"] = round(latency_total / blocks, 1) if blocks else 0.0
+    totals["latency_ms_max"] = round(totals["latency_ms_max"], 1)
+    return totals
@@ -1,28 +1,12 @@
-import math
-from openai import OpenAI
-import os
-from dotenv import load_dotenv
-from ..models.chunk_model import Chunk
+from ..services.llm_gateway_service import llm_gateway
 from ..services.usage_service import check_and_increment_qa
+from ..services.retrieval_service import retrieve_hybrid
+from ..services.query_cache_service import embed_query
 
-load_dotenv()
-
-client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY")
-)
+def get_embedding(text):
+    return embed_query(text)
 
-def cosine_similarity(v1, v2):
-    dot = sum(a * b for a, b in zip(v1, v2))
-    norm1 = math.sqrt(sum(a * a for a in v1))
-    norm2 = math.sqrt(sum(b * b for b in v2))
-    return dot / (norm1 * norm2)
 
-def get_embedding(text):
-    res = client.embeddings.create(
-        model="text-embedding-3-small",
-        input=text
-    )
-    return res.data[0].embedding
 class ChatNotebookController:
     @staticmethod
     def chat_bot_notebook(user_id, folder_id, question, file_ids=None, top_k=5):
@@ -33,35 +17,27 @@ class ChatNotebookController:
         if not allowed:
             return {"error": error or "Q&A limit reached"}, 403
         
-        # Embedding câu hỏi
-        question_embedding = get_embedding(question)
-
-        # Lấy chunk trong folder
-        query = Chunk.objects(
-            user_id=user_id,
-            folder_id=folder_id
+        if not (isinstance(file_ids, list) and len(file_ids) > 0):
+            file_ids = None
+
+        # Top K chunk trong folder (lọc theo file_ids nếu có), hybrid BM25 + vector.
+        # Câu hỏi chỉ được embed (get_embedding) khi BM25 không đủ quyết định.
+        top_chunks = retrieve_hybrid(
+            user_id,
+            question,
+            get_embedding,
+            top_k=top_k,
+            folder_id=folder_id,
+            file_ids=file_ids,
         )
 
-        if isinstance(file_ids, list) and len(file_ids) > 0:
-            query = query.filter(file_id__in=file_ids)
-
-        chunks = query
-        
-        # Tính similarity
-        scored_chunks = []
-        for chunk in chunks:
-            score = cosine_similarity(question_embedding, chunk.embedding)
-            scored_chunks.append((score, chunk.text))
-        
-        # Top K chunk
-        scored_chunks.sort(reverse=True, key=lambda x: x[0])
-        top_chunks = scored_chunks[:top_k]
-
         # Ghép context
-        context = "\n\n".join([text for _, text in top_chunks])
+        context = "\n\n".join([chunk.text for chunk in top_chunks])
 
         # chat với openai
-        completion = client.chat.completions.create(
+        completion = llm_gateway.chat(
+            "notebook_chat",
+            user_id=user_id,
             model="gpt-4.1-mini",
             messages=[
                 {
@@ -1,4 +1,8 @@
-from ..models.chunk_model import Chunk
+from pymongo import UpdateOne
+
+from ..config import Config
+from ..models.chunk_model import Chunk, pack_embedding
+from .chunk_sync_service import on_chunks_inserted
 
 class ChunkController:
     @staticmethod
@@ -11,12 +15,54 @@ class ChunkController:
             file_id=file_id,
             chunk_index=chunk_index,
             text=text,
-            embedding=embedding
+            embedding_bin=pack_embedding(embedding, Config.EMBEDDING_STORAGE_DTYPE)
         )
         chunk.save()
+        on_chunks_inserted([chunk])
         return {"id": str(chunk.id), "chunk_index": chunk.chunk_index}, 201
     @staticmethod
     def get_chunks_by_folder(folder_id):
         chunks = Chunk.objects(folder_id=folder_id)
-        chunk_list = [{"id": str(chunk.id), "chunk_index": chunk.chunk_index, "text": chunk.text, "embedding": chunk.embedding, "created_at": chunk.created_at.isoformat()} for chunk in chunks]
-        return chunk_list, 200
\ No newline at end of file
+        chunk_list = [{"id": str(chunk.id), "chunk_index": chunk.chunk_index, "text": chunk.text, "embedding": chunk.vector().tolist() if (chunk.embedding_bin or chunk.embedding) else [], "created_at": chunk.created_at.isoformat()} for chunk in chunks]
+        return chunk_list, 200
+
+
+def migrate_chunk_embeddings(batch_size=500, dtype=None, keep_list=False, max_batches=None):
+    """
+    Chuyển Chunk.embedding (ListField) sang embedding_bin theo từng batch.
+    Duyệt theo _id tăng dần nên có thể dừng/chạy lại bất cứ lúc nào;
+    trong lúc migrate, các chỗ đọc dùng dual-read (decode_embedding / Chunk.vector).
+    """
+    dtype = dtype or Config.EMBEDDING_STORAGE_DTYPE
+    collection = Chunk._get_collection()
+    query = {"embedding_bin": {"$exists": False}, "embedding.0": {"$exists": True}}
+    last_id = None
+    migrated = 0
+    batches = 0
+
+    while max_batches is None or batches < max_batches:
+        batch_query = dict(query)
+        if last_id is not None:
+            batch_query["_id"] = {"$gt": last_id}
+        docs = list(
+            collection.find(batch_query, {"embedding": 1})
+            .sort("_id", 1)
+            .limit(batch_size)
+        )
+        if not docs:
+            break
+
+        operations = []
+        for doc in docs:
+            update = {"$set": {"embedding_bin": pack_embedding(doc["embedding"], dtype)}}
+            if not keep_list:
+                update["$unset"] = {"embedding": ""}
+            operations.append(UpdateOne({"_id": doc["_id"]}, update))
+
+        collection.bulk_write(operations, ordered=False)
+        migrated += len(operations)
+        batches += 1
+        last_id = docs[-1]["_id"]
+        print(f"[CHUNK] Migrated {migrated} chunk embeddings")
+
+    return migrated
@@ -0,0 +1,52 @@
+from .ann_index_service import ann_index
+from .lexical_index_service import lexical_index
+from .matrix_cache_service import invalidate_scope
+
+
+def on_chunks_inserted(chunks, ids=None):
+    """
+    Gọi sau khi insert Chunk vào Mongo để cập nhật các index trong process.
+    ids: danh sách _id trả về từ Chunk.objects.insert(..., load_bulk=False).
+    """
+    if not chunks:
+        return
+    if ids is None:
+        ids = [chunk.id for chunk in chunks]
+
+    by_user = {}
+    for chunk, chunk_id in zip(chunks, ids):
+        by_user.setdefault(chunk.user_id, []).append((str(chunk_id), chunk))
+
+    for user_id, items in by_user.items():
+        scopes = {(c.folder_id, c.file_id) for _, c in items}
+        for folder_id, file_id in scopes:
+            invalidate_scope(user_id, folder_id=folder_id, file_id=file_id)
+        try:
+            ann_index.add(
+                user_id,
+                ids=[chunk_id for chunk_id, _ in items],
+                folders=[c.folder_id for _, c in items],
+                files=[c.file_id for _, c in items],
+                vectors=[c.vector() for _, c in items],
+            )
+        except Exception as e:
+            print(f"[RAG] Failed to update ANN index for {user_id}: {e}")
+        lexical_index.add(
+            user_id,
+            ids=[chunk_id for chunk_id, _ in items],
+            folders=[c.folder_id for _, c in items],
+            files=[c.file_id for _, c in items],
+            texts=[c.text for _, c in items],
+        )
+
+
+def on_chunks_deleted(user_id, folder_id=None, file_id=None):
+    """Gọi sau khi xoá Chunk theo folder/sid hoặc file."""
+    if not user_id:
+        return
+    invalidate_scope(user_id, folder_id=folder_id, file_id=file_id)
+    try:
+        ann_index.remove(user_id, folder_id=folder_id, file_id=file_id)
+    except Exception as e:
+        print(f"[RAG] Failed to update ANN index for {user_id}: {e}")
+    lexical_index.remove(user_id, folder_id=folder_id, file_id=file_id)
@@ -0,0 +1,122 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+from ..config import Config
+from .embedding_store_service import content_key, embedding_store
+from .llm_gateway_service import llm_gateway
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# Giới hạn của embeddings API: 8191 tokens / input, 2048 inputs / request
+MAX_TOKENS_PER_INPUT = 8000
+MAX_INPUTS_PER_REQUEST = 2048
+
+
+def estimate_tokens(text):
+    """Ước lượng số token (dư) khi không có tokenizer: ~2 ký tự tiếng Việt / token."""
+    return len(text) // 2 + 1
+
+
+def truncate_for_embedding(text):
+    max_chars = MAX_TOKENS_PER_INPUT * 2
+    return text if len(text) <= max_chars else text[:max_chars]
+
+
+def pack_batches(texts, max_tokens=None, max_items=None):
+    """
+    Gom các text (theo thứ tự) thành batch sao cho tổng token và số input
+    không vượt giới hạn. Trả về list các list chỉ số trong texts.
+    """
+    max_tokens = max_tokens or Config.EMBEDDING_BATCH_MAX_TOKENS
+    max_items = min(max_items or Config.EMBEDDING_BATCH_MAX_ITEMS, MAX_INPUTS_PER_REQUEST)
+
+    batches, current, current_tokens = [], [], 0
+    for i, text in enumerate(texts):
+        tokens = min(estimate_tokens(text), MAX_TOKENS_PER_INPUT)
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_items):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def embed_batch(texts, model=EMBEDDING_MODEL, max_retries=None):
+    """Gọi embeddings API cho 1 batch qua llm_gateway (retry backoff + jitter ở gateway)."""
+    max_retries = Config.EMBEDDING_MAX_RETRIES if max_retries is None else max_retries
+    inputs = [truncate_for_embedding(t) for t in texts]
+    response = llm_gateway.embeddings("embeddings", max_retries=max_retries, model=model, input=inputs)
+    data = sorted(response.data, key=lambda item: item.index)
+    return [item.embedding for item in data]
+
+
+def embed_text(text, model=EMBEDDING_MODEL):
+    """Embedding cho 1 text, tra embedding_store trước khi gọi API."""
+    cached = embedding_store.get_many(model, [text])[0]
+    if cached is not None:
+        return np.asarray(cached, dtype=np.float32)
+    vector = embed_batch([text], model)[0]
+    embedding_store.put_many(model, [text], [vector])
+    return np.asarray(vector, dtype=np.float32)
+
+
+def run_embedding_pipeline(texts, on_batch, model=EMBEDDING_MODEL, max_workers=None):
+    """
+    Embed texts theo batch, chạy song song tối đa max_workers batch.
+    on_batch(indexes, embeddings) được gọi trên thread của caller ngay khi
+    từng batch xong (thứ tự hoàn thành, không phải thứ tự batch), để caller
+    insert Chunk dần thay vì chờ toàn bộ.
+    Text đã có trong embedding_store được trả về ngay ở batch đầu tiên;
+    các text trùng nội dung chỉ được embed 1 lần.
+    Nếu 1 batch lỗi sau khi hết retry, các batch chưa chạy bị huỷ và lỗi được raise.
+    Trả về số text đã embed.
+    """
+    if not texts:
+        return 0
+
+    cached = embedding_store.get_many(model, texts)
+    hit_indexes = [i for i, vector in enumerate(cached) if vector is not None]
+    if hit_indexes:
+        on_batch(hit_indexes, [cached[i] for i in hit_indexes])
+    done = len(hit_indexes)
+
+    # Gom text trùng nội dung: mỗi key chỉ gửi 1 lần lên API
+    pending = {}
+    for i, vector in enumerate(cached):
+        if vector is None:
+            pending.setdefault(content_key(model, texts[i]), []).append(i)
+    if not pending:
+        return done
+
+    groups = list(pending.values())
+    unique_texts = [texts[indexes[0]] for indexes in groups]
+    batches = pack_batches(unique_texts)
+    max_workers = max(1, min(max_workers or Config.EMBEDDING_MAX_CONCURRENCY, len(batches)))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(embed_batch, [unique_texts[i] for i in batch], model): batch
+            for batch in batches
+        }
+        try:
+            for future in as_completed(futures):
+                batch = futures[future]
+                embeddings = future.result()
+                embedding_store.put_many(model, [unique_texts[i] for i in batch], embeddings)
+
+                indexes, vectors = [], []
+                for i, embedding in zip(batch, embeddings):
+                    for text_index in groups[i]:
+                        indexes.append(text_index)
+                        vectors.append(embedding)
+                on_batch(indexes, vectors)
+                done += len(indexes)
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
+
+    return done
@@ -0,0 +1,120 @@
+import hashlib
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+from ..config import Config
+from ..models.chunk_model import pack_embedding, unpack_embedding
+from ..models.embedding_cache_model import EmbeddingCache
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """Chuẩn hoá Unicode NFC + gộp khoảng trắng để text giống nhau cho cùng key."""
+    text = unicodedata.normalize("NFC", text or "")
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def content_key(model, text):
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{model}:{digest}"
+
+
+class EmbeddingStore:
+    """
+    Cache embedding theo nội dung: LRU trong process phía trước collection
+    EmbeddingCache trong Mongo. Vector trả về là np.ndarray float32/float16.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.store_hits = 0
+        self.misses = 0
+
+    def _remember(self, key, vector):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def get_many(self, model, texts):
+        """Trả về list song song với texts: vector nếu đã có, None nếu chưa."""
+        keys = [content_key(model, t) for t in texts]
+        results = [None] * len(texts)
+        missing = {}
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._lru.get(key)
+                if vector is not None:
+                    self._lru.move_to_end(key)
+                    results[i] = vector
+                    self.memory_hits += 1
+                else:
+                    missing.setdefault(key, []).append(i)
+
+        if missing:
+            try:
+                docs = EmbeddingCache.objects(key__in=list(missing.keys())).as_pymongo()
+                found = {doc["_id"]: unpack_embedding(doc["vector"]) for doc in docs}
+            except Exception as e:
+                print(f"[EMBED] Embedding store lookup failed: {e}")
+                found = {}
+
+            with self._lock:
+                for key, indexes in missing.items():
+                    vector = found.get(key)
+                    if vector is None:
+                        self.misses += len(indexes)
+                        continue
+                    self.store_hits += len(indexes)
+                    self._remember(key, vector)
+                    for i in indexes:
+                        results[i] = vector
+
+        return results
+
+    def put_many(self, model, texts, vectors):
+        operations = []
+        now = datetime.utcnow()
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = content_key(model, text)
+                blob = pack_embedding(vector)
+                self._remember(key, unpack_embedding(blob))
+                operations.append(
+                    UpdateOne(
+                        {"_id": key},
+                        {"$setOnInsert": {"model": model, "vector": blob, "created_at": now}},
+                        upsert=True,
+                    )
+                )
+        if not operations:
+            return
+        try:
+            EmbeddingCache._get_collection().bulk_write(operations, ordered=False)
+        except Exception as e:
+            print(f"[EMBED] Embedding store write failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.store_hits + self.misses
+            return {
+                "entries": len(self._lru),
+                "max_entries": self.max_entries,
+                "memory_hits": self.memory_hits,
+                "store_hits": self.store_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.store_hits) / lookups if lookups else 0.0,
+            }
+
+
+embedding_store = EmbeddingStore(max_entries=Config.EMBEDDING_STORE_LRU_SIZE)
@@ -2,18 +2,11 @@ from io import BytesIO
 from docx import Document
 from ..models.file_model import File
 from ..models.folder_model import Folder
-from ..models.chunk_model import Chunk
+from ..models.chunk_model import Chunk, pack_embedding
+from ..config import Config
 from ..services.plan_service import get_plan_limits, get_user_plan
-
-from openai import OpenAI
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY")
-)
+from ..services.chunk_sync_service import on_chunks_deleted, on_chunks_inserted
+from ..services.embedding_pipeline_service import embed_text, run_embedding_pipeline
 
 class FileController:
 
@@ -39,11 +32,7 @@ class FileController:
         return chunks
 
     def get_embedding(text: str) -> list[float]:
-        response = client.embeddings.create(
-            model="text-embedding-3-small",
-            input=text
-        )
-        return response.data[0].embedding
+        return embed_text(text).tolist()
 
     @staticmethod
     def upload_file(user_id, folder_id, filename, file_type, size, content):
@@ -76,30 +65,30 @@ class FileController:
         file_id = str(file.id)
 
         # CẮT CONTENT THÀNH CHUNK
-        chunks = FileController.slipt_file_to_chunk(content)
-
-        # LƯU CHUNK VÀO DB
-        chunk_objects = []
-        for c in chunks:
-            # Tạo embedding
-            embedding = FileController.get_embedding(c["text"])
-            chunk = Chunk(
-                user_id=user_id,
-                folder_id=folder_id,
-                file_id=file_id,
-                chunk_index=c["chunk_index"],
-                text=c["text"],
-                embedding=embedding
-            )
-            chunk_objects.append(chunk)
-
-        if chunk_objects:
-            Chunk.objects.insert(chunk_objects)
+        chunks = [c for c in FileController.slipt_file_to_chunk(content) if c["text"]]
+
+        # EMBED THEO BATCH SONG SONG, LƯU CHUNK VÀO DB KHI TỪNG BATCH XONG
+        def insert_batch(indexes, embeddings):
+            chunk_objects = [
+                Chunk(
+                    user_id=user_id,
+                    folder_id=folder_id,
+                    file_id=file_id,
+                    chunk_index=chunks[i]["chunk_index"],
+                    text=chunks[i]["text"],
+                    embedding_bin=pack_embedding(embedding, Config.EMBEDDING_STORAGE_DTYPE)
+                )
+                for i, embedding in zip(indexes, embeddings)
+            ]
+            ids = Chunk.objects.insert(chunk_objects, load_bulk=False)
+            on_chunks_inserted(chunk_objects, ids)
+
+        total_chunks = run_embedding_pipeline([c["text"] for c in chunks], insert_batch)
 
         return {
             "file_id": file_id,
             "filename": filename,
-            "total_chunks": len(chunk_objects)
+            "total_chunks": total_chunks
         }, 201
 
     
@@ -125,6 +114,7 @@ class FileController:
         
          # Xoá tất cả chunk thuộc file này
         deleted_chunks = Chunk.objects(file_id=str(file.id)).delete()
+        on_chunks_deleted(file.user_id, folder_id=file.folder_id, file_id=str(file.id))
 
         # Xoá file
         file.delete()
@@ -0,0 +1,197 @@
+import math
+import re
+import threading
+import unicodedata
+from collections import OrderedDict, namedtuple
+
+from ..config import Config
+from ..models.chunk_model import Chunk
+
+LexicalHit = namedtuple("LexicalHit", ["id", "score", "coverage"])
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_BM25_K1 = 1.2
+_BM25_B = 0.75
+
+
+def fold_diacritics(text):
+    """Bỏ dấu tiếng Việt: "Người họp" -> "nguoi hop", "đ" -> "d"."""
+    text = unicodedata.normalize("NFD", text.lower())
+    text = "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
+    return text.replace("đ", "d")
+
+
+def tokenize(text):
+    """
+    Tách âm tiết (tiếng Việt viết cách nhau bằng khoảng trắng) sau khi bỏ dấu,
+    thêm bigram các âm tiết liền kề để bắt từ ghép ("cuoc_hop") và mã sản phẩm
+    ("sp_2024"). Trả về (unigrams, tất cả terms).
+    """
+    syllables = _TOKEN_RE.findall(fold_diacritics(text or ""))
+    bigrams = [f"{a}_{b}" for a, b in zip(syllables, syllables[1:])]
+    return syllables, syllables + bigrams
+
+
+class UserLexicalIndex:
+    """Inverted index BM25 trong RAM cho chunks của 1 user."""
+
+    def __init__(self, user_id):
+        self.user_id = str(user_id)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.built = False
+        self.chunk_ids = []
+        self.folders = []
+        self.files = []
+        self.lengths = []
+        self.alive = []
+        self.positions = {}
+        self.postings = {}
+        self.live_docs = 0
+        self.dead_docs = 0
+        self.total_length = 0
+
+    def build(self):
+        query_set = Chunk.objects(user_id=self.user_id).only("id", "folder_id", "file_id", "text")
+        for doc in query_set.as_pymongo():
+            self._add_one(str(doc["_id"]), doc.get("folder_id") or "", doc.get("file_id") or "", doc.get("text") or "")
+        self.built = True
+
+    def _add_one(self, chunk_id, folder_id, file_id, text):
+        if chunk_id in self.positions:
+            return
+        _, terms = tokenize(text)
+        doc_index = len(self.chunk_ids)
+        self.positions[chunk_id] = doc_index
+        self.chunk_ids.append(chunk_id)
+        self.folders.append(folder_id)
+        self.files.append(file_id)
+        self.lengths.append(len(terms))
+        self.alive.append(True)
+        self.live_docs += 1
+        self.total_length += len(terms)
+
+        counts = {}
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {})[doc_index] = tf
+
+    def add(self, ids, folders, files, texts):
+        for chunk_id, folder_id, file_id, text in zip(ids, folders, files, texts):
+            self._add_one(chunk_id, folder_id or "", file_id or "", text or "")
+
+    def remove(self, folder_id=None, file_id=None):
+        if not (folder_id or file_id):
+            return
+        for doc_index, chunk_id in enumerate(self.chunk_ids):
+            if not self.alive[doc_index]:
+                continue
+            if folder_id and self.folders[doc_index] != folder_id:
+                continue
+            if file_id and self.files[doc_index] != file_id:
+                continue
+            self.alive[doc_index] = False
+            self.live_docs -= 1
+            self.dead_docs += 1
+            self.total_length -= self.lengths[doc_index]
+            del self.positions[chunk_id]
+
+        # Quá nhiều doc đã xoá trong postings: bỏ index, lần search sau build lại
+        if self.dead_docs > max(1000, self.live_docs):
+            self.reset()
+
+    def search(self, query, top_k, folder_id=None, file_ids=None):
+        unigrams, terms = tokenize(query)
+        if not terms or not self.live_docs:
+            return []
+
+        wanted_files = set(file_ids) if file_ids else None
+        avg_length = self.total_length / self.live_docs
+        scores = {}
+        matched = {}
+        unique_unigrams = set(unigrams)
+
+        for term in set(terms):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            df = sum(1 for doc_index in posting if self.alive[doc_index])
+            if not df:
+                continue
+            idf = math.log(1 + (self.live_docs - df + 0.5) / (df + 0.5))
+            for doc_index, tf in posting.items():
+                if not self.alive[doc_index]:
+                    continue
+                if folder_id and self.folders[doc_index] != folder_id:
+                    continue
+                if wanted_files is not None and self.files[doc_index] not in wanted_files:
+                    continue
+                norm = _BM25_K1 * (1 - _BM25_B + _BM25_B * self.lengths[doc_index] / avg_length)
+                scores[doc_index] = scores.get(doc_index, 0.0) + idf * tf * (_BM25_K1 + 1) / (tf + norm)
+                if term in unique_unigrams:
+                    matched[doc_index] = matched.get(doc_index, 0) + 1
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [
+            LexicalHit(
+                self.chunk_ids[doc_index],
+                score,
+                matched.get(doc_index, 0) / len(unique_unigrams) if unique_unigrams else 0.0,
+            )
+            for doc_index, score in ranked
+        ]
+
+
+class LexicalIndexManager:
+    """
+    Giữ index của tối đa max_users user (LRU). Index được build lười từ Mongo
+    ở lần search đầu tiên; sau đó cập nhật qua chunk_sync_service.
+    """
+
+    def __init__(self, max_users):
+        self.max_users = max_users
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, user_id, create):
+        user_id = str(user_id)
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is None and create:
+                index = UserLexicalIndex(user_id)
+                self._indexes[user_id] = index
+                while len(self._indexes) > self.max_users:
+                    self._indexes.popitem(last=False)
+            if index is not None:
+                self._indexes.move_to_end(user_id)
+            return index
+
+    def search(self, user_id, query, top_k, folder_id=None, file_ids=None):
+        index = self._entry(user_id, create=True)
+        with index.lock:
+            if not index.built:
+                index.build()
+            return index.search(query, top_k, folder_id=folder_id, file_ids=file_ids)
+
+    def add(self, user_id, ids, folders, files, texts):
+        index = self._entry(user_id, create=False)
+        if index is None:
+            return
+        with index.lock:
+            # Chưa build: lần build sau đọc thẳng từ Mongo (đã có chunk mới)
+            if index.built:
+                index.add(ids, folders, files, texts)
+
+    def remove(self, user_id, folder_id=None, file_id=None):
+        index = self._entry(user_id, create=False)
+        if index is None:
+            return
+        with index.lock:
+            if index.built:
+                index.remove(folder_id=folder_id, file_id=file_id)
+
+
+lexical_index = LexicalIndexManager(max_users=Config.LEXICAL_MAX_USERS)
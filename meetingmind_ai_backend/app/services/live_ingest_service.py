@@ -0,0 +1,121 @@
+import threading
+
+from ..config import Config
+from ..models.chunk_model import Chunk, pack_embedding
+from ..models.meeting_model import Meeting
+from .chunk_sync_service import on_chunks_inserted
+from .embedding_pipeline_service import run_embedding_pipeline
+
+MEETING_FILE_ID = "meeting"
+MIN_CHUNK_CHARS = 20
+
+
+class LiveIngestor:
+    """
+    Ingest RAG dần trong lúc họp: gom câu final theo lượt nói, cắt thành
+    cửa sổ ~window_chars ký tự, embed theo micro-batch mỗi lần flush()
+    và append Chunk (folder_id = sid, file_id = "meeting") với chunk_index tăng dần.
+    flush() chạy blocking (OpenAI + Mongo) nên caller phải gọi ngoài event loop.
+    """
+
+    def __init__(self, sid, user_id, window_chars=None):
+        self.sid = sid
+        self.user_id = user_id
+        self.window_chars = window_chars or Config.LIVE_INGEST_WINDOW_CHARS
+        self._lines = []
+        self._lines_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._next_index = None
+        self.ingested = 0
+        self.failed = False
+
+    def add_line(self, speaker, text):
+        text = (text or "").strip()
+        if not text:
+            return
+        with self._lines_lock:
+            self._lines.append((speaker, text))
+
+    def _take_windows(self, final):
+        """Gom lượt nói liên tiếp thành cửa sổ; phần dư quá ngắn giữ lại trừ khi final."""
+        with self._lines_lock:
+            lines, self._lines = self._lines, []
+
+        turns = []
+        for speaker, text in lines:
+            if turns and turns[-1][0] == speaker:
+                turns[-1][1].append(text)
+            else:
+                turns.append((speaker, [text]))
+
+        windows, current = [], []
+        current_len = 0
+        for speaker, sentences in turns:
+            turn_len = len(speaker) + 2 + sum(len(t) + 1 for t in sentences)
+            if current and current_len + turn_len > self.window_chars:
+                windows.append(current)
+                current, current_len = [], 0
+            current.append((speaker, sentences))
+            current_len += turn_len
+        if current:
+            windows.append(current)
+
+        texts = [
+            "\n".join(f"{speaker}: {' '.join(sentences)}" for speaker, sentences in window)
+            for window in windows
+        ]
+        if texts and not final and len(texts[-1]) < MIN_CHUNK_CHARS:
+            # Chưa đủ dài: trả các câu cuối lại hàng đợi để gộp với các câu tới
+            tail = [(speaker, t) for speaker, sentences in windows[-1] for t in sentences]
+            with self._lines_lock:
+                self._lines = tail + self._lines
+            texts.pop()
+        return [t for t in texts if len(t) >= MIN_CHUNK_CHARS]
+
+    def _load_next_index(self):
+        last = (
+            Chunk.objects(folder_id=self.sid, file_id=MEETING_FILE_ID)
+            .order_by("-chunk_index")
+            .only("chunk_index")
+            .first()
+        )
+        return last.chunk_index + 1 if last else 0
+
+    def flush(self, final=False):
+        with self._flush_lock:
+            windows = self._take_windows(final)
+            if windows:
+                if self._next_index is None:
+                    self._next_index = self._load_next_index()
+                # Cấp chunk_index trước khi embed để giữ đúng thứ tự dù batch xong lệch nhau
+                base_index = self._next_index
+                self._next_index += len(windows)
+
+                def insert_batch(indexes, embeddings):
+                    chunks = [
+                        Chunk(
+                            user_id=self.user_id,
+                            folder_id=self.sid,
+                            file_id=MEETING_FILE_ID,
+                            chunk_index=base_index + i,
+                            text=windows[i],
+                            embedding_bin=pack_embedding(embedding, Config.EMBEDDING_STORAGE_DTYPE),
+                        )
+                        for i, embedding in zip(indexes, embeddings)
+                    ]
+                    ids = Chunk.objects.insert(chunks, load_bulk=False)
+                    on_chunks_inserted(chunks, ids)
+
+                try:
+                    self.ingested += run_embedding_pipeline(windows, insert_batch)
+                except Exception as e:
+                    self.failed = True
+                    print(f"[RAG] Live ingest failed for meeting {self.sid}: {e}")
+                    return False
+
+            # Chỉ đánh dấu đã index khi không có cửa sổ nào bị lỗi;
+            # nếu không summarize sẽ ingest lại toàn bộ transcript
+            if final and not self.failed:
+                Meeting.objects(sid=self.sid).update_one(set__rag_indexed=True)
+                print(f"[RAG] Live ingest finished for meeting {self.sid}: {self.ingested} chunks")
+            return True
@@ -0,0 +1,284 @@
+import bisect
+import random
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+import httpx
+from openai import (
+    APIConnectionError,
+    APITimeoutError,
+    DefaultHttpxClient,
+    InternalServerError,
+    OpenAI,
+    RateLimitError,
+)
+
+from ..config import Config
+
+# Lỗi tạm thời của upstream: retry + tính vào circuit breaker
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+
+LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+TOKEN_BUCKETS = (100, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+
+class LLMGatewayError(Exception):
+    pass
+
+
+class LLMBusyError(LLMGatewayError):
+    """Hết slot đồng thời (toàn cục hoặc của user) sau LLM_QUEUE_TIMEOUT_SECONDS."""
+
+
+class LLMUnavailableError(LLMGatewayError):
+    """Circuit breaker đang mở: upstream lỗi liên tục, từ chối ngay thay vì treo thread."""
+
+
+def _histogram(buckets):
+    return [0] * (len(buckets) + 1)
+
+
+class _SiteStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.rejected = 0
+        self.total_tokens = 0
+        self.latency_ms = _histogram(LATENCY_BUCKETS_MS)
+        self.tokens = _histogram(TOKEN_BUCKETS)
+
+    def to_dict(self):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "rejected": self.rejected,
+            "total_tokens": self.total_tokens,
+            "latency_ms": dict(zip([str(b) for b in LATENCY_BUCKETS_MS] + ["inf"], self.latency_ms)),
+            "tokens": dict(zip([str(b) for b in TOKEN_BUCKETS] + ["inf"], self.tokens)),
+        }
+
+
+class CircuitBreaker:
+    """
+    closed -> open sau failure_threshold lỗi upstream liên tiếp; open từ chối mọi lời gọi
+    trong cooldown giây; sau đó half_open cho đúng 1 lời gọi thử: thành công thì
+    closed, lỗi thì open lại.
+    """
+
+    def __init__(self, failure_threshold, cooldown_seconds):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.opened = 0
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.cooldown_seconds:
+                self.state = "half_open"
+                self._probe_in_flight = False
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self.state = "closed"
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.opened += 1
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self._failures,
+                "opened": self.opened,
+            }
+
+
+class LLMGateway:
+    """
+    Điểm gọi OpenAI duy nhất của backend:
+    - 1 client OpenAI trên 1 httpx connection pool dùng chung (keep-alive).
+    - Timeout theo loại thao tác (chat / embeddings / speech).
+    - Semaphore toàn cục + theo user: hết slot trong queue_timeout thì LLMBusyError.
+    - Retry lỗi tạm thời với exponential backoff + jitter (SDK không tự retry).
+    - Circuit breaker khi upstream lỗi hàng loạt: LLMUnavailableError ngay lập tức.
+    - Histogram latency + token theo call site (tham số site của mỗi lời gọi).
+    """
+
+    def __init__(self, api_key, max_concurrency, per_user_concurrency, queue_timeout,
+                 max_retries, timeouts, breaker):
+        self._http = DefaultHttpxClient(
+            limits=httpx.Limits(
+                max_connections=max_concurrency,
+                max_keepalive_connections=max_concurrency,
+            ),
+        )
+        self.client = OpenAI(api_key=api_key, http_client=self._http, max_retries=0)
+        self.max_concurrency = max_concurrency
+        self.per_user_concurrency = per_user_concurrency
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.timeouts = timeouts
+        self.breaker = breaker
+        self._global = threading.BoundedSemaphore(max_concurrency)
+        self._in_flight = 0
+        self._user_slots = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+        self._sites = {}
+
+    def _site(self, site):
+        with self._lock:
+            stats = self._sites.get(site)
+            if stats is None:
+                stats = self._sites[site] = _SiteStats()
+            return stats
+
+    def _count(self, stats, field):
+        with self._lock:
+            setattr(stats, field, getattr(stats, field) + 1)
+
+    def _user_slot(self, user_id):
+        with self._lock:
+            slot = self._user_slots.get(user_id)
+            if slot is None:
+                slot = threading.BoundedSemaphore(self.per_user_concurrency)
+                self._user_slots[user_id] = slot
+            return slot
+
+    @contextmanager
+    def _slots(self, stats, user_id):
+        deadline = time.monotonic() + self.queue_timeout
+        user_slot = self._user_slot(str(user_id)) if user_id else None
+        if user_slot is not None and not user_slot.acquire(timeout=self.queue_timeout):
+            self._count(stats, "rejected")
+            raise LLMBusyError("Too many concurrent AI requests for this user")
+        try:
+            if not self._global.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                self._count(stats, "rejected")
+                raise LLMBusyError("AI service is busy, please retry")
+            try:
+                with self._lock:
+                    self._in_flight += 1
+                yield
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+                self._global.release()
+        finally:
+            if user_slot is not None:
+                user_slot.release()
+
+    def _record(self, stats, started, response):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        usage = getattr(response, "usage", None)
+        total_tokens = getattr(usage, "total_tokens", None) if usage is not None else None
+        with self._lock:
+            stats.calls += 1
+            stats.latency_ms[bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+            if total_tokens:
+                stats.total_tokens += total_tokens
+                stats.tokens[bisect.bisect_left(TOKEN_BUCKETS, total_tokens)] += 1
+
+    def call(self, site, operation, fn, user_id=None, max_retries=None):
+        """fn(client) thực hiện 1 request OpenAI; client đã gắn timeout của operation."""
+        stats = self._site(site)
+        max_retries = self.max_retries if max_retries is None else max_retries
+        client = self.client.with_options(timeout=self.timeouts[operation])
+        attempt = 0
+        while True:
+            # Giữ slot chỉ trong lúc gọi upstream: khi chờ backoff thì trả slot cho request khác
+            with self._slots(stats, user_id):
+                if not self.breaker.allow():
+                    self._count(stats, "rejected")
+                    raise LLMUnavailableError("AI service temporarily unavailable")
+                started = time.perf_counter()
+                try:
+                    response = fn(client)
+                except RETRYABLE_ERRORS as e:
+                    self.breaker.record_failure()
+                    attempt += 1
+                    if attempt > max_retries:
+                        self._count(stats, "errors")
+                        raise
+                    self._count(stats, "retries")
+                    delay = min(30.0, 2 ** (attempt - 1)) * (0.5 + random.random())
+                    print(f"[LLM] {site} {operation} failed ({e}), retry {attempt} in {delay:.1f}s")
+                except Exception:
+                    # Lỗi request (400, 401...) không phải upstream quá tải: không mở breaker
+                    self.breaker.record_success()
+                    self._count(stats, "errors")
+                    raise
+                else:
+                    self.breaker.record_success()
+                    self._record(stats, started, response)
+                    return response
+            time.sleep(delay)
+
+    def chat(self, site, user_id=None, **kwargs):
+        return self.call(site, "chat", lambda c: c.chat.completions.create(**kwargs), user_id)
+
+    def embeddings(self, site, user_id=None, max_retries=None, **kwargs):
+        return self.call(
+            site, "embeddings", lambda c: c.embeddings.create(**kwargs), user_id, max_retries
+        )
+
+    def speech_to_file(self, site, path, user_id=None, **kwargs):
+        def stream(client):
+            with client.audio.speech.with_streaming_response.create(**kwargs) as response:
+                response.stream_to_file(path)
+            return path
+
+        return self.call(site, "speech", stream, user_id)
+
+    def stats(self):
+        with self._lock:
+            sites = {name: s.to_dict() for name, s in self._sites.items()}
+            in_flight = self._in_flight
+        return {
+            "max_concurrency": self.max_concurrency,
+            "per_user_concurrency": self.per_user_concurrency,
+            "in_flight": in_flight,
+            "timeouts": self.timeouts,
+            "circuit_breaker": self.breaker.stats(),
+            "sites": sites,
+        }
+
+
+llm_gateway = LLMGateway(
+    api_key=Config.OPENAI_API_KEY,
+    max_concurrency=Config.LLM_MAX_CONCURRENCY,
+    per_user_concurrency=Config.LLM_PER_USER_CONCURRENCY,
+    queue_timeout=Config.LLM_QUEUE_TIMEOUT_SECONDS,
+    max_retries=Config.LLM_MAX_RETRIES,
+    timeouts={
+        "chat": Config.LLM_TIMEOUT_CHAT_SECONDS,
+        "embeddings": Config.LLM_TIMEOUT_EMBEDDINGS_SECONDS,
+        "speech": Config.LLM_TIMEOUT_SPEECH_SECONDS,
+    },
+    breaker=CircuitBreaker(
+        failure_threshold=Config.LLM_BREAKER_FAILURES,
+        cooldown_seconds=Config.LLM_BREAKER_COOLDOWN_SECONDS,
+    ),
+)
@@ -0,0 +1,176 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from ..config import Config
+from ..models.chunk_model import Chunk, decode_embedding
+
+
+class ScopeMatrix:
+    """
+    Ma trận embedding của một phạm vi (user_id, folder_id/sid, file_ids).
+    - matrix: float32, mỗi dòng đã chuẩn hoá (norm = 1) nên cosine = dot.
+    - ids / texts / file_ids: mảng song song với các dòng của matrix.
+    """
+
+    __slots__ = ("ids", "texts", "file_ids", "matrix", "nbytes")
+
+    def __init__(self, ids, texts, file_ids, matrix):
+        self.ids = ids
+        self.texts = texts
+        self.file_ids = file_ids
+        self.matrix = matrix
+        self.nbytes = matrix.nbytes + sum(len(t) for t in texts) + 64 * len(ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def _scope_file_ids(file_ids):
+    """Chuẩn hoá file_ids (str hoặc list) thành tuple đã sort để làm key cache."""
+    if not file_ids:
+        return None
+    if isinstance(file_ids, str):
+        file_ids = [file_ids]
+    return tuple(sorted({f for f in file_ids if f})) or None
+
+
+def load_scope_matrix(user_id, folder_id=None, file_ids=None, limit=None):
+    """
+    Đọc chunks của một phạm vi từ Mongo và dựng một ma trận liên tục.
+    Lọc file_ids ngay trong query để limit chỉ tính chunk thuộc các file đó.
+    Dùng as_pymongo() để tránh dựng Document cho từng chunk.
+    """
+    file_ids = _scope_file_ids(file_ids)
+    query_set = Chunk.objects(user_id=user_id)
+    if folder_id:
+        query_set = query_set.filter(folder_id=folder_id)
+    if file_ids:
+        query_set = query_set.filter(file_id__in=list(file_ids))
+    query_set = query_set.only("id", "text", "file_id", "embedding", "embedding_bin")
+    if limit:
+        query_set = query_set.limit(limit)
+
+    ids, texts, file_ids, vectors = [], [], [], []
+    for doc in query_set.as_pymongo():
+        embedding = decode_embedding(doc)
+        if embedding is None:
+            continue
+        ids.append(str(doc["_id"]))
+        texts.append(doc.get("text") or "")
+        file_ids.append(doc.get("file_id") or "")
+        vectors.append(embedding)
+
+    if not vectors:
+        matrix = np.zeros((0, 0), dtype=np.float32)
+        return ScopeMatrix(
+            np.array(ids, dtype=object),
+            np.array(texts, dtype=object),
+            np.array(file_ids, dtype=object),
+            matrix,
+        )
+
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1)
+    keep = norms > 0
+    if not keep.all():
+        matrix = matrix[keep]
+        norms = norms[keep]
+        ids = [i for i, k in zip(ids, keep) if k]
+        texts = [t for t, k in zip(texts, keep) if k]
+        file_ids = [f for f, k in zip(file_ids, keep) if k]
+    matrix /= norms[:, None]
+
+    return ScopeMatrix(
+        np.array(ids, dtype=object),
+        np.array(texts, dtype=object),
+        np.array(file_ids, dtype=object),
+        np.ascontiguousarray(matrix),
+    )
+
+
+class ChunkMatrixCache:
+    """
+    LRU cache (giới hạn theo bytes) các ScopeMatrix trong process.
+    Mỗi lần invalidate tăng generation để các lần load đang chạy dở
+    không ghi đè dữ liệu cũ vào cache.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id, folder_id=None, file_ids=None, limit=None):
+        file_ids = _scope_file_ids(file_ids)
+        key = (str(user_id), folder_id or None, file_ids, limit)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+            generation = self._generation
+
+        entry = load_scope_matrix(user_id, folder_id, file_ids, limit)
+
+        with self._lock:
+            if generation == self._generation and entry.nbytes <= self.max_bytes:
+                old = self._entries.pop(key, None)
+                if old is not None:
+                    self._bytes -= old.nbytes
+                self._entries[key] = entry
+                self._bytes += entry.nbytes
+                while self._bytes > self.max_bytes and self._entries:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= evicted.nbytes
+        return entry
+
+    def invalidate(self, user_id, folder_id=None, file_id=None):
+        """
+        Xoá mọi scope của user có thể chứa chunk thuộc (folder_id, file_id).
+        Scope rộng hơn (folder/file = None) luôn bị xoá theo.
+        """
+        user_id = str(user_id)
+        with self._lock:
+            self._generation += 1
+            for key in list(self._entries.keys()):
+                key_user, key_folder, key_files, _ = key
+                if key_user != user_id:
+                    continue
+                if folder_id and key_folder and key_folder != folder_id:
+                    continue
+                if file_id and key_files and file_id not in key_files:
+                    continue
+                self._bytes -= self._entries.pop(key).nbytes
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+matrix_cache = ChunkMatrixCache(max_bytes=Config.MATRIX_CACHE_MAX_MB * 1024 * 1024)
+
+
+def invalidate_scope(user_id, folder_id=None, file_id=None):
+    if not user_id:
+        return
+    matrix_cache.invalidate(user_id, folder_id=folder_id, file_id=file_id)
@@ -0,0 +1,185 @@
+import asyncio
+import threading
+import time
+import zlib
+
+from ..config import Config
+from ..extensions import socketio
+from .audio_pipeline_service import AudioBuffer, audio_totals
+from .vad_service import vad_totals
+
+
+class MeetingTask:
+    """1 worker meeting đang chạy trên 1 shard: task asyncio + hàng đợi audio của nó."""
+
+    def __init__(self, sid, shard):
+        self.sid = sid
+        self.shard = shard
+        self.queue = None  # AudioBuffer, tạo trên thread của loop
+        self.task = None
+        self.started_at = time.time()
+        # Set khi worker đã flush xong và thoát (gọi được từ thread bất kỳ)
+        self.done = threading.Event()
+
+    def depth(self):
+        return self.queue.qsize() if self.queue is not None else 0
+
+
+class _LoopShard:
+    """1 event loop chạy run_forever trên 1 thread daemon."""
+
+    def __init__(self, index):
+        self.index = index
+        self.loop = asyncio.new_event_loop()
+        self.tasks = {}
+        self.thread = threading.Thread(
+            target=self._run, name=f"meeting-loop-{index}", daemon=True
+        )
+        self.thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+
+class MeetingRuntime:
+    """
+    Runtime dùng chung cho mọi cuộc họp live: num_loops event loop cố định
+    (shard theo sid), mỗi sm_worker là 1 task thay vì 1 thread + 1 loop riêng.
+    Audio từ handler Socket.IO (thread khác) được đưa vào AudioBuffer của
+    meeting qua loop.call_soon_threadsafe. Loop được tạo lười ở lần start đầu tiên.
+    """
+
+    def __init__(self, num_loops):
+        self.num_loops = max(1, num_loops)
+        self._shards = None
+        self._lock = threading.Lock()
+        self.started = 0
+        self.crashed = 0
+
+    def _get_shards(self):
+        with self._lock:
+            if self._shards is None:
+                self._shards = [_LoopShard(i) for i in range(self.num_loops)]
+            return self._shards
+
+    def _shard_for(self, sid):
+        shards = self._get_shards()
+        return shards[zlib.crc32(sid.encode("utf-8")) % len(shards)]
+
+    def _find(self, sid):
+        if self._shards is None:
+            return None
+        for shard in self._shards:
+            meeting_task = shard.tasks.get(sid)
+            if meeting_task is not None:
+                return meeting_task
+        return None
+
+    def is_running(self, sid):
+        return self._find(sid) is not None
+
+    def wait_stopped(self, sid, timeout):
+        """Chờ worker của sid thoát hẳn; True nếu không còn worker sau tối đa timeout giây."""
+        meeting_task = self._find(sid)
+        if meeting_task is None:
+            return True
+        return meeting_task.done.wait(timeout)
+
+    def running_sids(self):
+        return [sid for shard in (self._shards or []) for sid in list(shard.tasks)]
+
+    def start(self, sid, worker, on_exit=None, **kwargs):
+        """
+        Chạy worker(sid, audio_queue, **kwargs) như 1 task trên shard của sid.
+        on_exit(sid) được gọi khi worker kết thúc. Trả về False nếu sid đã có worker.
+        """
+        shard = self._shard_for(sid)
+        with self._lock:
+            if sid in shard.tasks:
+                return False
+            meeting_task = MeetingTask(sid, shard)
+            shard.tasks[sid] = meeting_task
+            self.started += 1
+
+        def spawn():
+            meeting_task.queue = AudioBuffer(sid)
+            meeting_task.task = shard.loop.create_task(
+                self._run(meeting_task, worker, kwargs, on_exit)
+            )
+
+        shard.loop.call_soon_threadsafe(spawn)
+        return True
+
+    async def _run(self, meeting_task, worker, kwargs, on_exit=None):
+        sid = meeting_task.sid
+        try:
+            await worker(sid, meeting_task.queue, **kwargs)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            self.crashed += 1
+            socketio.emit(
+                "status",
+                {"msg": f"meeting worker crashed: {e}", "code": "worker_crashed"},
+                room=sid,
+            )
+        finally:
+            meeting_task.queue.close_stats()
+            with self._lock:
+                if meeting_task.shard.tasks.get(sid) is meeting_task:
+                    meeting_task.shard.tasks.pop(sid, None)
+            meeting_task.done.set()
+            if on_exit is not None:
+                on_exit(sid)
+
+    def push_audio(self, sid, chunk):
+        """Gọi từ thread bất kỳ; trả về False nếu meeting không có worker."""
+        meeting_task = self._find(sid)
+        if meeting_task is None:
+            return False
+        meeting_task.shard.loop.call_soon_threadsafe(self._put, meeting_task, chunk)
+        return True
+
+    @staticmethod
+    def _put(meeting_task, chunk):
+        if meeting_task.queue is not None:
+            meeting_task.queue.put_nowait(chunk)
+
+    def stop(self, sid):
+        """Báo worker kết thúc (None vào hàng đợi), worker tự flush và đóng kết nối."""
+        return self.push_audio(sid, None)
+
+    def stats(self):
+        shards = self._shards or []
+        loops = []
+        for shard in shards:
+            tasks = list(shard.tasks.values())
+            loops.append({
+                "index": shard.index,
+                "alive": shard.thread.is_alive(),
+                "active_tasks": len(tasks),
+                "queue_depth": sum(t.depth() for t in tasks),
+            })
+        return {
+            "num_loops": self.num_loops,
+            "started": self.started,
+            "crashed": self.crashed,
+            "active_meetings": sum(l["active_tasks"] for l in loops),
+            "loops": loops,
+            "audio_totals": audio_totals(),
+            "vad_totals": vad_totals(),
+            "meetings": {
+                t.sid: {
+                    "loop": shard.index,
+                    "queue_depth": t.depth(),
+                    "uptime_seconds": round(time.time() - t.started_at, 1),
+                    "audio": t.queue.stats() if t.queue is not None else {},
+                }
+                for shard in shards
+                for t in list(shard.tasks.values())
+            },
+        }
+
+
+meeting_runtime = MeetingRuntime(num_loops=Config.MEETING_RUNTIME_LOOPS)
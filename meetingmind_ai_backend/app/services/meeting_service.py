@@ -1,8 +1,9 @@
 from datetime import datetime
-import re
 from app.models.chunk_model import Chunk
 
 from ..models.meeting_model import Meeting
+from .chunk_sync_service import on_chunks_deleted
+from .transcript_service import delete_segments, normalize_speaker_id, split_speaker_line
 from mongoengine.errors import NotUniqueError
 
 def get_or_create_meeting(sid, user_id, title=None):
@@ -27,21 +28,6 @@ def get_or_create_meeting(sid, user_id, title=None):
         meeting.save()
     return meeting
 
-def append_transcript(sid, text):
-    """
-    Nối thêm câu mới vào full_transcript của cuộc họp.
-    Gọi khi có kết quả chép lời hoàn chỉnh.
-    """
-    meeting = Meeting.objects(sid=sid).first()
-    if meeting:
-        if meeting.speaker_names:
-            text = apply_speaker_names(text, meeting.speaker_names)
-        if meeting.full_transcript:
-            meeting.full_transcript += "\n" + text
-        else:
-            meeting.full_transcript = text
-        meeting.save()
-
 def save_summary(sid, summary_data):
     """
     Lưu kết quả tóm tắt sau khi họp xong.
@@ -56,7 +42,7 @@ def save_summary(sid, summary_data):
         meeting.key_decisions = summary_data.get("key_decisions", [])
         
         # Nếu chưa có transcript (do lỗi gì đó), lấy từ data trả về
-        if not meeting.full_transcript:
+        if not meeting.full_transcript and not meeting.segment_count:
             meeting.full_transcript = summary_data.get("full_transcript")
             
         meeting.save()
@@ -96,33 +82,39 @@ def update_speaker_name(sid, speaker_id, name):
     if meeting.speaker_names is None:
         meeting.speaker_names = {}
 
-    meeting.speaker_names[speaker_id] = name
+    meeting.speaker_names[normalize_speaker_id(speaker_id)] = name
     meeting.save()
     return meeting
 
 
 def apply_speaker_names(transcript, speaker_names):
+    """
+    Render tên người nói lúc trả về: transcript lưu speaker id thô ("Nguoi S1: ..."),
+    mỗi dòng chỉ tra dict speaker_names (key đã chuẩn hoá), không regex/ghi lại DB.
+    """
     if not transcript or not speaker_names:
         return transcript
 
-    updated = transcript
-    for speaker_id, name in speaker_names.items():
-        if not name:
-            continue
-        # Replace both raw speaker_id and prefixed "Người {speaker_id}"
-        candidates = {speaker_id}
-        if not str(speaker_id).startswith("Người "):
-            candidates.add(f"Người {speaker_id}")
-
-        for candidate in candidates:
-            pattern = re.compile(rf"(?m)^{re.escape(candidate)}\s*:")
-            updated = pattern.sub(f"{name}:", updated)
-    return updated
+    names = {
+        normalize_speaker_id(key): name
+        for key, name in speaker_names.items()
+        if name
+    }
+    lines = []
+    for line in transcript.split("\n"):
+        speaker_id, text = split_speaker_line(line)
+        name = names.get(speaker_id) if speaker_id is not None else None
+        lines.append(f"{name}: {text}" if name else line)
+    return "\n".join(lines)
+
+
 def delete_meeting_by_sid(sid):
     meeting = Meeting.objects(sid=sid).first()
     if not meeting:
         return False
 
     meeting.delete()
+    delete_segments(sid)
     Chunk.objects(folder_id=sid).delete()
+    on_chunks_deleted(meeting.user_id, folder_id=sid)
     return True
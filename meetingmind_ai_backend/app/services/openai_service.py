@@ -1,24 +1,23 @@
 import json
-from openai import OpenAI
+import re
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+
 from app.config import Config
+from app.services.embedding_pipeline_service import estimate_tokens
+from app.services.llm_gateway_service import llm_gateway
+from app.services.transcript_service import split_speaker_line
 
-client = OpenAI(api_key=Config.OPENAI_API_KEY)
+SUMMARY_MODEL = "gpt-4o-mini"
+# Tăng khi sửa prompt tóm tắt: summary_cache dùng trong key
+SUMMARY_PROMPT_VERSION = 2
 
-def summarize_transcript(transcript: str):
-    prompt = f"""
-Bạn là trợ lý họp.
 
-Từ transcript sau, hãy trả về JSON gồm:
-- summary
-- action_items (list)
-- key_decisions (list)
-
-Transcript:
-{transcript}
-"""
-
-    res = client.chat.completions.create(
-        model="gpt-4o-mini",
+def _chat_json(prompt, site="summary"):
+    res = llm_gateway.chat(
+        site,
+        model=SUMMARY_MODEL,
         messages=[{"role": "user", "content": prompt}],
         temperature=0.2
     )
@@ -38,3 +37,253 @@ Transcript:
         raise ValueError(f"JSON parse failed: {e} | raw={raw}")
 
     return data
+
+
+def _summarize_single(transcript):
+    prompt = f"""
+Bạn là trợ lý họp.
+
+Từ transcript sau, hãy trả về JSON gồm:
+- summary
+- action_items (list)
+- key_decisions (list)
+
+Transcript:
+{transcript}
+"""
+    return _chat_json(prompt, "summary.single")
+
+
+def split_transcript_windows(transcript, max_tokens):
+    """
+    Cắt transcript thành các cửa sổ <= max_tokens (ước lượng), chỉ cắt ở ranh giới
+    lượt nói (đổi người nói). Lượt nói dài hơn 1 cửa sổ mới bị cắt giữa các dòng.
+    """
+    turns, current, current_speaker = [], [], object()
+    for line in transcript.splitlines():
+        if not line.strip():
+            continue
+        speaker, _ = split_speaker_line(line)
+        if current and speaker != current_speaker:
+            turns.append(current)
+            current = []
+        current.append(line)
+        current_speaker = speaker
+    if current:
+        turns.append(current)
+
+    windows, window, window_tokens = [], [], 0
+    for turn in turns:
+        turn_tokens = sum(estimate_tokens(line) for line in turn)
+        if window and window_tokens + turn_tokens > max_tokens:
+            windows.append("\n".join(window))
+            window, window_tokens = [], 0
+        if turn_tokens <= max_tokens:
+            window.extend(turn)
+            window_tokens += turn_tokens
+            continue
+        for line in turn:
+            line_tokens = estimate_tokens(line)
+            if window and window_tokens + line_tokens > max_tokens:
+                windows.append("\n".join(window))
+                window, window_tokens = [], 0
+            window.append(line)
+            window_tokens += line_tokens
+    if window:
+        windows.append("\n".join(window))
+    return windows
+
+
+def _item_key(item):
+    text = unicodedata.normalize("NFC", str(item)).lower()
+    return re.sub(r"[\W_]+", " ", text).strip()
+
+
+def dedupe_items(items):
+    """Bỏ mục trùng (khác hoa/thường, dấu câu, khoảng trắng), giữ thứ tự xuất hiện đầu."""
+    seen, result = set(), []
+    for item in items:
+        if isinstance(item, dict):
+            item = item.get("title") or item.get("task") or json.dumps(item, ensure_ascii=False)
+        key = _item_key(item)
+        if key and key not in seen:
+            seen.add(key)
+            result.append(str(item).strip())
+    return result
+
+
+def _summarize_window(index, total, window):
+    prompt = f"""
+Bạn là trợ lý họp. Đây là phần {index + 1}/{total} của transcript một cuộc họp dài.
+
+Chỉ dựa vào phần này, hãy trả về JSON gồm:
+- summary (tóm tắt ngắn gọn nội dung phần này)
+- action_items (list)
+- key_decisions (list)
+
+Transcript (phần {index + 1}/{total}):
+{window}
+"""
+    return _chat_json(prompt, "summary.map")
+
+
+def _reduce_partials(partials, action_items, key_decisions):
+    summaries = "\n\n".join(
+        f"Phần {i + 1}: {p.get('summary', '')}" for i, p in enumerate(partials)
+    )
+    prompt = f"""
+Bạn là trợ lý họp. Dưới đây là tóm tắt từng phần (theo thứ tự thời gian) của một cuộc họp,
+cùng danh sách action items và key decisions đã gom từ các phần.
+
+Hãy gộp lại và trả về JSON gồm:
+- summary (tóm tắt toàn cuộc họp)
+- action_items (list, gộp các mục trùng ý)
+- key_decisions (list, gộp các mục trùng ý)
+
+Tóm tắt từng phần:
+{summaries}
+
+Action items:
+{json.dumps(action_items, ensure_ascii=False)}
+
+Key decisions:
+{json.dumps(key_decisions, ensure_ascii=False)}
+"""
+    return _chat_json(prompt, "summary.reduce")
+
+
+def _reduce(partials, max_tokens):
+    """Gộp các tóm tắt phần; nếu quá dài cho 1 lần gọi thì gộp theo từng nhóm trước."""
+    while True:
+        action_items = dedupe_items(i for p in partials for i in p.get("action_items") or [])
+        key_decisions = dedupe_items(d for p in partials for d in p.get("key_decisions") or [])
+        size = sum(estimate_tokens(p.get("summary", "")) for p in partials)
+        size += sum(estimate_tokens(x) for x in action_items + key_decisions)
+        if size <= max_tokens or len(partials) <= 2:
+            data = _reduce_partials(partials, action_items, key_decisions)
+            break
+        groups = [partials[i:i + 4] for i in range(0, len(partials), 4)]
+        partials = [
+            _reduce_partials(
+                group,
+                dedupe_items(i for p in group for i in p.get("action_items") or []),
+                dedupe_items(d for p in group for d in p.get("key_decisions") or []),
+            )
+            for group in groups
+        ]
+
+    data["action_items"] = dedupe_items(data.get("action_items") or [])
+    data["key_decisions"] = dedupe_items(data.get("key_decisions") or [])
+    return data
+
+
+def summarize_transcript(transcript: str):
+    """
+    Tóm tắt transcript -> {summary, action_items, key_decisions} (định dạng save_summary).
+    Transcript ngắn: 1 lần gọi. Transcript dài: map-reduce — tóm tắt song song từng
+    cửa sổ lượt nói rồi gộp. Thời gian từng bước được ghi vào data["timings"].
+    """
+    started = time.perf_counter()
+    if estimate_tokens(transcript) <= Config.SUMMARY_SINGLE_CALL_MAX_TOKENS:
+        data = _summarize_single(transcript)
+        data["timings"] = {"mode": "single", "total_seconds": round(time.perf_counter() - started, 2)}
+        return data
+
+    windows = split_transcript_windows(transcript, Config.SUMMARY_WINDOW_TOKENS)
+    split_done = time.perf_counter()
+
+    workers = max(1, min(Config.SUMMARY_MAP_CONCURRENCY, len(windows)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        partials = list(pool.map(
+            lambda args: _summarize_window(args[0], len(windows), args[1]),
+            enumerate(windows),
+        ))
+    map_done = time.perf_counter()
+
+    data = _reduce(partials, Config.SUMMARY_WINDOW_TOKENS)
+    reduce_done = time.perf_counter()
+
+    data["timings"] = {
+        "mode": "map_reduce",
+        "windows": len(windows),
+        "split_seconds": round(split_done - started, 3),
+        "map_seconds": round(map_done - split_done, 2),
+        "reduce_seconds": round(reduce_done - map_done, 2),
+        "total_seconds": round(reduce_done - started, 2),
+    }
+    print(f"[SUMMARY] map-reduce {data['timings']}")
+    return data
+
+
+def _summary_state_json(state):
+    state = state or {}
+    return json.dumps(
+        {
+            "summary": state.get("summary", ""),
+            "action_items": state.get("action_items") or [],
+            "key_decisions": state.get("key_decisions") or [],
+        },
+        ensure_ascii=False,
+    )
+
+
+def fold_summary(state, new_lines):
+    """
+    Tóm tắt cuốn chiếu: gộp các dòng transcript mới vào trạng thái tóm tắt trước đó
+    (không đọc lại toàn bộ transcript). Trả về trạng thái mới cùng định dạng.
+    """
+    prompt = f"""
+Bạn là trợ lý họp, đang tóm tắt một cuộc họp diễn ra trực tiếp.
+
+Trạng thái tóm tắt hiện tại (JSON, có thể rỗng nếu mới bắt đầu):
+{_summary_state_json(state)}
+
+Đoạn transcript mới:
+{chr(10).join(new_lines)}
+
+Hãy cập nhật trạng thái với nội dung mới và trả về JSON đầy đủ gồm:
+- summary (tóm tắt toàn bộ cuộc họp đến thời điểm này)
+- action_items (list, giữ các mục cũ còn đúng, thêm mục mới, gộp mục trùng ý)
+- key_decisions (list, giữ các mục cũ còn đúng, thêm mục mới, gộp mục trùng ý)
+"""
+    data = _chat_json(prompt, "summary.rolling")
+    data["action_items"] = dedupe_items(data.get("action_items") or [])
+    data["key_decisions"] = dedupe_items(data.get("key_decisions") or [])
+    return data
+
+
+def finalize_rolling_summary(state, tail_lines=None, speaker_names=None):
+    """
+    Bước reduce cuối cho meeting đã có tóm tắt cuốn chiếu: gộp nốt các dòng chưa
+    được fold (nếu có) rồi viết lại bản cuối, thay nhãn người nói bằng tên hiển thị.
+    """
+    started = time.perf_counter()
+    for window in split_transcript_windows("\n".join(tail_lines or []), Config.SUMMARY_WINDOW_TOKENS):
+        state = fold_summary(state, window.splitlines())
+    fold_done = time.perf_counter()
+
+    names = "\n".join(f"- Nguoi {k} = {v}" for k, v in (speaker_names or {}).items())
+    prompt = f"""
+Bạn là trợ lý họp. Cuộc họp đã kết thúc, đây là bản tóm tắt được cập nhật trong lúc họp (JSON):
+{_summary_state_json(state)}
+
+Tên người nói (thay nhãn "Nguoi ..." bằng tên nếu có):
+{names or "(không có)"}
+
+Hãy hoàn thiện và trả về JSON gồm:
+- summary
+- action_items (list)
+- key_decisions (list)
+"""
+    data = _chat_json(prompt, "summary.finalize")
+    data["action_items"] = dedupe_items(data.get("action_items") or [])
+    data["key_decisions"] = dedupe_items(data.get("key_decisions") or [])
+    done = time.perf_counter()
+    data["timings"] = {
+        "mode": "rolling",
+        "tail_lines": len(tail_lines or []),
+        "fold_seconds": round(fold_done - started, 2),
+        "reduce_seconds": round(done - fold_done, 2),
+        "total_seconds": round(done - started, 2),
+    }
+    return data
@@ -0,0 +1,97 @@
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+from ..config import Config
+from .embedding_pipeline_service import EMBEDDING_MODEL, embed_batch, embed_text
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_EDGE_PUNCTUATION = " \t\n\r.,;:!?…\"'“”‘’()[]"
+
+
+def normalize_question(text):
+    """
+    Chuẩn hoá câu hỏi để các biến thể như "Tóm tắt cuộc họp?" và
+    "tóm tắt cuộc họp" dùng chung 1 embedding: NFC, chữ thường,
+    gộp khoảng trắng, bỏ dấu câu ở hai đầu.
+    """
+    text = unicodedata.normalize("NFC", text or "").lower()
+    return _WHITESPACE_RE.sub(" ", text).strip(_EDGE_PUNCTUATION)
+
+
+class QueryEmbeddingCache:
+    """LRU có TTL cho embedding của câu hỏi chat, trong process."""
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, vector = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, key, vector):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+query_cache = QueryEmbeddingCache(
+    max_entries=Config.QUERY_CACHE_SIZE,
+    ttl_seconds=Config.QUERY_CACHE_TTL_SECONDS,
+)
+
+
+def embed_query(text, model=EMBEDDING_MODEL):
+    """
+    Embedding cho câu hỏi chat: query_cache (LRU + TTL) trước, sau đó
+    embedding_store (tầng lưu bền, bật bằng QUERY_CACHE_PERSIST) rồi mới tới API.
+    """
+    key = f"{model}:{normalize_question(text)}"
+    vector = query_cache.get(key)
+    if vector is not None:
+        return vector
+
+    if Config.QUERY_CACHE_PERSIST:
+        vector = embed_text(text, model)
+    else:
+        vector = np.asarray(embed_batch([text], model)[0], dtype=np.float32)
+    query_cache.put(key, vector)
+    return vector
@@ -1,10 +1,10 @@
-import numpy as np
-from openai import OpenAI
 from ..config import Config
-from ..models.chunk_model import Chunk
-
-# Khởi tạo client OpenAI
-client = OpenAI(api_key=Config.OPENAI_API_KEY)
+from ..models.chunk_model import Chunk, pack_embedding
+from ..models.meeting_model import Meeting
+from .chunk_sync_service import on_chunks_deleted, on_chunks_inserted
+from .embedding_pipeline_service import run_embedding_pipeline
+from .query_cache_service import embed_query
+from .retrieval_service import retrieve_hybrid
 
 def ingest_meeting_transcript(sid, user_id, full_transcript):
     """
@@ -24,33 +24,33 @@ def ingest_meeting_transcript(sid, user_id, full_transcript):
     if not text_chunks:
         return
 
-    try:
-        # 2. Lấy Embedding (Batch request để tối ưu)
-        response = client.embeddings.create(
-            model="text-embedding-3-small",
-            input=text_chunks
-        )
-        
-        embeddings = [item.embedding for item in response.data]
+    # Bỏ các chunk live ingest dở dang (lỗi giữa chừng) trước khi ingest lại toàn bộ
+    Chunk.objects(folder_id=sid, file_id='meeting').delete()
+    on_chunks_deleted(user_id, folder_id=sid, file_id='meeting')
 
-        # 3. Lưu vào DB
+    try:
+        # 2 + 3. Embed theo batch (giới hạn token, song song) và lưu từng batch vào DB
         # Lưu ý: Ở đây ta dùng folder_id để lưu sid của cuộc họp.
         # file_id ta set là 'meeting_transcript' để phân biệt với file notebook.
-        chunks_to_create = []
-        for i, text in enumerate(text_chunks):
-            chunk = Chunk(
-                user_id=user_id,
-                folder_id=sid,        # Gom nhóm theo cuộc họp
-                file_id='meeting',    # Đánh dấu nguồn là meeting
-                chunk_index=i,
-                text=text,
-                embedding=embeddings[i]
-            )
-            chunks_to_create.append(chunk)
-        
-        # Bulk insert
-        Chunk.objects.insert(chunks_to_create)
-        print(f"[RAG] Ingested {len(chunks_to_create)} chunks for meeting {sid}")
+        def insert_batch(indexes, embeddings):
+            chunks_to_create = [
+                Chunk(
+                    user_id=user_id,
+                    folder_id=sid,        # Gom nhóm theo cuộc họp
+                    file_id='meeting',    # Đánh dấu nguồn là meeting
+                    chunk_index=i,
+                    text=text_chunks[i],
+                    embedding_bin=pack_embedding(embedding, Config.EMBEDDING_STORAGE_DTYPE)
+                )
+                for i, embedding in zip(indexes, embeddings)
+            ]
+            # Bulk insert
+            ids = Chunk.objects.insert(chunks_to_create, load_bulk=False)
+            on_chunks_inserted(chunks_to_create, ids)
+
+        total = run_embedding_pipeline(text_chunks, insert_batch)
+        Meeting.objects(sid=sid).update_one(set__rag_indexed=True)
+        print(f"[RAG] Ingested {total} chunks for meeting {sid}")
 
     except Exception as e:
         print(f"[RAG] Error ingesting meeting: {e}")
@@ -59,51 +59,22 @@ def retrieve_relevant_chunks(user_id, query, top_k=3, folder_id=None, file_id=No
     """
     Tìm các đoạn văn bản (chunks) liên quan nhất đến câu hỏi của user.
     Hiện tại search trên toàn bộ chunks của user (gồm cả meeting và notebook).
+    Hybrid BM25 + vector (retrieval_service); câu hỏi chỉ được embed khi
+    BM25 không đủ quyết định.
     """
-    # 1. Embed câu hỏi
-    try:
-        query_response = client.embeddings.create(
-            model="text-embedding-3-small",
-            input=[query]
-        )
-        query_vector = query_response.data[0].embedding
-    except Exception as e:
-        print(f"[RAG] Error embedding query: {e}")
-        return []
-
-    # 2. Lấy tất cả chunks của user (nếu data ít)
-    # Nếu data nhiều, bạn nên dùng Vector Database như Pinecone/Qdrant thay vì tính toán tay
-    query_set = Chunk.objects(user_id=user_id)
-    if folder_id:
-        query_set = query_set.filter(folder_id=folder_id)
-    if file_id:
-        query_set = query_set.filter(file_id=file_id)
+    def embed(question):
+        try:
+            return embed_query(question)
+        except Exception as e:
+            print(f"[RAG] Error embedding query: {e}")
+            return None
 
-    all_chunks = query_set.limit(max_candidates)
-    
-    scored_chunks = []
-    
-    for chunk in all_chunks:
-        if not chunk.embedding:
-            continue
-        
-        # Tính Cosine Similarity
-        vec_a = np.array(query_vector)
-        vec_b = np.array(chunk.embedding)
-        
-        dot_product = np.dot(vec_a, vec_b)
-        norm_a = np.linalg.norm(vec_a)
-        norm_b = np.linalg.norm(vec_b)
-        
-        if norm_a == 0 or norm_b == 0: continue
-            
-        cosine_sim = dot_product / (norm_a * norm_b)
-        
-        scored_chunks.append({
-            "chunk": chunk,
-            "score": cosine_sim
-        })
-    
-    # 3. Sắp xếp theo điểm số giảm dần và lấy top K
-    sorted_chunks = sorted(scored_chunks, key=lambda x: x['score'], reverse=True)
-    return [item['chunk'] for item in sorted_chunks[:top_k]]
\ No newline at end of file
+    return retrieve_hybrid(
+        user_id,
+        query,
+        embed,
+        top_k=top_k,
+        folder_id=folder_id,
+        file_ids=[file_id] if file_id else None,
+        max_candidates=max_candidates,
+    )
@@ -0,0 +1,185 @@
+import time
+from math import gcd
+
+import numpy as np
+
+# Định dạng Speechmatics nhận (StartRecognition trong sm_worker)
+TARGET_RATE = 16000
+
+SUPPORTED_RATES = (16000, 44100, 48000)
+SUPPORTED_CHANNELS = (1, 2)
+SAMPLE_DTYPES = {"pcm_s16le": np.dtype("<i2"), "pcm_f32le": np.dtype("<f4")}
+
+# Số zero-crossing mỗi bên của sinc; càng lớn càng dốc (và càng tốn CPU)
+_ZERO_CROSSINGS = 16
+_KAISER_BETA = 8.0
+
+
+def parse_audio_format(raw):
+    """
+    Chuẩn hoá audio_format client khai báo trong start_streaming.
+    Trả về (format, None) hoặc (None, lỗi). Không khai báo = pcm_s16le 16 kHz mono.
+    """
+    if not raw:
+        return {"sample_rate": TARGET_RATE, "channels": 1, "encoding": "pcm_s16le"}, None
+    if not isinstance(raw, dict):
+        return None, "audio_format must be an object"
+    try:
+        sample_rate = int(raw.get("sample_rate") or TARGET_RATE)
+        channels = int(raw.get("channels") or 1)
+    except (TypeError, ValueError):
+        return None, "Invalid sample_rate/channels"
+    encoding = raw.get("encoding") or "pcm_s16le"
+    if sample_rate not in SUPPORTED_RATES:
+        return None, f"Unsupported sample_rate {sample_rate}"
+    if channels not in SUPPORTED_CHANNELS:
+        return None, f"Unsupported channels {channels}"
+    if encoding not in SAMPLE_DTYPES:
+        return None, f"Unsupported encoding {encoding}"
+    return {"sample_rate": sample_rate, "channels": channels, "encoding": encoding}, None
+
+
+def bytes_per_second(audio_format):
+    dtype = SAMPLE_DTYPES[audio_format["encoding"]]
+    return audio_format["sample_rate"] * audio_format["channels"] * dtype.itemsize
+
+
+def design_polyphase_filter(up, down, zero_crossings=_ZERO_CROSSINGS, beta=_KAISER_BETA):
+    """
+    FIR low-pass (windowed sinc, Kaiser) cho resample up/down, tách thành ma trận
+    polyphase shape (up, taps_per_phase): hàng p là các hệ số h[p + k*up].
+    """
+    factor = max(up, down)
+    half = zero_crossings * factor
+    n = np.arange(-half, half + 1, dtype=np.float64)
+    h = np.sinc(n / factor) * np.kaiser(2 * half + 1, beta)
+    h *= up / h.sum()
+
+    taps_per_phase = -(-len(h) // up)
+    padded = np.zeros(taps_per_phase * up)
+    padded[:len(h)] = h
+    return padded.reshape(taps_per_phase, up).T.astype(np.float32), half
+
+
+class PolyphaseResampler:
+    """
+    Chuyển audio client (44.1/48 kHz, mono/stereo, s16/f32) về pcm_s16le 16 kHz mono.
+    Giữ trạng thái giữa các khối: byte lẻ chưa đủ 1 frame mẫu, lịch sử taps mẫu
+    cuối và pha thời gian của mẫu output kế tiếp, nên ghép các khối không bị "click".
+    """
+
+    def __init__(self, sample_rate, channels=1, encoding="pcm_s16le", out_rate=TARGET_RATE):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.dtype = SAMPLE_DTYPES[encoding]
+        self.frame_bytes = self.dtype.itemsize * channels
+        g = gcd(sample_rate, out_rate)
+        self.up = out_rate // g
+        self.down = sample_rate // g
+        self.passthrough = self.up == self.down
+
+        self._remainder = b""
+        if not self.passthrough:
+            self.phases, _ = design_polyphase_filter(self.up, self.down)
+            self.taps = self.phases.shape[1]
+            self._history = np.zeros(self.taps - 1, dtype=np.float32)
+            # Thời điểm (đơn vị mẫu đã up-sample) của output kế tiếp, tính từ đầu _history
+            self._next_t = (self.taps - 1) * self.up
+
+    def _decode(self, block):
+        data = self._remainder + bytes(block)
+        usable = len(data) // self.frame_bytes * self.frame_bytes
+        self._remainder = data[usable:]
+        samples = np.frombuffer(data, dtype=self.dtype, count=usable // self.dtype.itemsize)
+        if self.dtype.kind == "i":
+            samples = samples.astype(np.float32) / 32768.0
+        else:
+            samples = samples.astype(np.float32, copy=False)
+        if self.channels > 1:
+            samples = samples.reshape(-1, self.channels).mean(axis=1)
+        return samples
+
+    def _resample(self, x):
+        signal = np.concatenate((self._history, x))
+        last_t = (len(signal) - 1) * self.up
+        if self._next_t > last_t:
+            count = 0
+        else:
+            count = (last_t - self._next_t) // self.down + 1
+
+        if count:
+            t = self._next_t + np.arange(count, dtype=np.int64) * self.down
+            base = t // self.up
+            phase = t % self.up
+            # windows[i] = signal[base_i - taps + 1 : base_i + 1], đảo ngược để khớp h[p + k*up] * x[base - k]
+            windows = np.lib.stride_tricks.sliding_window_view(signal, self.taps)
+            windows = windows[base - (self.taps - 1), ::-1]
+            out = np.einsum("nk,nk->n", self.phases[phase], windows)
+            self._next_t += count * self.down
+        else:
+            out = np.zeros(0, dtype=np.float32)
+
+        # Giữ taps mẫu cuối: output kế tiếp có thể rơi giữa 2 mẫu cuối cùng
+        consumed = max(0, len(signal) - self.taps)
+        self._history = signal[consumed:].copy()
+        self._next_t -= consumed * self.up
+        return out
+
+    def process(self, block):
+        if self.passthrough and self.channels == 1 and self.dtype == SAMPLE_DTYPES["pcm_s16le"]:
+            return bytes(block)
+        samples = self._decode(block)
+        if not self.passthrough:
+            samples = self._resample(samples)
+        pcm = np.clip(samples * 32768.0, -32768, 32767).astype("<i2")
+        return pcm.tobytes()
+
+
+def make_converter(audio_format):
+    """None nếu client đã gửi đúng định dạng Speechmatics (không cần chuyển)."""
+    if (
+        audio_format["sample_rate"] == TARGET_RATE
+        and audio_format["channels"] == 1
+        and audio_format["encoding"] == "pcm_s16le"
+    ):
+        return None
+    return PolyphaseResampler(
+        audio_format["sample_rate"],
+        channels=audio_format["channels"],
+        encoding=audio_format["encoding"],
+    )
+
+
+def benchmark_resampler(sample_rate=48000, channels=2, encoding="pcm_f32le", seconds=60, block_ms=160):
+    """
+    Đo throughput 1 luồng trên 1 core: resample `seconds` giây audio (tín hiệu giả)
+    theo khối block_ms. realtime_streams_per_core = số giây audio / giây CPU.
+    """
+    dtype = SAMPLE_DTYPES[encoding]
+    rng = np.random.default_rng(0)
+    total = sample_rate * seconds
+    signal = (0.1 * rng.standard_normal(total * channels)).astype(np.float32)
+    if dtype.kind == "i":
+        signal = (signal * 32767).astype(dtype)
+    else:
+        signal = signal.astype(dtype)
+    raw = signal.tobytes()
+
+    resampler = PolyphaseResampler(sample_rate, channels=channels, encoding=encoding)
+    block_bytes = int(sample_rate * block_ms / 1000) * channels * dtype.itemsize
+    out_bytes = 0
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for start in range(0, len(raw), block_bytes):
+        out_bytes += len(resampler.process(raw[start:start + block_bytes]))
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+
+    return {
+        "input_format": f"{encoding} {sample_rate} Hz x{channels}",
+        "audio_seconds": seconds,
+        "output_seconds": round(out_bytes / (TARGET_RATE * 2), 2),
+        "cpu_seconds": round(cpu, 3),
+        "wall_seconds": round(wall, 3),
+        "realtime_streams_per_core": int(seconds / cpu) if cpu else None,
+    }
@@ -0,0 +1,163 @@
+from collections import namedtuple
+
+import numpy as np
+
+from ..config import Config
+from ..models.chunk_model import Chunk
+from .ann_index_service import search_chunks
+from .lexical_index_service import lexical_index
+from .matrix_cache_service import matrix_cache
+
+RetrievedChunk = namedtuple("RetrievedChunk", ["id", "text", "score"])
+
+
+def top_k_indices(scores, k):
+    """Chỉ số top k theo điểm giảm dần: argpartition rồi chỉ sort k phần tử."""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def normalize_query(query_vector):
+    query = np.asarray(query_vector, dtype=np.float32)
+    norm = np.linalg.norm(query)
+    if norm == 0:
+        return None
+    return query / norm
+
+
+def _load_texts(hits):
+    """Lấy text cho danh sách (chunk_id, score) từ ANN index, giữ nguyên thứ tự."""
+    if not hits:
+        return []
+    docs = Chunk.objects(id__in=[chunk_id for chunk_id, _ in hits]).only("id", "text").as_pymongo()
+    texts = {str(doc["_id"]): doc.get("text") or "" for doc in docs}
+    return [
+        RetrievedChunk(chunk_id, texts[chunk_id], score)
+        for chunk_id, score in hits
+        if chunk_id in texts
+    ]
+
+
+def _search_scope(user_id, query, top_k, folder_id, file_ids, min_score, max_candidates):
+    """Chấm điểm cả scope bằng 1 phép nhân ma trận-vector trên ma trận cache."""
+    # file_ids nằm trong key scope: lọc ở Mongo trước khi áp limit max_candidates
+    scope = matrix_cache.get(user_id, folder_id, file_ids=file_ids, limit=max_candidates)
+    if not len(scope) or query.shape[0] != scope.matrix.shape[1]:
+        return []
+
+    scores = scope.matrix @ query
+    rows = np.flatnonzero(scores >= min_score)
+    if not len(rows):
+        return []
+
+    scores = scores[rows]
+    return [
+        RetrievedChunk(scope.ids[rows[i]], scope.texts[rows[i]], float(scores[i]))
+        for i in top_k_indices(scores, top_k)
+    ]
+
+
+def retrieve(user_id, query_vector, top_k=5, folder_id=None, file_ids=None,
+             min_score=None, max_candidates=None):
+    """
+    Engine retrieval dùng chung cho chat meeting (rag_service) và chat notebook.
+    1. ANN index của user (ann_index_service), lọc theo folder_id/sid + file_ids.
+    2. Nếu index chưa sẵn sàng: ma trận cache theo scope (matrix_cache_service),
+       (user, folder_id, file_ids), giới hạn max_candidates chunks (None = toàn bộ scope).
+    Kết quả có điểm < min_score (mặc định Config.RETRIEVAL_MIN_SCORE) bị loại.
+    """
+    if top_k is None or top_k <= 0 or query_vector is None:
+        return []
+    query = normalize_query(query_vector)
+    if query is None:
+        return []
+    if min_score is None:
+        min_score = Config.RETRIEVAL_MIN_SCORE
+    file_ids = [f for f in (file_ids or []) if f] or None
+
+    try:
+        hits = search_chunks(user_id, query, top_k, folder_id=folder_id, file_ids=file_ids)
+    except Exception as e:
+        print(f"[RAG] ANN search failed, falling back to scan: {e}")
+        hits = None
+    if hits is not None:
+        return _load_texts([(chunk_id, score) for chunk_id, score in hits if score >= min_score])
+
+    return _search_scope(user_id, query, top_k, folder_id, file_ids, min_score, max_candidates)
+
+
+def reciprocal_rank_fusion(rankings, k=None):
+    """RRF: score(d) = sum 1 / (k + rank). rankings là các list id đã xếp hạng."""
+    k = Config.HYBRID_RRF_K if k is None else k
+    fused = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+def _is_decisive(lexical_hits):
+    if not lexical_hits or lexical_hits[0].coverage < 1.0:
+        return False
+    runner_up = lexical_hits[1].score if len(lexical_hits) > 1 else 0.0
+    return lexical_hits[0].score >= Config.HYBRID_DECISIVE_RATIO * runner_up
+
+
+def retrieve_hybrid(user_id, question, embed_fn, top_k=5, folder_id=None, file_ids=None,
+                    max_candidates=None):
+    """
+    Hybrid BM25 (lexical_index_service) + vector (retrieve) hợp nhất bằng RRF.
+    Khi BM25 đã quyết định rõ (top-1 khớp mọi âm tiết và vượt trội top-2),
+    trả về luôn kết quả lexical, không gọi embed_fn(question).
+    Hit BM25 khớp < HYBRID_MIN_LEXICAL_COVERAGE âm tiết bị loại ở cả 2 nhánh, để
+    kết quả chỉ gồm chunk qua ngưỡng vector (RETRIEVAL_MIN_SCORE) hoặc khớp đủ từ khoá.
+    """
+    if top_k is None or top_k <= 0:
+        return []
+    file_ids = [f for f in (file_ids or []) if f] or None
+    candidates = max(top_k, Config.HYBRID_CANDIDATES)
+
+    try:
+        lexical_hits = lexical_index.search(
+            user_id, question, candidates, folder_id=folder_id, file_ids=file_ids
+        )
+    except Exception as e:
+        print(f"[RAG] Lexical search failed: {e}")
+        lexical_hits = []
+
+    decisive = _is_decisive(lexical_hits)
+    lexical_hits = [
+        hit for hit in lexical_hits if hit.coverage >= Config.HYBRID_MIN_LEXICAL_COVERAGE
+    ]
+    if decisive:
+        return _load_texts([(hit.id, hit.score) for hit in lexical_hits[:top_k]])
+
+    query_vector = embed_fn(question)
+    vector_hits = retrieve(
+        user_id,
+        query_vector,
+        top_k=candidates,
+        folder_id=folder_id,
+        file_ids=file_ids,
+        max_candidates=max_candidates,
+    )
+    if not lexical_hits:
+        return vector_hits[:top_k]
+
+    fused = reciprocal_rank_fusion([
+        [hit.id for hit in vector_hits],
+        [hit.id for hit in lexical_hits],
+    ])[:top_k]
+
+    known = {hit.id: hit.text for hit in vector_hits}
+    missing = [(chunk_id, score) for chunk_id, score in fused if chunk_id not in known]
+    for hit in _load_texts(missing):
+        known[hit.id] = hit.text
+    return [
+        RetrievedChunk(chunk_id, known[chunk_id], score)
+        for chunk_id, score in fused
+        if chunk_id in known
+    ]
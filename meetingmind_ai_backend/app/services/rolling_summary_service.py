@@ -0,0 +1,98 @@
+import threading
+
+from ..config import Config
+from ..extensions import socketio
+from ..models.meeting_model import Meeting
+from .openai_service import fold_summary
+from .transcript_service import format_segment_line, get_segments
+
+
+class RollingSummarizer:
+    """
+    Tóm tắt cuốn chiếu trong lúc họp (plan có in_meeting_ai).
+    add_line chạy trên event loop của sm_worker; cứ đủ every_segments câu mới thì
+    update() (trên thread pool) gộp các câu đó vào trạng thái tóm tắt trước,
+    lưu Meeting.live_summary và emit "summary_update" tới room của meeting.
+    live_summary_seq = số segment đầu tiên đã được gộp (theo thứ tự seq).
+    Worker mới cho meeting đã có tóm tắt (resume, restart) tiếp tục từ
+    live_summary/live_summary_seq; các segment cũ chưa gộp được gộp ở lần update đầu.
+    """
+
+    def __init__(self, sid, every_segments=None):
+        self.sid = sid
+        self.every = every_segments or Config.ROLLING_SUMMARY_EVERY_SEGMENTS
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        # Chỉ 1 lần update chạy tại 1 thời điểm; câu mới dồn lại cho lần sau
+        self._update_lock = threading.Lock()
+        self.state = None
+        self.covered = 0
+        self.updates = 0
+        self.failed = 0
+        # Segment [covered, _backlog_until) đã lưu trước worker này nhưng chưa được gộp
+        self._backlog_until = 0
+        meeting = (
+            Meeting.objects(sid=sid)
+            .only("live_summary", "live_summary_seq", "segment_count")
+            .first()
+        )
+        if meeting is not None:
+            self.state = meeting.live_summary or None
+            self.covered = meeting.live_summary_seq or 0
+            self._backlog_until = meeting.segment_count or 0
+
+    def _take_backlog(self):
+        if self._backlog_until <= self.covered:
+            return []
+        lines = [
+            format_segment_line(s.get("speaker_id"), s.get("text", ""))
+            for s in get_segments(self.sid, after_seq=self.covered - 1)
+            if s["seq"] < self._backlog_until
+        ]
+        self._backlog_until = 0
+        return lines
+
+    def add_line(self, speaker, text):
+        """Trả về True khi đã đủ câu mới và không có update nào đang chạy."""
+        with self._pending_lock:
+            self._pending.append(format_segment_line(speaker, text))
+            ready = len(self._pending) >= self.every
+        return ready and not self._update_lock.locked()
+
+    def update(self, final=False):
+        # Lần cuối (kết thúc họp) chờ update đang chạy xong rồi gộp nốt
+        if not self._update_lock.acquire(blocking=final):
+            return
+        try:
+            backlog = self._take_backlog()
+            with self._pending_lock:
+                lines, self._pending = backlog + self._pending, []
+            if not lines:
+                return
+            try:
+                state = fold_summary(self.state, lines)
+            except Exception as e:
+                self.failed += 1
+                print(f"[SUMMARY] Rolling update failed for {self.sid}: {e}")
+                with self._pending_lock:
+                    self._pending = lines + self._pending
+                return
+
+            self.state = {
+                "summary": state.get("summary", ""),
+                "action_items": state.get("action_items", []),
+                "key_decisions": state.get("key_decisions", []),
+            }
+            self.covered += len(lines)
+            self.updates += 1
+            Meeting.objects(sid=self.sid).update_one(
+                set__live_summary=self.state,
+                set__live_summary_seq=self.covered,
+            )
+            socketio.emit(
+                "summary_update",
+                dict(self.state, covered_segments=self.covered, is_final=final),
+                room=self.sid,
+            )
+        finally:
+            self._update_lock.release()
@@ -0,0 +1,295 @@
+import hmac
+import secrets
+import threading
+import time
+
+from ..config import Config
+from ..extensions import socketio
+from .meeting_runtime_service import meeting_runtime
+
+# Báo trước khi hết thời lượng họp theo plan (giây)
+DURATION_WARNING_SECONDS = 60
+
+
+class LiveSession:
+    """
+    Trạng thái 1 cuộc họp đang stream: chủ sở hữu, plan và các mốc thời gian.
+    sid là id cuộc họp (socket sid lúc start_streaming, cũng là Meeting.sid và room emit);
+    socket_sid là socket đang gắn với cuộc họp, đổi khi client resume sau khi rớt mạng.
+    """
+
+    def __init__(self, sid, user_id, plan, max_duration_minutes=None):
+        now = time.time()
+        self.sid = sid
+        self.socket_sid = sid
+        self.resume_token = secrets.token_urlsafe(24)
+        self.detached_at = None
+        self.resumes = 0
+        self.user_id = user_id
+        self.plan = plan
+        self.started_at = now
+        self.last_audio_at = now
+        self.audio_bytes = 0
+        self.max_duration = max_duration_minutes * 60 if max_duration_minutes else None
+        self.ending_reason = None
+        self.warned = False
+
+    def to_dict(self, now=None):
+        now = now or time.time()
+        return {
+            "sid": self.sid,
+            "user_id": self.user_id,
+            "plan": self.plan,
+            "started_at": self.started_at,
+            "duration_seconds": round(now - self.started_at, 1),
+            "idle_seconds": round(now - self.last_audio_at, 1),
+            "audio_bytes": self.audio_bytes,
+            "max_duration_seconds": self.max_duration,
+            "ending_reason": self.ending_reason,
+            "socket_sid": self.socket_sid,
+            "detached_seconds": round(now - self.detached_at, 1) if self.detached_at else None,
+            "resumes": self.resumes,
+            "worker_running": meeting_runtime.is_running(self.sid),
+        }
+
+
+class SessionRegistry:
+    """
+    Nguồn sự thật cho các cuộc họp live trong process:
+    - Sở hữu worker (meeting_runtime) của từng sid, tạo/kết thúc qua start()/end().
+    - Socket rớt (disconnect) chỉ tách phiên khỏi socket; trong resume_grace giây client
+      gửi lại meeting_id + resume_token để gắn socket mới vào worker đang chạy.
+    - Là nơi duy nhất nhận connect/disconnect của Socket.IO (sockets/lifecycle_socket)
+      và gọi lần lượt mọi handler đã đăng ký (notification, meeting...).
+    - Reaper chạy nền: kết thúc phiên không nhận audio quá idle_timeout, phiên vượt
+      meeting_duration_minutes của plan, và dọn worker mồ côi không có phiên.
+    """
+
+    def __init__(self, idle_timeout, reap_interval, resume_grace):
+        self.idle_timeout = idle_timeout
+        self.reap_interval = reap_interval
+        self.resume_grace = resume_grace
+        self._sessions = {}
+        # socket sid -> sid cuộc họp
+        self._by_socket = {}
+        self._lock = threading.Lock()
+        self._connect_handlers = []
+        self._disconnect_handlers = []
+        self._reaper = None
+        self.reaped = {"idle": 0, "duration_limit": 0, "orphan": 0, "resume_timeout": 0}
+        self.resumed = 0
+
+    # --- connect / disconnect ---
+
+    def register_connect(self, handler):
+        self._connect_handlers.append(handler)
+        return handler
+
+    def register_disconnect(self, handler):
+        self._disconnect_handlers.append(handler)
+        return handler
+
+    def _dispatch(self, handlers, sid):
+        for handler in handlers:
+            try:
+                handler(sid)
+            except Exception as e:
+                print(f"[SESSION] {handler.__name__} failed for {sid}: {e}")
+
+    def dispatch_connect(self, sid):
+        self._dispatch(self._connect_handlers, sid)
+
+    def dispatch_disconnect(self, sid):
+        self._dispatch(self._disconnect_handlers, sid)
+
+    # --- vòng đời phiên ---
+
+    def start(self, sid, user_id, plan, limits, worker, **worker_kwargs):
+        """Đăng ký phiên và chạy worker; None nếu sid đang có phiên."""
+        session = LiveSession(sid, user_id, plan, limits.get("meeting_duration_minutes"))
+        with self._lock:
+            if sid in self._sessions or sid in self._by_socket:
+                return None
+            self._sessions[sid] = session
+            self._by_socket[sid] = sid
+        if not meeting_runtime.start(sid, worker, on_exit=self._on_worker_exit, **worker_kwargs):
+            with self._lock:
+                self._sessions.pop(sid, None)
+                self._by_socket.pop(sid, None)
+            return None
+        self._ensure_reaper()
+        return session
+
+    def get(self, sid):
+        return self._sessions.get(sid)
+
+    def resolve(self, socket_sid):
+        """Phiên đang gắn với socket (hoặc đúng sid cuộc họp), None nếu không có."""
+        meeting_sid = self._by_socket.get(socket_sid)
+        if meeting_sid is None:
+            return self._sessions.get(socket_sid)
+        return self._sessions.get(meeting_sid)
+
+    def touch(self, socket_sid, nbytes=0):
+        """Ghi nhận audio từ socket; trả về sid cuộc họp để đẩy audio, None nếu không có phiên."""
+        session = self.resolve(socket_sid)
+        if session is None or session.detached_at is not None:
+            return None
+        session.last_audio_at = time.time()
+        session.audio_bytes += nbytes
+        return session.sid
+
+    def detach(self, socket_sid):
+        """Socket rớt: giữ worker chạy chờ resume, hoặc kết thúc ngay nếu tắt resume."""
+        with self._lock:
+            meeting_sid = self._by_socket.pop(socket_sid, None)
+            session = self._sessions.get(meeting_sid) if meeting_sid else None
+            # Socket cũ báo disconnect sau khi client đã resume bằng socket mới: bỏ qua
+            if session is None or session.socket_sid != socket_sid:
+                return
+            if self.resume_grace > 0 and session.ending_reason is None:
+                session.detached_at = time.time()
+                return
+        self.end(meeting_sid, "disconnect")
+
+    def resume(self, socket_sid, meeting_id, resume_token, user_id):
+        """
+        Gắn socket mới vào phiên đang chạy. Trả về (session, None) hoặc (None, lỗi).
+        Socket cũ (nếu còn) bị tách, emit của worker đi theo room meeting_id.
+        """
+        with self._lock:
+            session = self._sessions.get(meeting_id)
+            if (
+                session is None
+                or session.ending_reason is not None
+                or not resume_token
+                or not hmac.compare_digest(str(resume_token), session.resume_token)
+            ):
+                return None, "Meeting not found or no longer resumable"
+            if str(session.user_id) != str(user_id):
+                return None, "Unauthorized"
+            self._by_socket.pop(session.socket_sid, None)
+            self._by_socket[socket_sid] = meeting_id
+            session.socket_sid = socket_sid
+            session.detached_at = None
+            session.last_audio_at = time.time()
+            session.resumes += 1
+            self.resumed += 1
+        return session, None
+
+    def end(self, sid, reason="ended"):
+        """Yêu cầu worker kết thúc; phiên bị xoá khi worker flush xong và thoát."""
+        session = self.resolve(sid)
+        if session is None:
+            return meeting_runtime.stop(sid)
+        if session.ending_reason is None:
+            session.ending_reason = reason
+        return meeting_runtime.stop(session.sid)
+
+    def _on_worker_exit(self, sid):
+        with self._lock:
+            session = self._sessions.pop(sid, None)
+            if session is not None:
+                self._by_socket.pop(session.socket_sid, None)
+
+    # --- reaper ---
+
+    def _ensure_reaper(self):
+        with self._lock:
+            if self._reaper is not None and self._reaper.is_alive():
+                return
+            self._reaper = threading.Thread(target=self._reap_forever, name="session-reaper", daemon=True)
+            self._reaper.start()
+
+    def _reap_forever(self):
+        while True:
+            time.sleep(self.reap_interval)
+            try:
+                self.reap()
+            except Exception as e:
+                print(f"[SESSION] Reaper error: {e}")
+
+    def reap(self, now=None):
+        now = now or time.time()
+        with self._lock:
+            sessions = list(self._sessions.values())
+
+        for session in sessions:
+            if session.ending_reason is not None:
+                continue
+            elapsed = now - session.started_at
+            if session.max_duration and elapsed >= session.max_duration:
+                self.reaped["duration_limit"] += 1
+                socketio.emit(
+                    "status",
+                    {
+                        "msg": "Meeting duration limit reached for current plan",
+                        "code": "meeting_duration_limit",
+                        "plan": session.plan,
+                        "limit_minutes": int(session.max_duration // 60),
+                    },
+                    room=session.sid,
+                )
+                self.end(session.sid, "duration_limit")
+            elif session.detached_at is not None:
+                # Không ai nhận emit nữa: chỉ chờ resume đến hết grace
+                if now - session.detached_at >= self.resume_grace:
+                    self.reaped["resume_timeout"] += 1
+                    self.end(session.sid, "resume_timeout")
+            elif now - session.last_audio_at >= self.idle_timeout:
+                self.reaped["idle"] += 1
+                socketio.emit(
+                    "status",
+                    {"msg": "No audio received, meeting stopped", "code": "session_idle_timeout"},
+                    room=session.sid,
+                )
+                self.end(session.sid, "idle")
+            elif (
+                session.max_duration
+                and not session.warned
+                and session.max_duration - elapsed <= DURATION_WARNING_SECONDS
+            ):
+                session.warned = True
+                socketio.emit(
+                    "status",
+                    {
+                        "msg": "Meeting will stop soon (plan duration limit)",
+                        "code": "meeting_duration_warning",
+                        "seconds_left": int(session.max_duration - elapsed),
+                    },
+                    room=session.sid,
+                )
+
+        # Worker còn chạy nhưng không còn phiên (ví dụ sót từ lỗi trước đó): dừng hẳn
+        with self._lock:
+            known = set(self._sessions)
+        for sid in meeting_runtime.running_sids():
+            if sid not in known:
+                self.reaped["orphan"] += 1
+                meeting_runtime.stop(sid)
+
+    def snapshot(self):
+        now = time.time()
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return [session.to_dict(now) for session in sessions]
+
+    def stats(self):
+        with self._lock:
+            active = len(self._sessions)
+            detached = sum(1 for s in self._sessions.values() if s.detached_at is not None)
+        return {
+            "active_sessions": active,
+            "detached_sessions": detached,
+            "idle_timeout_seconds": self.idle_timeout,
+            "resume_grace_seconds": self.resume_grace,
+            "resumed": self.resumed,
+            "reaped": dict(self.reaped),
+        }
+
+
+session_registry = SessionRegistry(
+    idle_timeout=Config.SESSION_IDLE_TIMEOUT_SECONDS,
+    reap_interval=Config.SESSION_REAPER_INTERVAL_SECONDS,
+    resume_grace=Config.SESSION_RESUME_GRACE_SECONDS,
+)
@@ -1,118 +1,329 @@
 import asyncio
 import json
+import random
+from collections import deque
+
 import websockets
-from websockets.exceptions import ConnectionClosedError, ConnectionClosedOK
+from websockets.exceptions import ConnectionClosed, ConnectionClosedError, InvalidStatusCode
 
 from app.config import Config
 from app.extensions import socketio
-from app.services.meeting_service import append_transcript
+from app.services.live_ingest_service import LiveIngestor
+from app.services.rolling_summary_service import RollingSummarizer
+from app.services.resample_service import bytes_per_second, make_converter
+from app.services.transcript_emit_service import TranscriptEmitter
+from app.services.transcript_service import TranscriptBuffer, materialize_transcript
+from app.services.vad_service import VAD_OFF, EnergyVAD
+
+# Audio gửi Speechmatics luôn là pcm_s16le 16 kHz mono (đã resample/VAD ở AudioBuffer)
+SM_SAMPLE_RATE = 16000
+SM_BYTES_PER_SECOND = SM_SAMPLE_RATE * 2
+
+# Lỗi không nên reconnect: hết quota / sai API key
+_FATAL_CLOSE_CODES = {4001, 4005}
+
+
+def _start_recognition_message():
+    return json.dumps(
+        {
+            "message": "StartRecognition",
+            "audio_format": {
+                "type": "raw",
+                "encoding": "pcm_s16le",
+                "sample_rate": SM_SAMPLE_RATE,
+            },
+            "transcription_config": {
+                "language": "vi",
+                "enable_partials": True,
+                "max_delay": 3,
+                "diarization": "speaker",
+            },
+        }
+    )
+
+
+def _is_quota_exceeded(error):
+    if not isinstance(error, ConnectionClosedError):
+        return False
+    reason = (getattr(error, "reason", "") or "").lower()
+    return getattr(error, "code", None) == 4005 or "quota_exceeded" in reason
+
+
+def _is_fatal(error):
+    if isinstance(error, ConnectionClosedError):
+        return _is_quota_exceeded(error) or getattr(error, "code", None) in _FATAL_CLOSE_CODES
+    if isinstance(error, InvalidStatusCode):
+        return error.status_code in (401, 403)
+    return False
+
+
+class AudioReplayBuffer:
+    """
+    Ring buffer N giây audio đã gửi gần nhất, mỗi phần tử kèm mốc thời gian
+    (giây, tính trên toàn phiên). Khi reconnect, phát lại từ phần tử cũ nhất
+    để Speechmatics nhận dạng lại đoạn chưa kịp trả final.
+    """
+
+    def __init__(self, seconds):
+        self.max_bytes = int(seconds * SM_BYTES_PER_SECOND)
+        self._blocks = deque()
+        self._bytes = 0
+        self.total_bytes = 0
+
+    @property
+    def total_seconds(self):
+        return self.total_bytes / SM_BYTES_PER_SECOND
 
+    def append(self, block):
+        self._blocks.append((self.total_seconds, block))
+        self._bytes += len(block)
+        self.total_bytes += len(block)
+        while self._bytes - len(self._blocks[0][1]) >= self.max_bytes:
+            _, old = self._blocks.popleft()
+            self._bytes -= len(old)
 
-async def sm_worker(sid, audio_queue):
+    def replay_start(self):
+        """Mốc thời gian phiên của byte đầu tiên sẽ được phát lại."""
+        return self._blocks[0][0] if self._blocks else self.total_seconds
+
+    def blocks(self):
+        return [block for _, block in self._blocks]
+
+
+def _join_results(results):
+    """Dựng lại text từ các word/punctuation result của AddTranscript."""
+    text = ""
+    for result in results:
+        alternatives = result.get("alternatives") or [{}]
+        content = alternatives[0].get("content", "")
+        if not content:
+            continue
+        if result.get("type") == "punctuation" or not text:
+            text += content
+        else:
+            text += " " + content
+    return text.strip()
+
+
+async def sm_worker(sid, audio_queue, user_id=None, vad_mode=None, audio_format=None, rolling_summary=False,
+                    batch_finals=False):
     headers = {"Authorization": f"Bearer {Config.SPEECHMATICS_API_KEY}"}
     final_buffer = ""
+    sentence_start = None
+    loop = asyncio.get_running_loop()
+    ingestor = LiveIngestor(sid, user_id) if user_id else None
+    transcript_buffer = TranscriptBuffer(sid)
+    emitter = TranscriptEmitter(sid, loop, batch_finals=batch_finals)
+    summarizer = RollingSummarizer(sid) if rolling_summary else None
+    converter = make_converter(audio_format) if audio_format else None
+    if converter is not None:
+        audio_queue.set_converter(converter, bytes_per_second(audio_format))
+    if vad_mode and vad_mode != VAD_OFF:
+        audio_queue.set_vad(EnergyVAD(mode=vad_mode, sample_rate=SM_SAMPLE_RATE))
 
-    try:
+    replay = AudioReplayBuffer(Config.SM_REPLAY_SECONDS)
+    # Thời điểm (giây, theo phiên) kết thúc của word final cuối cùng đã nhận:
+    # sau reconnect, mọi final kết thúc trước mốc này là trùng do phát lại audio
+    last_final_end = -1.0
+    # Độ lệch thời gian của kết nối hiện tại so với đầu phiên
+    conn_offset = 0.0
+    ended = False
+    established = False
+
+    def schedule_flush():
+        # Không await: ghi Mongo trên thread pool, receive loop đọc tiếp ngay
+        loop.run_in_executor(None, transcript_buffer.flush)
+
+    async def flush_loop():
+        while True:
+            await asyncio.sleep(transcript_buffer.max_delay)
+            if transcript_buffer.due():
+                schedule_flush()
+
+    async def ingest_loop():
+        # Embed + lưu chunk định kỳ trên thread pool, không chặn nhận audio
+        while True:
+            await asyncio.sleep(Config.LIVE_INGEST_INTERVAL_SECONDS)
+            await loop.run_in_executor(None, ingestor.flush)
+
+    def handle_final(msg):
+        nonlocal final_buffer, sentence_start, last_final_end
+        results = msg.get("results", [])
+
+        # Bỏ các word đã nhận trước khi rớt kết nối (audio phát lại trùng)
+        fresh = [
+            r for r in results
+            if (r.get("end_time") or 0) + conn_offset > last_final_end
+        ]
+        if not fresh:
+            return
+        if len(fresh) == len(results):
+            text = msg.get("metadata", {}).get("transcript", "").strip()
+        else:
+            text = _join_results(fresh)
+        last_final_end = max(
+            last_final_end,
+            max((r.get("end_time") or 0) for r in fresh) + conn_offset,
+        )
+
+        speaker = "Unknown"
+        if fresh[0].get("alternatives"):
+            speaker = fresh[0]["alternatives"][0].get("speaker", "Unknown")
+
+        if text:
+            if not final_buffer:
+                sentence_start = (fresh[0].get("start_time") or 0) + conn_offset
+            final_buffer += (" " if final_buffer else "") + text
+
+        for result in fresh:
+            if result.get("type") == "punctuation" and result.get("is_eos"):
+                sentence = final_buffer.strip()
+                final_buffer = ""
+                if sentence:
+                    emitter.final(f"Nguoi {speaker}", sentence)
+                    if transcript_buffer.add(
+                        speaker,
+                        sentence,
+                        start_time=sentence_start,
+                        end_time=(result.get("end_time") or 0) + conn_offset,
+                    ):
+                        schedule_flush()
+                    if ingestor:
+                        ingestor.add_line(f"Nguoi {speaker}", sentence)
+                    if summarizer and summarizer.add_line(speaker, sentence):
+                        loop.run_in_executor(None, summarizer.update)
+
+    async def receive_loop(ws):
+        async for raw in ws:
+            msg = json.loads(raw)
+            msg_type = msg.get("message")
+
+            if msg_type == "AddPartialTranscript":
+                text = msg.get("metadata", {}).get("transcript", "").strip()
+                end_time = msg.get("metadata", {}).get("end_time") or 0
+                if text and end_time + conn_offset > last_final_end:
+                    emitter.partial(text)
+
+            elif msg_type == "AddTranscript":
+                handle_final(msg)
+
+    async def send_loop(ws):
+        nonlocal ended
+        while True:
+            chunk = await audio_queue.get()
+            if chunk is None:
+                ended = True
+                await ws.close()
+                return
+            # Ghi vào ring buffer trước khi gửi: gửi lỗi thì vẫn được phát lại
+            replay.append(chunk)
+            await ws.send(chunk)
+
+    async def run_connection():
+        nonlocal conn_offset, established
         async with websockets.connect(Config.SM_URL, extra_headers=headers) as ws:
-            await ws.send(
-                json.dumps(
-                    {
-                        "message": "StartRecognition",
-                        "audio_format": {
-                            "type": "raw",
-                            "encoding": "pcm_s16le",
-                            "sample_rate": 16000,
-                        },
-                        "transcription_config": {
-                            "language": "vi",
-                            "enable_partials": True,
-                            "max_delay": 3,
-                            "diarization": "speaker",
-                        },
-                    }
-                )
+            await ws.send(_start_recognition_message())
+
+            # Phát lại audio gần nhất; timestamp của kết nối mới tính từ đầu đoạn phát lại
+            conn_offset = replay.replay_start()
+            for block in replay.blocks():
+                await ws.send(block)
+            established = True
+
+            recv_task = asyncio.create_task(receive_loop(ws))
+            send_task = asyncio.create_task(send_loop(ws))
+            done, _ = await asyncio.wait(
+                {recv_task, send_task}, return_when=asyncio.FIRST_COMPLETED
             )
+            if send_task in done and not send_task.exception():
+                # end_meeting: chờ nhận nốt kết quả đến khi server đóng kết nối
+                await recv_task
+                return
+            for task in (recv_task, send_task):
+                task.cancel()
+            await asyncio.gather(recv_task, send_task, return_exceptions=True)
+            for task in done:
+                if not task.cancelled() and task.exception():
+                    raise task.exception()
+            raise ConnectionClosedError(None, None)
+
+    ingest_task = asyncio.create_task(ingest_loop()) if ingestor else None
+    flush_task = asyncio.create_task(flush_loop())
 
-            async def receive_loop():
-                nonlocal final_buffer
-                async for raw in ws:
-                    msg = json.loads(raw)
-                    msg_type = msg.get("message")
-
-                    if msg_type == "AddPartialTranscript":
-                        text = msg.get("metadata", {}).get("transcript", "").strip()
-                        if text:
-                            socketio.emit(
-                                "transcript_response",
-                                {"text": text, "is_final": False},
-                                room=sid,
-                            )
-
-                    elif msg_type == "AddTranscript":
-                        text = msg.get("metadata", {}).get("transcript", "").strip()
-                        results = msg.get("results", [])
-
-                        speaker = "Unknown"
-                        if results and results[0].get("alternatives"):
-                            speaker = results[0]["alternatives"][0].get(
-                                "speaker", "Unknown"
-                            )
-
-                        if text:
-                            final_buffer += (" " if final_buffer else "") + text
-
-                        for result in results:
-                            if result.get("type") == "punctuation" and result.get(
-                                "is_eos"
-                            ):
-                                sentence = final_buffer.strip()
-                                final_buffer = ""
-                                if sentence:
-                                    line = f"Nguoi {speaker}: {sentence}"
-                                    socketio.emit(
-                                        "transcript_response",
-                                        {
-                                            "speaker": f"Nguoi {speaker}",
-                                            "text": sentence,
-                                            "is_final": True,
-                                        },
-                                        room=sid,
-                                    )
-                                    append_transcript(sid, line)
-
-            recv_task = asyncio.create_task(receive_loop())
-            loop = asyncio.get_running_loop()
-
-            while True:
-                chunk = await loop.run_in_executor(None, audio_queue.get)
-                if chunk is None:
-                    await ws.close()
-                    break
-                try:
-                    await ws.send(chunk)
-                except (ConnectionClosedError, ConnectionClosedOK):
-                    break
-
-            await recv_task
-    except ConnectionClosedError as e:
-        code = getattr(e, "code", None)
-        reason = (getattr(e, "reason", "") or "").lower()
-        if code == 4005 or "quota_exceeded" in reason:
+    try:
+        attempt = 0
+        while True:
+            error = None
+            established = False
+            try:
+                await run_connection()
+            except (ConnectionClosed, InvalidStatusCode, OSError, asyncio.TimeoutError) as e:
+                error = e
+            if ended:
+                break
+
+            if error is not None and _is_quota_exceeded(error):
+                socketio.emit(
+                    "status",
+                    {"msg": "Speechmatics quota exceeded", "code": "quota_exceeded"},
+                    room=sid,
+                )
+                return
+            if error is not None and _is_fatal(error):
+                raise error
+
+            # Kết nối trước đã chạy được: đếm lại backoff từ đầu
+            attempt = 1 if established else attempt + 1
+            if attempt > Config.SM_RECONNECT_MAX_ATTEMPTS:
+                socketio.emit(
+                    "status",
+                    {"msg": "Speechmatics connection closed", "code": "connection_closed"},
+                    room=sid,
+                )
+                return
+
+            delay = min(
+                Config.SM_RECONNECT_MAX_DELAY,
+                Config.SM_RECONNECT_BASE_DELAY * 2 ** (attempt - 1),
+            ) * (0.5 + random.random())
+            print(f"[SM] Connection for {sid} lost ({error}), reconnect {attempt} in {delay:.1f}s")
             socketio.emit(
                 "status",
-                {"msg": "Speechmatics quota exceeded", "code": "quota_exceeded"},
+                {"msg": "Reconnecting to Speechmatics", "code": "reconnecting", "attempt": attempt},
                 room=sid,
             )
-            return
-
-        socketio.emit(
-            "status",
-            {"msg": "Speechmatics connection closed", "code": "connection_closed"},
-            room=sid,
-        )
+            # Audio mới vẫn dồn vào AudioBuffer (có giới hạn) trong lúc chờ
+            await asyncio.sleep(delay)
     except Exception as e:
         socketio.emit(
             "status",
             {"msg": f"Speechmatics worker error: {e}", "code": "worker_error"},
             room=sid,
         )
+    finally:
+        emitter.close()
+        # end_meeting / disconnect / lỗi đều đi qua đây: flush nốt phần còn trong buffer
+        flush_task.cancel()
+        try:
+            await loop.run_in_executor(None, transcript_buffer.close)
+        except Exception as e:
+            print(f"[TRANSCRIPT] Final flush failed for {sid}: {e}")
+        # Dựng full_transcript 1 lần khi kết thúc để search/summarize đọc thẳng
+        try:
+            await loop.run_in_executor(None, materialize_transcript, sid)
+        except Exception as e:
+            print(f"[TRANSCRIPT] Failed to materialize transcript for {sid}: {e}")
+        if ingest_task:
+            ingest_task.cancel()
+            # Flush phần còn lại; đánh dấu meeting đã index để summarize không ingest lại.
+            # Chạy trước bước fold LLM bên dưới để rag_indexed được đặt sớm nhất có thể
+            try:
+                await loop.run_in_executor(None, ingestor.flush, True)
+            except Exception as e:
+                print(f"[RAG] Final live ingest failed for meeting {sid}: {e}")
+        if summarizer:
+            # Gộp nốt các câu cuối để summarize chỉ còn bước reduce nhỏ
+            try:
+                await loop.run_in_executor(None, summarizer.update, True)
+            except Exception as e:
+                print(f"[SUMMARY] Final rolling update failed for {sid}: {e}")
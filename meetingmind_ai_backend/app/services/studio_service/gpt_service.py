@@ -1,13 +1,9 @@
-from openai import OpenAI
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from app.services.llm_gateway_service import llm_gateway
 
 def generate_conversation(text):
     """Tạo cuộc hội thoại từ văn bản"""
-    response = client.chat.completions.create(
+    response = llm_gateway.chat(
+        "studio.conversation",
         model="gpt-4o-mini",
         response_format={"type": "json_object"},
         messages=[
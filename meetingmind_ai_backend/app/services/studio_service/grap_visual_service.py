@@ -1,11 +1,5 @@
-from openai import OpenAI
-import os
-from dotenv import load_dotenv
 import json
-load_dotenv()
-client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY")
-)
+from app.services.llm_gateway_service import llm_gateway
 
 def generate_graph(text):
     prompt = f"""
@@ -62,7 +56,8 @@ VĂN BẢN CẦN PHÂN TÍCH:
 
     try:
         # Gọi OpenAI API với định dạng ĐÚNG
-        response = client.chat.completions.create(
+        response = llm_gateway.chat(
+            "studio.graph",
             model="gpt-4o-mini",  # Model tồn tại
             messages=[
                 {"role": "system", "content": "Bạn là chuyên gia phân tích và trực quan hóa kiến thức. Chỉ trả về JSON thuần, không có markdown hay giải thích."},
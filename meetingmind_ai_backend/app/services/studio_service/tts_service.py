@@ -1,13 +1,7 @@
-from openai import OpenAI
 import os
 import json
 import subprocess
-from dotenv import load_dotenv
-
-load_dotenv()
-client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY")
-)
+from app.services.llm_gateway_service import llm_gateway
 
 def parse_conversation(json_text):
     """Phân tích conversation JSON thành các đoạn theo người nói"""
@@ -34,12 +28,13 @@ def create_audio_segment(text, voice, index):
     """Tạo audio segment cho một đoạn text với giọng nói cụ thể"""
     temp_file = f"temp_{index}_{voice}.mp3"
     
-    with client.audio.speech.with_streaming_response.create(
+    llm_gateway.speech_to_file(
+        "studio.tts",
+        temp_file,
         model="gpt-4o-mini-tts",
         voice=voice,
         input=text
-    ) as response:
-        response.stream_to_file(temp_file)
+    )
     
     return temp_file
 
@@ -56,12 +51,13 @@ def text_to_speech(json_text):
     
     if not segments:
         # Nếu không parse được, dùng giọng mặc định cho toàn bộ
-        with client.audio.speech.with_streaming_response.create(
+        llm_gateway.speech_to_file(
+            "studio.tts",
+            speech_file,
             model="gpt-4o-mini-tts",
             voice="alloy",
             input=json_text
-        ) as response:
-            response.stream_to_file(speech_file)
+        )
         return speech_file
     
     # Tạo audio cho từng segment
@@ -0,0 +1,131 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from ..config import Config
+from .embedding_pipeline_service import estimate_tokens
+from .embedding_store_service import normalize_text
+from .openai_service import SUMMARY_MODEL, SUMMARY_PROMPT_VERSION, summarize_transcript
+
+
+def summary_key(transcript, model=SUMMARY_MODEL, prompt_version=SUMMARY_PROMPT_VERSION):
+    """Key theo nội dung: đổi model hoặc prompt thì key đổi, cache cũ tự hết hiệu lực."""
+    digest = hashlib.sha256(normalize_text(transcript).encode("utf-8")).hexdigest()
+    return f"{model}:{prompt_version}:{digest}"
+
+
+class _Inflight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SummaryCache:
+    """
+    LRU có TTL cho kết quả tóm tắt, trong process. Các request đồng thời cùng key
+    chỉ gọi OpenAI 1 lần, các request còn lại chờ và dùng chung kết quả.
+    """
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.coalesced = 0
+        self.tokens_saved = 0
+
+    def _get_locked(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, data = entry
+        if expires_at <= now:
+            del self._entries[key]
+            self.expired += 1
+            return None
+        self._entries.move_to_end(key)
+        return data
+
+    def put(self, key, data):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute, input_tokens=0):
+        with self._lock:
+            data = self._get_locked(key, time.monotonic())
+            if data is not None:
+                self.hits += 1
+                self.tokens_saved += input_tokens
+                return copy.deepcopy(data), "hit"
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                inflight = self._inflight[key] = _Inflight()
+                owner = True
+                self.misses += 1
+            else:
+                owner = False
+                self.coalesced += 1
+                self.tokens_saved += input_tokens
+
+        if not owner:
+            inflight.done.wait()
+            if inflight.error is not None:
+                raise inflight.error
+            return copy.deepcopy(inflight.result), "coalesced"
+
+        try:
+            inflight.result = compute()
+            self.put(key, copy.deepcopy(inflight.result))
+            return inflight.result, "miss"
+        except Exception as e:
+            inflight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            inflight.done.set()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "expired": self.expired,
+                "inflight": len(self._inflight),
+                "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+                "input_tokens_saved": self.tokens_saved,
+            }
+
+
+summary_cache = SummaryCache(
+    max_entries=Config.SUMMARY_CACHE_SIZE,
+    ttl_seconds=Config.SUMMARY_CACHE_TTL_SECONDS,
+)
+
+
+def cached_summary(transcript, compute=None):
+    """
+    Tóm tắt qua summary_cache; compute mặc định là summarize_transcript(transcript).
+    data["timings"]["cache"] cho biết "hit" / "coalesced" / "miss".
+    """
+    compute = compute or (lambda: summarize_transcript(transcript))
+    data, outcome = summary_cache.get_or_compute(
+        summary_key(transcript), compute, input_tokens=estimate_tokens(transcript)
+    )
+    data["timings"] = dict(data.get("timings") or {}, cache=outcome)
+    return data
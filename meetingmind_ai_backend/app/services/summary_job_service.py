@@ -0,0 +1,213 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from ..config import Config
+from ..extensions import socketio
+from ..models.meeting_model import Meeting
+from ..models.summary_job_model import SummaryJob
+from .meeting_runtime_service import meeting_runtime
+from .meeting_service import apply_speaker_names, save_summary
+from .openai_service import finalize_rolling_summary
+from .rag_service import ingest_meeting_transcript
+from .reminder_service import ReminderController
+from .summary_cache_service import cached_summary
+from .transcript_service import format_segment_line, get_full_transcript, get_segments
+
+ACTIVE_STATUSES = ("queued", "running")
+
+_executor = ThreadPoolExecutor(
+    max_workers=Config.SUMMARY_JOB_WORKERS, thread_name_prefix="summary-job"
+)
+# sid -> job_id đang chạy trong process này (single-flight)
+_inflight = {}
+# job_id -> Event báo job chạy trong process này đã xong (cho request chờ đồng bộ)
+_done_events = {}
+_inflight_lock = threading.Lock()
+
+
+def _emit_progress(job):
+    socketio.emit("summary_job", job.to_dict(), room=job.user_id)
+
+
+def _set_stage(job, stage, progress, **fields):
+    job.stage = stage
+    job.progress = progress
+    job.updated_at = datetime.utcnow()
+    for key, value in fields.items():
+        setattr(job, key, value)
+    job.save()
+    _emit_progress(job)
+
+
+def _summarize(sid, meeting, transcript):
+    if not meeting.live_summary:
+        return cached_summary(transcript)
+
+    def finalize():
+        # Đã tóm tắt cuốn chiếu trong lúc họp: chỉ gộp nốt các câu cuối + reduce
+        tail_lines = [
+            format_segment_line(s.get("speaker_id"), s.get("text", ""))
+            for s in get_segments(sid, after_seq=meeting.live_summary_seq - 1)
+        ]
+        return finalize_rolling_summary(meeting.live_summary, tail_lines, meeting.speaker_names)
+
+    # Transcript không đổi (tóm tắt lại sau khi xoá summary): dùng lại kết quả cache
+    return cached_summary(transcript, finalize)
+
+
+def _run_job(job_id):
+    job = SummaryJob.objects(job_id=job_id).first()
+    if job is None:
+        return
+    sid = job.sid
+    timings = {}
+    try:
+        # Summarize ngay sau end_meeting: chờ worker live flush transcript + chunk cuối
+        # (đặt rag_indexed) để không ingest lại song song với LiveIngestor
+        live_running = False
+        if meeting_runtime.is_running(sid):
+            _set_stage(job, "wait_live", 5, status="running")
+            started = time.perf_counter()
+            live_running = not meeting_runtime.wait_stopped(sid, Config.SUMMARY_LIVE_WAIT_SECONDS)
+            timings["wait_live"] = round(time.perf_counter() - started, 2)
+
+        _set_stage(job, "summarize", 10, status="running", timings=timings)
+        started = time.perf_counter()
+        meeting = Meeting.objects(sid=sid).first()
+        if meeting is None:
+            raise ValueError("Meeting not found")
+        raw_transcript = get_full_transcript(sid, meeting)
+        transcript = apply_speaker_names(raw_transcript, meeting.speaker_names)
+        if not transcript:
+            raise ValueError("No transcript found in database")
+        data = _summarize(sid, meeting, transcript)
+        timings["summarize"] = round(time.perf_counter() - started, 2)
+
+        _set_stage(job, "save", 60, timings=timings)
+        started = time.perf_counter()
+        save_summary(sid, data)
+        timings["save"] = round(time.perf_counter() - started, 2)
+
+        # Bỏ qua nếu transcript đã được ingest dần trong lúc họp (live_ingest_service),
+        # hoặc worker live vẫn chạy: LiveIngestor còn đang ghi chunk của meeting này
+        if live_running:
+            print(f"[SUMMARY] Live worker for {sid} still running, skip RAG re-ingest")
+        elif not meeting.rag_indexed:
+            _set_stage(job, "ingest", 70, timings=timings)
+            started = time.perf_counter()
+            # Chunk giữ nhãn "Nguoi <id>" thô như TranscriptSegment: đổi tên không cần ingest lại
+            ingest_meeting_transcript(sid, job.user_id, raw_transcript)
+            timings["ingest"] = round(time.perf_counter() - started, 2)
+
+        if job.create_tasks and data.get("action_items"):
+            _set_stage(job, "reminders", 90, timings=timings)
+            started = time.perf_counter()
+            ReminderController.create_reminders_from_action_items(
+                user_id=job.user_id,
+                items=[{"title": x} for x in data.get("action_items")],
+            )
+            timings["reminders"] = round(time.perf_counter() - started, 2)
+
+        result = {
+            "summary": data.get("summary", ""),
+            "action_items": data.get("action_items", []),
+            "key_decisions": data.get("key_decisions", []),
+            "summary_timings": data.get("timings"),
+        }
+        _set_stage(
+            job, "done", 100,
+            status="completed", result=result, timings=timings, finished_at=datetime.utcnow(),
+        )
+    except Exception as e:
+        print(f"[SUMMARY] Job {job_id} for {sid} failed: {e}")
+        _set_stage(
+            job, job.stage, job.progress,
+            status="failed", error=str(e), timings=timings, finished_at=datetime.utcnow(),
+        )
+    finally:
+        with _inflight_lock:
+            if _inflight.get(sid) == job_id:
+                _inflight.pop(sid, None)
+            done = _done_events.pop(job_id, None)
+        if done is not None:
+            done.set()
+
+
+def _submit(job):
+    with _inflight_lock:
+        current = _inflight.get(job.sid)
+        if current is not None:
+            return current
+        _inflight[job.sid] = job.job_id
+        _done_events[job.job_id] = threading.Event()
+    _executor.submit(_run_job, job.job_id)
+    return job.job_id
+
+
+def start_summary_job(sid, user_id, create_tasks=False):
+    """
+    Tạo job tóm tắt cho sid, hoặc trả về job đang chạy (single-flight theo sid).
+    Job "queued/running" còn trong Mongo nhưng không có trong process (server restart)
+    được chạy lại. Trả về SummaryJob.
+    """
+    with _inflight_lock:
+        job_id = _inflight.get(sid)
+    if job_id is not None:
+        job = SummaryJob.objects(job_id=job_id).first()
+        if job is not None:
+            return job
+
+    job = SummaryJob.objects(sid=sid, status__in=ACTIVE_STATUSES).order_by("-created_at").first()
+    if job is not None:
+        # Job đang được process khác chạy (vừa cập nhật gần đây): chỉ gắn vào, không chạy trùng
+        age = (datetime.utcnow() - (job.updated_at or job.created_at)).total_seconds()
+        if age < Config.SUMMARY_JOB_STALE_SECONDS:
+            return job
+    else:
+        job = SummaryJob(
+            job_id=uuid.uuid4().hex,
+            sid=sid,
+            user_id=user_id,
+            create_tasks=create_tasks,
+        )
+        job.save()
+    job_id = _submit(job)
+    if job_id != job.job_id:
+        return SummaryJob.objects(job_id=job_id).first() or job
+    return job
+
+
+def wait_summary_job(job, timeout):
+    """
+    Chờ job xong tối đa timeout giây rồi trả về bản mới nhất từ Mongo.
+    Job do process khác chạy thì đọc lại Mongo định kỳ.
+    """
+    deadline = time.monotonic() + timeout
+    with _inflight_lock:
+        done = _done_events.get(job.job_id)
+    if done is not None:
+        done.wait(timeout)
+        return SummaryJob.objects(job_id=job.job_id).first() or job
+
+    while job.status in ACTIVE_STATUSES and time.monotonic() < deadline:
+        time.sleep(0.5)
+        job = SummaryJob.objects(job_id=job.job_id).first() or job
+    return job
+
+
+def get_summary_job(job_id):
+    return SummaryJob.objects(job_id=job_id).first()
+
+
+def job_stats():
+    with _inflight_lock:
+        inflight = len(_inflight)
+    return {
+        "workers": Config.SUMMARY_JOB_WORKERS,
+        "inflight": inflight,
+        "queued": SummaryJob.objects(status="queued").count(),
+        "running": SummaryJob.objects(status="running").count(),
+    }
@@ -0,0 +1,112 @@
+import threading
+import time
+
+from ..config import Config
+from ..extensions import socketio
+
+_counters = {
+    "partials_received": 0,
+    "partials_emitted": 0,
+    "partials_suppressed": 0,
+    "finals_emitted": 0,
+    "final_events": 0,
+}
+_counters_lock = threading.Lock()
+
+
+def _count(**deltas):
+    with _counters_lock:
+        for key, value in deltas.items():
+            _counters[key] += value
+
+
+class TranscriptEmitter:
+    """
+    Gom emit transcript của 1 meeting, chạy trên event loop của sm_worker.
+    - Partial: tối đa 1 emit / interval_ms, chỉ giữ bản mới nhất (client ghi đè partial).
+    - Final (mặc định): emit ngay, mỗi câu 1 "transcript_response" {speaker, text, is_final}.
+    - batch_finals=True (client khai báo trong start_streaming): các final đến trong
+      cùng 1 tick được gom thành 1 event "transcript_batch" {finals: [...]} ở cuối tick.
+    - Partial đang chờ bị huỷ khi có final (final đã thay thế nó).
+    """
+
+    def __init__(self, sid, loop, interval_ms=None, batch_finals=False):
+        self.sid = sid
+        self.loop = loop
+        self.batch_finals = batch_finals
+        self.interval = (interval_ms or Config.PARTIAL_EMIT_INTERVAL_MS) / 1000.0
+        self._pending_partial = None
+        self._partial_handle = None
+        self._last_partial_at = 0.0
+        self._finals = []
+        self._finals_scheduled = False
+
+    def partial(self, text):
+        _count(partials_received=1)
+        if self._pending_partial is not None:
+            _count(partials_suppressed=1)
+        self._pending_partial = text
+        if self._partial_handle is not None:
+            return
+
+        wait = self._last_partial_at + self.interval - time.monotonic()
+        if wait <= 0:
+            self._emit_partial()
+        else:
+            self._partial_handle = self.loop.call_later(wait, self._emit_partial)
+
+    def _emit_partial(self):
+        self._partial_handle = None
+        text, self._pending_partial = self._pending_partial, None
+        if text is None:
+            return
+        self._last_partial_at = time.monotonic()
+        _count(partials_emitted=1)
+        socketio.emit(
+            "transcript_response",
+            {"text": text, "is_final": False},
+            room=self.sid,
+        )
+
+    def _drop_partial(self):
+        if self._partial_handle is not None:
+            self._partial_handle.cancel()
+            self._partial_handle = None
+        if self._pending_partial is not None:
+            self._pending_partial = None
+            _count(partials_suppressed=1)
+
+    def final(self, speaker, text):
+        self._drop_partial()
+        payload = {"speaker": speaker, "text": text, "is_final": True}
+        if not self.batch_finals:
+            _count(finals_emitted=1, final_events=1)
+            socketio.emit("transcript_response", payload, room=self.sid)
+            return
+        self._finals.append(payload)
+        if not self._finals_scheduled:
+            self._finals_scheduled = True
+            self.loop.call_soon(self._emit_finals)
+
+    def _emit_finals(self):
+        self._finals_scheduled = False
+        finals, self._finals = self._finals, []
+        if not finals:
+            return
+        _count(finals_emitted=len(finals), final_events=1)
+        socketio.emit("transcript_batch", {"finals": finals}, room=self.sid)
+
+    def close(self):
+        """Gửi nốt final còn chờ, bỏ partial (worker kết thúc)."""
+        self._drop_partial()
+        self._emit_finals()
+
+
+def emit_stats():
+    with _counters_lock:
+        stats = dict(_counters)
+    received = stats["partials_received"]
+    stats["partial_suppression_ratio"] = (
+        round(stats["partials_suppressed"] / received, 3) if received else 0.0
+    )
+    return stats
@@ -0,0 +1,331 @@
+import atexit
+import threading
+import time
+import unicodedata
+
+from pymongo import ReturnDocument
+
+from ..config import Config
+from ..models.meeting_model import Meeting
+from ..models.transcript_segment_model import TranscriptSegment
+
+
+# Tiền tố nhãn người nói: sm_worker ghi "Nguoi", dữ liệu/client cũ có thể dùng "Người"
+SPEAKER_PREFIXES = ("Nguoi ", "Người ")
+
+
+def normalize_speaker_id(label):
+    """ "Nguoi S1" / "Người S1" / "S1" -> "S1" (key của Meeting.speaker_names)."""
+    label = unicodedata.normalize("NFC", str(label or "")).strip()
+    for prefix in SPEAKER_PREFIXES:
+        if label.startswith(prefix):
+            return label[len(prefix):].strip()
+    return label
+
+
+def format_segment_line(speaker_id, text):
+    """
+    Dòng transcript lưu trong full_transcript: luôn dùng speaker id thô,
+    tên hiển thị chỉ được thay lúc render (meeting_service.apply_speaker_names).
+    """
+    if not speaker_id:
+        return text
+    return f"Nguoi {speaker_id}: {text}"
+
+
+def split_speaker_line(line):
+    """Tách 1 dòng "Nguoi S1: text" -> ("S1", "text"); dòng không có nhãn -> (None, line)."""
+    label, sep, text = line.partition(": ")
+    if not sep:
+        return None, line
+    label = unicodedata.normalize("NFC", label).strip()
+    if label.startswith(SPEAKER_PREFIXES):
+        return normalize_speaker_id(label), text
+    return None, line
+
+
+def append_segments(sid, segments):
+    """
+    Append các câu final vào TranscriptSegment.
+    segments: list dict {speaker_id, text, start_time, end_time}.
+    Cấp 1 dải seq bằng $inc nguyên tử trên Meeting.segment_count rồi insert_many,
+    không đọc/ghi lại cả document Meeting.
+    Mỗi meeting chỉ có 1 writer (sm_worker) nên các dải seq được insert theo thứ tự.
+    """
+    segments = [s for s in segments if (s.get("text") or "").strip()]
+    if not segments:
+        return 0
+
+    counter = Meeting._get_collection().find_one_and_update(
+        {"_id": sid},
+        {"$inc": {"segment_count": len(segments)}},
+        projection={"segment_count": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not counter:
+        return 0
+
+    first_seq = counter["segment_count"] - len(segments)
+    docs = [
+        TranscriptSegment(
+            sid=sid,
+            seq=first_seq + i,
+            speaker_id=str(segment.get("speaker_id") or "Unknown"),
+            text=segment["text"].strip(),
+            start_time=segment.get("start_time"),
+            end_time=segment.get("end_time"),
+        )
+        for i, segment in enumerate(segments)
+    ]
+    TranscriptSegment.objects.insert(docs, load_bulk=False)
+    return len(docs)
+
+
+def append_segment(sid, speaker_id, text, start_time=None, end_time=None):
+    return append_segments(sid, [{
+        "speaker_id": speaker_id,
+        "text": text,
+        "start_time": start_time,
+        "end_time": end_time,
+    }])
+
+
+def get_segments(sid, after_seq=-1):
+    """Segment thô (as_pymongo) của meeting theo thứ tự seq."""
+    return (
+        TranscriptSegment.objects(sid=sid, seq__gt=after_seq)
+        .order_by("seq")
+        .only("seq", "speaker_id", "text", "start_time", "end_time")
+        .as_pymongo()
+    )
+
+
+def materialize_transcript(sid):
+    """
+    Nối các segment chưa được dựng vào Meeting.full_transcript (chỉ đọc phần mới,
+    từ transcript_seq trở đi). Gọi khi kết thúc họp hoặc lười khi có reader cần.
+    Trả về full_transcript hiện tại.
+    """
+    meeting = (
+        Meeting.objects(sid=sid)
+        .only("full_transcript", "segment_count", "transcript_seq")
+        .as_pymongo()
+        .first()
+    )
+    if not meeting:
+        return None
+
+    transcript = meeting.get("full_transcript") or ""
+    materialized = meeting.get("transcript_seq") or 0
+    if materialized >= (meeting.get("segment_count") or 0):
+        return transcript
+
+    lines = []
+    last_seq = materialized - 1
+    for segment in get_segments(sid, after_seq=materialized - 1):
+        lines.append(format_segment_line(segment.get("speaker_id"), segment.get("text")))
+        last_seq = segment["seq"]
+    if not lines:
+        return transcript
+
+    transcript = "\n".join(([transcript] if transcript else []) + lines)
+    # Chỉ ghi nếu chưa có ai materialize song song (so sánh transcript_seq cũ)
+    Meeting.objects(sid=sid, transcript_seq=meeting.get("transcript_seq")).update_one(
+        set__full_transcript=transcript,
+        set__transcript_seq=last_seq + 1,
+    )
+    return transcript
+
+
+def get_full_transcript(sid, meeting=None):
+    """
+    Accessor cho summarize/chat/search: trả về full_transcript đã materialize,
+    chỉ dựng lại khi còn segment mới. Meeting cũ (trước TranscriptSegment) trả
+    thẳng full_transcript.
+    """
+    if meeting is None:
+        meeting = Meeting.objects(sid=sid).first()
+    if not meeting:
+        return None
+    if (meeting.segment_count or 0) <= (meeting.transcript_seq or 0):
+        return meeting.full_transcript
+    transcript = materialize_transcript(sid)
+    meeting.full_transcript = transcript
+    return transcript
+
+
+def _parse_legacy_transcript(transcript, speaker_names):
+    """
+    Tách full_transcript cũ thành segment. Dòng cũ có thể đã bị đổi tên lúc ghi
+    ("Lan: ...") nên tra ngược speaker_names để lấy lại speaker id.
+    """
+    by_name = {}
+    for key, name in (speaker_names or {}).items():
+        if name:
+            by_name.setdefault(str(name).strip(), normalize_speaker_id(key))
+
+    segments = []
+    for line in transcript.split("\n"):
+        if not line.strip():
+            continue
+        speaker_id, text = split_speaker_line(line)
+        if speaker_id is None:
+            label, sep, rest = line.partition(": ")
+            if sep and label.strip() in by_name:
+                speaker_id, text = by_name[label.strip()], rest
+            elif not sep and segments:
+                # Dòng tiếp nối không có nhãn: gộp vào câu trước
+                segments[-1]["text"] += "\n" + line.strip()
+                continue
+        # Nhãn không nhận ra (tên đã đổi): giữ nguyên cả dòng, không gán speaker id
+        segments.append({"speaker_id": speaker_id or "", "text": text.strip()})
+    return segments
+
+
+def migrate_legacy_transcripts(batch_size=200):
+    """
+    Chuyển Meeting có full_transcript nhưng chưa có TranscriptSegment sang dạng
+    segment + full_transcript dùng speaker id thô. Chạy lại an toàn (bỏ qua meeting đã có segment).
+    """
+    migrated = 0
+    query = {
+        "full_transcript": {"$nin": [None, ""]},
+        "$or": [{"segment_count": {"$exists": False}}, {"segment_count": 0}],
+    }
+    while True:
+        meetings = list(
+            Meeting.objects(__raw__=query)
+            .only("sid", "full_transcript", "speaker_names")
+            .limit(batch_size)
+        )
+        if not meetings:
+            break
+        for meeting in meetings:
+            segments = _parse_legacy_transcript(meeting.full_transcript, meeting.speaker_names)
+            docs = [
+                TranscriptSegment(sid=meeting.sid, seq=i, speaker_id=s["speaker_id"], text=s["text"])
+                for i, s in enumerate(segments)
+                if s["text"]
+            ]
+            TranscriptSegment.objects(sid=meeting.sid).delete()
+            if docs:
+                TranscriptSegment.objects.insert(docs, load_bulk=False)
+            Meeting.objects(sid=meeting.sid).update_one(
+                set__full_transcript="\n".join(format_segment_line(d.speaker_id, d.text) for d in docs),
+                set__segment_count=len(docs),
+                set__transcript_seq=len(docs),
+                set__speaker_names={
+                    normalize_speaker_id(key): name
+                    for key, name in (meeting.speaker_names or {}).items()
+                },
+            )
+            migrated += 1
+        print(f"[TRANSCRIPT] Migrated {migrated} meetings")
+    return migrated
+
+
+def delete_segments(sid):
+    return TranscriptSegment.objects(sid=sid).delete()
+
+
+_active_buffers = {}
+_active_lock = threading.Lock()
+
+
+class TranscriptBuffer:
+    """
+    Write-behind buffer cho 1 meeting: sm_worker add() câu final (chỉ thao tác RAM),
+    flush() gom cả lô thành 1 lần append_segments (1 $inc + 1 insert_many).
+    flush() là I/O Mongo blocking nên phải chạy qua run_in_executor.
+    Câu chưa flush được (Mongo lỗi) được giữ lại cho lần flush sau.
+    """
+
+    def __init__(self, sid, max_lines=None, max_delay_ms=None):
+        self.sid = sid
+        self.max_lines = max_lines or Config.TRANSCRIPT_FLUSH_LINES
+        self.max_delay = (max_delay_ms or Config.TRANSCRIPT_FLUSH_INTERVAL_MS) / 1000.0
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._first_pending_at = None
+        self.flushed = 0
+        self.flushes = 0
+        self.failures = 0
+        with _active_lock:
+            _active_buffers[sid] = self
+
+    def add(self, speaker_id, text, start_time=None, end_time=None):
+        """Thêm 1 câu; trả về True nếu đã đủ max_lines và nên flush ngay."""
+        with self._pending_lock:
+            if not self._pending:
+                self._first_pending_at = time.monotonic()
+            self._pending.append({
+                "speaker_id": speaker_id,
+                "text": text,
+                "start_time": start_time,
+                "end_time": end_time,
+            })
+            return len(self._pending) >= self.max_lines
+
+    def due(self):
+        with self._pending_lock:
+            if not self._pending:
+                return False
+            return (
+                len(self._pending) >= self.max_lines
+                or time.monotonic() - self._first_pending_at >= self.max_delay
+            )
+
+    def flush(self):
+        # _flush_lock giữ thứ tự: lô sau chỉ được cấp seq sau khi lô trước đã insert
+        with self._flush_lock:
+            with self._pending_lock:
+                batch, self._pending = self._pending, []
+                self._first_pending_at = None
+            if not batch:
+                return 0
+            try:
+                written = append_segments(self.sid, batch)
+            except Exception as e:
+                self.failures += 1
+                with self._pending_lock:
+                    self._pending = batch + self._pending
+                    self._first_pending_at = time.monotonic()
+                print(f"[TRANSCRIPT] Flush failed for {self.sid} ({len(batch)} lines): {e}")
+                return 0
+            self.flushed += written
+            self.flushes += 1
+            return written
+
+    def close(self):
+        """Flush lần cuối và bỏ khỏi registry (end_meeting, disconnect, worker lỗi)."""
+        try:
+            return self.flush()
+        finally:
+            with self._pending_lock:
+                remaining = len(self._pending)
+            if not remaining:
+                with _active_lock:
+                    if _active_buffers.get(self.sid) is self:
+                        _active_buffers.pop(self.sid, None)
+
+    def stats(self):
+        with self._pending_lock:
+            pending = len(self._pending)
+        return {
+            "pending": pending,
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "failures": self.failures,
+        }
+
+
+def flush_all_buffers():
+    """Flush mọi buffer còn dữ liệu, dùng khi process tắt."""
+    with _active_lock:
+        buffers = list(_active_buffers.values())
+    for buffer in buffers:
+        buffer.close()
+
+
+atexit.register(flush_all_buffers)
@@ -0,0 +1,201 @@
+import threading
+import wave
+from collections import deque
+
+import numpy as np
+
+from ..config import Config
+
+# Giá trị PLAN_LIMITS["vad_mode"]
+VAD_OFF = 0        # Gửi toàn bộ audio
+VAD_KEEPALIVE = 1  # Im lặng: chỉ gửi 1 đoạn 0 ngắn mỗi VAD_KEEPALIVE_MS để giữ phiên + chốt câu
+VAD_PAUSE = 2      # Im lặng: không gửi gì
+
+_totals = {"frames": 0, "speech_frames": 0, "bytes_in": 0, "bytes_out": 0}
+_totals_lock = threading.Lock()
+
+
+class EnergyVAD:
+    """
+    VAD theo năng lượng RMS cho PCM s16le mono (mặc định 16 kHz).
+    Mỗi khối audio được cắt thành frame frame_ms, tính RMS (dBFS) vectorized bằng NumPy.
+    - hangover_ms: vẫn gửi thêm sau frame có tiếng nói cuối cùng (không cụt đuôi câu).
+    - preroll_ms: gửi kèm các frame im lặng ngay trước tiếng nói (không mất âm đầu).
+    process(block) trả về list bytes cần gửi upstream (có thể rỗng).
+    track_segments=True: ghi lại các đoạn tiếng nói [start, end) theo frame (dùng offline).
+    """
+
+    def __init__(self, mode=VAD_KEEPALIVE, sample_rate=16000, frame_ms=None,
+                 threshold_db=None, hangover_ms=None, preroll_ms=None, keepalive_ms=None,
+                 track_segments=False):
+        self.mode = mode
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms or Config.VAD_FRAME_MS
+        self.threshold_db = Config.VAD_THRESHOLD_DB if threshold_db is None else threshold_db
+        self.frame_samples = int(sample_rate * self.frame_ms / 1000)
+        self.frame_bytes = self.frame_samples * 2
+        self.hangover_frames = self._frames_for(Config.VAD_HANGOVER_MS if hangover_ms is None else hangover_ms)
+        self.preroll_frames = self._frames_for(Config.VAD_PREROLL_MS if preroll_ms is None else preroll_ms)
+        self.keepalive_frames = max(1, self._frames_for(Config.VAD_KEEPALIVE_MS if keepalive_ms is None else keepalive_ms))
+        # Đoạn "khoảng lặng nén" gửi thay cho cả quãng im lặng: 5 frame số 0 (~100 ms)
+        self._gap = bytes(self.frame_bytes * 5)
+
+        self._remainder = b""
+        self._held = deque(maxlen=max(1, self.preroll_frames))
+        self._frames_since_speech = self.hangover_frames + 1
+        self._silent_run = 0
+
+        self.frames = 0
+        self.speech_frames = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.segments = [] if track_segments else None
+
+    def _frames_for(self, ms):
+        return int(round(ms / self.frame_ms))
+
+    def _split_frames(self, block):
+        data = self._remainder + bytes(block)
+        usable = len(data) // self.frame_bytes * self.frame_bytes
+        self._remainder = data[usable:]
+        if not usable:
+            return None, data[:0]
+        samples = np.frombuffer(data, dtype="<i2", count=usable // 2)
+        return samples.reshape(-1, self.frame_samples), data[:usable]
+
+    def speech_mask(self, frames):
+        """Frame nào có năng lượng vượt ngưỡng (RMS dBFS)."""
+        x = frames.astype(np.float32) / 32768.0
+        rms = np.sqrt(np.mean(x * x, axis=1))
+        db = 20.0 * np.log10(np.maximum(rms, 1e-10))
+        return db >= self.threshold_db
+
+    def _record_segments(self, speech):
+        """Nối các đoạn frame có tiếng nói (chưa tính hangover/preroll) vào self.segments."""
+        edges = np.diff(np.concatenate(([0], speech.astype(np.int8), [0])))
+        starts = np.flatnonzero(edges == 1) + self.frames
+        ends = np.flatnonzero(edges == -1) + self.frames
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            if self.segments and self.segments[-1][1] == start:
+                self.segments[-1][1] = end
+            else:
+                self.segments.append([start, end])
+
+    def _active_mask(self, speech):
+        """Mở rộng mask tiếng nói: hangover về sau + preroll về trước (trong khối)."""
+        n = speech.shape[0]
+        idx = np.arange(n)
+
+        # Khoảng cách tới frame có tiếng nói gần nhất phía trước (kể cả từ khối trước)
+        last = np.where(speech, idx, -(10 ** 9))
+        last = np.maximum.accumulate(last)
+        carried = idx + self._frames_since_speech
+        since = np.where(last >= 0, idx - last, carried)
+        active = since <= self.hangover_frames
+
+        # Preroll: frame nằm trước tiếng nói tiếp theo không quá preroll_frames
+        if self.preroll_frames:
+            nxt = np.where(speech, idx, 10 ** 9)
+            nxt = np.minimum.accumulate(nxt[::-1])[::-1]
+            active |= (nxt - idx) <= self.preroll_frames
+
+        self._frames_since_speech = int(since[-1]) + 1 if n else self._frames_since_speech
+        return active
+
+    def process(self, block):
+        self.bytes_in += len(block)
+        if self.mode == VAD_OFF:
+            self.bytes_out += len(block)
+            return [bytes(block)]
+
+        frames, raw = self._split_frames(block)
+        if frames is None:
+            return []
+
+        speech = self.speech_mask(frames)
+        active = self._active_mask(speech)
+        if self.segments is not None:
+            self._record_segments(speech)
+        self.frames += len(speech)
+        self.speech_frames += int(speech.sum())
+
+        out = []
+        fb = self.frame_bytes
+        # Số frame giữ từ khối trước còn cần cho đủ preroll trước tiếng nói đầu tiên
+        first_speech = int(np.argmax(speech)) if speech.any() else 0
+        held_needed = max(0, self.preroll_frames - first_speech)
+        run_start = None
+        for i, is_active in enumerate(active.tolist() + [False]):
+            if is_active and run_start is None:
+                run_start = i
+            elif not is_active and run_start is not None:
+                # Đoạn im lặng giữ từ khối trước được gửi làm preroll của đoạn nói này
+                if run_start == 0 and self._held and held_needed:
+                    out.extend(list(self._held)[-held_needed:])
+                self._held.clear()
+                out.append(raw[run_start * fb:i * fb])
+                self._silent_run = 0
+                run_start = None
+            if i < len(active) and not is_active:
+                self._held.append(raw[i * fb:(i + 1) * fb])
+                self._silent_run += 1
+                if self.mode == VAD_KEEPALIVE and self._silent_run % self.keepalive_frames == 0:
+                    out.append(self._gap)
+
+        self.bytes_out += sum(len(b) for b in out)
+        return out
+
+    def close_stats(self):
+        with _totals_lock:
+            _totals["frames"] += self.frames
+            _totals["speech_frames"] += self.speech_frames
+            _totals["bytes_in"] += self.bytes_in
+            _totals["bytes_out"] += self.bytes_out
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "frames": self.frames,
+            "speech_frames": self.speech_frames,
+            "silence_ratio": round(1 - self.speech_frames / self.frames, 3) if self.frames else 0.0,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+        }
+
+
+def vad_totals():
+    with _totals_lock:
+        totals = dict(_totals)
+    frames = totals["frames"]
+    totals["silence_ratio"] = round(1 - totals["speech_frames"] / frames, 3) if frames else 0.0
+    return totals
+
+
+def analyze_wav(path, mode=VAD_KEEPALIVE, block_ms=160, **kwargs):
+    """
+    Chạy VAD offline trên file WAV PCM 16-bit mono (bản ghi mẫu) theo từng khối
+    block_ms như luồng live, trả về stats + số giây audio thực sự được gửi
+    + speech_segments: list [start, end] (giây) các đoạn có tiếng nói.
+    """
+    with wave.open(path, "rb") as wav:
+        if wav.getsampwidth() != 2 or wav.getnchannels() != 1:
+            raise ValueError("WAV must be 16-bit mono PCM")
+        sample_rate = wav.getframerate()
+        vad = EnergyVAD(mode=mode, sample_rate=sample_rate, track_segments=True, **kwargs)
+        block_frames = int(sample_rate * block_ms / 1000)
+        sent = 0
+        while True:
+            block = wav.readframes(block_frames)
+            if not block:
+                break
+            sent += sum(len(b) for b in vad.process(block))
+
+    stats = vad.stats()
+    stats["sent_seconds"] = round(sent / (sample_rate * 2), 2)
+    stats["input_seconds"] = round(stats["bytes_in"] / (sample_rate * 2), 2)
+    frame_seconds = vad.frame_ms / 1000
+    stats["speech_segments"] = [
+        [round(start * frame_seconds, 2), round(end * frame_seconds, 2)]
+        for start, end in vad.segments
+    ]
+    return stats
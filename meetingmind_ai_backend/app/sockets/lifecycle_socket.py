@@ -0,0 +1,16 @@
+from flask import request
+
+from app.extensions import socketio
+from app.services.session_registry_service import session_registry
+
+
+# Socket.IO chỉ giữ 1 handler cho mỗi event: connect/disconnect đăng ký duy nhất ở đây,
+# các module khác đăng ký qua session_registry.register_connect/register_disconnect
+@socketio.on("connect")
+def on_connect():
+    session_registry.dispatch_connect(request.sid)
+
+
+@socketio.on("disconnect")
+def on_disconnect():
+    session_registry.dispatch_disconnect(request.sid)
@@ -1,19 +1,16 @@
-import asyncio
-import queue
-import threading
-
 from flask import request
-from flask_socketio import emit
+from flask_socketio import emit, join_room
 
 from app.extensions import socketio
 from app.models.meeting_model import Meeting
 from app.services.meeting_service import get_or_create_meeting, update_speaker_name
 from app.services.auth_token_service import verify_user_token
+from app.services.meeting_runtime_service import meeting_runtime
+from app.services.session_registry_service import session_registry
 from app.services.plan_service import get_plan_limits, get_user_plan
+from app.services.resample_service import parse_audio_format
 from app.services.speechmatics_service import sm_worker
 
-audio_queues = {}
-
 
 @socketio.on("start_streaming")
 def start_streaming(data=None):
@@ -39,6 +36,27 @@ def start_streaming(data=None):
         emit("status", {"msg": "Unauthorized", "code": "unauthorized"})
         return
 
+    # Client kết nối lại sau khi rớt mạng: gắn socket mới vào worker đang chạy
+    meeting_id = data.get("meeting_id") if isinstance(data, dict) else None
+    if meeting_id:
+        session, error = session_registry.resume(
+            sid, meeting_id, data.get("resume_token"), user_id
+        )
+        if error:
+            emit("status", {"msg": error, "code": "resume_failed", "meeting_id": meeting_id})
+            return
+        join_room(meeting_id)
+        emit(
+            "status",
+            {
+                "msg": "Meeting resumed",
+                "code": "resumed",
+                "meeting_id": meeting_id,
+                "resume_token": session.resume_token,
+            },
+        )
+        return
+
     plan = get_user_plan(user_id)
     limits = get_plan_limits(plan)
     meeting_limit = limits.get("meeting_limit")
@@ -55,42 +73,60 @@ def start_streaming(data=None):
             )
             return
 
+    # Định dạng audio client gửi lên; server tự downmix/resample về 16 kHz mono
+    audio_format, format_error = parse_audio_format(
+        data.get("audio_format") if isinstance(data, dict) else None
+    )
+    if format_error:
+        emit("status", {"msg": format_error, "code": "unsupported_audio_format"})
+        return
+
     title = data.get("title") if isinstance(data, dict) else None
     get_or_create_meeting(sid, user_id, title=title)
-
-    audio_queues[sid] = queue.Queue()
-    loop = asyncio.new_event_loop()
-
-    def runner():
-        asyncio.set_event_loop(loop)
-        try:
-            loop.run_until_complete(sm_worker(sid, audio_queues[sid]))
-        except Exception as e:
-            socketio.emit(
-                "status",
-                {"msg": f"meeting worker crashed: {e}", "code": "worker_crashed"},
-                room=sid,
-            )
-        finally:
-            audio_queues.pop(sid, None)
-            loop.close()
-
-    threading.Thread(target=runner, daemon=True).start()
-    emit("status", {"msg": "Speechmatics ready"})
+    # Client mới nhận được "transcript_batch"; client cũ giữ 1 "transcript_response" mỗi câu
+    batch_finals = bool(data.get("batch_finals")) if isinstance(data, dict) else False
+
+    session = session_registry.start(
+        sid,
+        user_id,
+        plan,
+        limits,
+        sm_worker,
+        user_id=user_id,
+        vad_mode=limits.get("vad_mode"),
+        audio_format=audio_format,
+        rolling_summary=bool(limits.get("in_meeting_ai")),
+        batch_finals=batch_finals,
+    )
+    if session is None:
+        emit("status", {"msg": "Meeting already streaming", "code": "already_streaming"})
+        return
+    emit(
+        "status",
+        {
+            "msg": "Speechmatics ready",
+            "audio_format": audio_format,
+            "batch_finals": batch_finals,
+            "meeting_id": sid,
+            "resume_token": session.resume_token,
+        },
+    )
 
 
 @socketio.on("audio_data")
 def audio_data(data):
     sid = request.sid
-    if sid in audio_queues and len(data) > 5:
-        audio_queues[sid].put(data[5:])
+    if len(data) <= 5:
+        return
+    meeting_sid = session_registry.touch(sid, len(data) - 5)
+    if meeting_sid:
+        # memoryview: bỏ header 5 byte mà không copy frame
+        meeting_runtime.push_audio(meeting_sid, memoryview(data)[5:])
 
 
 @socketio.on("end_meeting")
 def end_meeting():
-    sid = request.sid
-    if sid in audio_queues:
-        audio_queues[sid].put(None)
+    session_registry.end(request.sid, "end_meeting")
 
 
 @socketio.on("set_speaker_name")
@@ -104,12 +140,10 @@ def set_speaker_name(data=None):
     if not speaker_id or not name:
         return
 
-    update_speaker_name(sid, speaker_id, name)
+    session = session_registry.resolve(sid)
+    update_speaker_name(session.sid if session else sid, speaker_id, name)
 
 
-@socketio.on("disconnect")
-def disconnect():
-    sid = request.sid
-    if sid in audio_queues:
-        audio_queues[sid].put(None)
-    audio_queues.pop(sid, None)
+@session_registry.register_disconnect
+def detach_meeting_on_disconnect(sid):
+    session_registry.detach(sid)
@@ -0,0 +1,24 @@
+import os
+
+from app.services.vad_service import VAD_KEEPALIVE, VAD_PAUSE, analyze_wav
+
+# 8 kHz, 16-bit mono: 0.4 s sine 440 Hz (~-13 dBFS), 0.8 s nhiễu ±3 LSB (~-80 dBFS), 0.4 s sine
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "speech_silence_speech.wav")
+
+
+def test_analyze_wav_speech_silence_speech():
+    stats = analyze_wav(FIXTURE, mode=VAD_PAUSE, threshold_db=-45, hangover_ms=0, preroll_ms=0)
+
+    assert stats["input_seconds"] == 1.6
+    assert stats["speech_segments"] == [[0.0, 0.4], [1.2, 1.6]]
+    assert stats["silence_ratio"] == 0.5
+    # Pause + không hangover/preroll: chỉ gửi đúng 2 đoạn tiếng nói
+    assert stats["sent_seconds"] == 0.8
+
+
+def test_analyze_wav_keepalive_sends_compressed_gaps():
+    stats = analyze_wav(FIXTURE, mode=VAD_KEEPALIVE, threshold_db=-45)
+
+    assert stats["speech_segments"] == [[0.0, 0.4], [1.2, 1.6]]
+    # Hangover/preroll + khoảng lặng nén vẫn ít hơn toàn bộ audio
+    assert 0.8 < stats["sent_seconds"] < stats["input_seconds"]